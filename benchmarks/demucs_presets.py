@@ -0,0 +1,142 @@
+"""
+人声分离预设校准：在带参考分轨的音频上比较 fast / balanced / best 预设的分离质量和耗时，
+选出在容差内质量最好的最快预设。
+
+    python -m benchmarks.demucs_presets                                  # 使用合成音频
+    python -m benchmarks.demucs_presets --fixtures clips/a clips/b --tolerance 0.5 --apply
+    python -m benchmarks.demucs_presets --device cpu --output report.json
+
+每个 fixture 文件夹包含 audio.wav 以及参考分轨 audio_vocals.wav / audio_instruments.wav（44.1kHz 立体声）。
+质量用 SDR = 10*log10(|参考|^2 / |参考-分离结果|^2) 衡量，取人声与伴奏的平均值，单位 dB。
+合成音频只能粗略反映真实素材，条件允许时请使用从目标视频中截取的片段。
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from . import fixtures
+from config_utils import ConfigUtils
+from tools.step005_audio_ingest import load_audio, SOURCE_SAMPLE_RATE, SOURCE_CHANNELS
+from tools.step010_demucs_vr import DEMUCS_PRESETS, load_model, release_model
+
+
+def sdr(reference, estimate):
+    length = min(reference.shape[-1], estimate.shape[-1])
+    reference, estimate = reference[..., :length], estimate[..., :length]
+    noise = np.sum((reference - estimate) ** 2)
+    return float(10 * np.log10(np.sum(reference ** 2) / max(noise, 1e-10) + 1e-10))
+
+
+def evaluate(preset, folders, device):
+    params = DEMUCS_PRESETS[preset]
+    separator = load_model(params['model_name'], device, False, params['shifts'], params['overlap'])
+    rows = []
+    for folder in folders:
+        wav = torch.from_numpy(load_audio(folder, 'audio.wav', SOURCE_SAMPLE_RATE, SOURCE_CHANNELS))
+        torch.manual_seed(0)
+        t_start = time.perf_counter()
+        _, separated = separator.separate_tensor(wav, SOURCE_SAMPLE_RATE)
+        elapsed = time.perf_counter() - t_start
+        vocals = separated['vocals'].numpy()
+        instruments = sum(v for k, v in separated.items() if k != 'vocals').numpy()
+        vocals_sdr = sdr(load_audio(folder, 'audio_vocals.wav', SOURCE_SAMPLE_RATE, SOURCE_CHANNELS), vocals)
+        instruments_sdr = sdr(load_audio(folder, 'audio_instruments.wav', SOURCE_SAMPLE_RATE, SOURCE_CHANNELS),
+                              instruments)
+        audio_seconds = wav.shape[-1] / SOURCE_SAMPLE_RATE
+        rows.append({
+            'folder': folder,
+            'elapsed': elapsed,
+            'audio_seconds': audio_seconds,
+            'rtf': elapsed / audio_seconds,
+            'vocals_sdr': vocals_sdr,
+            'instruments_sdr': instruments_sdr,
+            'sdr': (vocals_sdr + instruments_sdr) / 2,
+        })
+    return rows
+
+
+def summarize(rows):
+    elapsed = sum(r['elapsed'] for r in rows)
+    audio_seconds = sum(r['audio_seconds'] for r in rows)
+    return {
+        'elapsed': elapsed,
+        'audio_seconds': audio_seconds,
+        'rtf': elapsed / audio_seconds if audio_seconds else None,
+        'vocals_sdr': sum(r['vocals_sdr'] for r in rows) / len(rows),
+        'instruments_sdr': sum(r['instruments_sdr'] for r in rows) / len(rows),
+        'sdr': sum(r['sdr'] for r in rows) / len(rows),
+    }
+
+
+def choose_preset(summaries, tolerance):
+    """在平均 SDR 不低于最好结果 tolerance dB 的预设中选择最快的一个"""
+    best_sdr = max(s['sdr'] for s in summaries.values())
+    candidates = [preset for preset, s in summaries.items() if s['sdr'] >= best_sdr - tolerance]
+    return min(candidates, key=lambda preset: summaries[preset]['elapsed'])
+
+
+def format_report(summaries, chosen):
+    header = f'{"preset":<10}{"time(s)":>10}{"RTF":>8}{"vocals":>9}{"instr":>9}{"SDR(dB)":>9}'
+    lines = [header, '-' * len(header)]
+    for preset, s in summaries.items():
+        mark = '  <- selected' if preset == chosen else ''
+        lines.append(f'{preset:<10}{s["elapsed"]:>10.2f}{s["rtf"]:>8.3f}{s["vocals_sdr"]:>9.2f}'
+                     f'{s["instruments_sdr"]:>9.2f}{s["sdr"]:>9.2f}{mark}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='人声分离预设校准')
+    parser.add_argument('--fixtures', nargs='+', default=None,
+                        help='包含 audio.wav 和参考分轨的文件夹，不指定时生成合成音频')
+    parser.add_argument('--duration', type=float, default=30.0, help='合成音频时长（秒）')
+    parser.add_argument('--presets', nargs='+', default=list(DEMUCS_PRESETS), choices=list(DEMUCS_PRESETS))
+    parser.add_argument('--tolerance', type=float, default=0.5, help='允许比最好结果低的 SDR (dB)')
+    parser.add_argument('--device', default='auto', choices=['auto', 'cuda', 'cpu'])
+    parser.add_argument('--apply', action='store_true', help='把选出的预设写入 config.json')
+    parser.add_argument('--output', default=None, help='把报告写入JSON文件')
+    options = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='demucs_presets_') as tmp:
+        folders = options.fixtures or [
+            fixtures.make_folder(os.path.join(tmp, f'clip{seed}'), duration=options.duration, seed=seed)
+            for seed in range(2)]
+        results = {}
+        for preset in options.presets:
+            print(f'running {preset} ...', flush=True)
+            results[preset] = evaluate(preset, folders, options.device)
+        release_model()
+
+    summaries = {preset: summarize(rows) for preset, rows in results.items()}
+    chosen = choose_preset(summaries, options.tolerance)
+    print(format_report(summaries, chosen))
+
+    if options.apply:
+        config = ConfigUtils.load_config()
+        config['demucs_preset'] = chosen
+        ConfigUtils.save_config(config, append_log_func=print)
+    if options.output:
+        report = {
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'machine': platform.platform(),
+            'device': options.device,
+            'tolerance': options.tolerance,
+            'selected': chosen,
+            'presets': {preset: DEMUCS_PRESETS[preset] for preset in summaries},
+            'summary': summaries,
+            'clips': results,
+        }
+        with open(options.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+确定性的合成测试数据：音调与噪声混合的音频、假的转写与翻译结果。
+同样的参数与随机种子总是生成完全相同的文件，便于和基线对比。
+"""
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+from scipy.io import wavfile
+
+SAMPLE_RATE = 44100
+
+_WORDS = ['the', 'model', 'audio', 'signal', 'video', 'speech', 'voice', 'network', 'time', 'frequency',
+          'learning', 'data', 'result', 'people', 'world', 'today', 'because', 'really', 'think', 'going']
+_CHARS = '我们今天来讲一个关于声音视频模型数据学习世界时间频率网络结果大家因为真的觉得可以这样那么'
+
+
+def _write_wav(path, wav, sample_rate):
+    wav = np.clip(wav, -1, 1)
+    if wav.ndim == 2:
+        wav = wav.T
+    wavfile.write(path, sample_rate, (wav * 32767).astype(np.int16))
+
+
+def make_vocals(duration, sample_rate=SAMPLE_RATE, seed=0):
+    """带颤音的谐波音调，按 0.5~3 秒的"句子"间隔出现，模拟人声"""
+    rng = np.random.RandomState(seed)
+    n = int(duration * sample_rate)
+    t = np.arange(n) / sample_rate
+    f0 = 140 + 40 * np.sin(2 * np.pi * 0.3 * t) + 5 * np.sin(2 * np.pi * 5.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    gate = np.zeros(n)
+    pos = 0
+    while pos < n:
+        length = int(rng.uniform(0.5, 3.0) * sample_rate)
+        gate[pos:pos + length] = 1
+        pos += length + int(rng.uniform(0.2, 1.0) * sample_rate)
+    voice = 0.3 * voice * gate
+    return np.stack([voice, voice * 0.95]).astype(np.float32)
+
+
+def make_instruments(duration, sample_rate=SAMPLE_RATE, seed=0):
+    """低频和弦加粉红噪声，模拟背景音乐"""
+    rng = np.random.RandomState(seed + 1)
+    n = int(duration * sample_rate)
+    t = np.arange(n) / sample_rate
+    chord = sum(np.sin(2 * np.pi * f * t) for f in (110.0, 138.6, 164.8)) / 3
+    white = rng.randn(2, n)
+    # 一阶低通近似粉红噪声
+    noise = np.cumsum(white, axis=1)
+    noise -= noise.mean(axis=1, keepdims=True)
+    noise /= np.abs(noise).max() + 1e-8
+    return (0.2 * chord + 0.05 * noise).astype(np.float32)
+
+
+def make_transcript(num_lines, duration, seed=0, speakers=1):
+    """按时间均匀切分的假转写结果"""
+    rng = np.random.RandomState(seed + 2)
+    bounds = np.linspace(0, duration, num_lines + 1)
+    transcript = []
+    for i in range(num_lines):
+        words = rng.choice(_WORDS, size=rng.randint(4, 16))
+        transcript.append({
+            'start': round(float(bounds[i]), 3),
+            'end': round(float(bounds[i + 1]) - 0.05, 3),
+            'text': ' '.join(words).capitalize() + '.',
+            'speaker': f'SPEAKER_{i % speakers:02d}',
+        })
+    return transcript
+
+
+def make_translation(transcript, seed=0):
+    """为转写结果生成长度与原文相关的假中文翻译"""
+    rng = np.random.RandomState(seed + 3)
+    translation = []
+    for line in transcript:
+        length = max(4, len(line['text']) // 3)
+        chars = ''.join(rng.choice(list(_CHARS), size=length))
+        mid = length // 2
+        translation.append(dict(line, translation=f'{chars[:mid]}，{chars[mid:]}。'))
+    return translation
+
+
+def make_video(path, duration, audio_path):
+    """用 ffmpeg 的 testsrc 生成测试视频，没有 ffmpeg 时返回 False"""
+    if shutil.which('ffmpeg') is None:
+        return False
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+               '-f', 'lavfi', '-i', f'testsrc=size=320x240:rate=15:duration={duration}',
+               '-i', audio_path, '-shortest', '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', path]
+    return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE).returncode == 0
+
+
+def make_folder(folder, duration=60.0, num_lines=20, speakers=1, seed=0, video=False):
+    """
+    生成一个与流水线中间结果结构相同的视频文件夹:
+    audio.wav / audio_vocals.wav / audio_instruments.wav / transcript.json / translation.json / summary.json
+    以及 SPEAKER/*.wav，可选 download.mp4
+    """
+    os.makedirs(folder, exist_ok=True)
+    vocals = make_vocals(duration, seed=seed)
+    instruments = make_instruments(duration, seed=seed)
+    _write_wav(os.path.join(folder, 'audio_vocals.wav'), vocals, SAMPLE_RATE)
+    _write_wav(os.path.join(folder, 'audio_instruments.wav'), instruments, SAMPLE_RATE)
+    _write_wav(os.path.join(folder, 'audio.wav'), vocals + instruments, SAMPLE_RATE)
+
+    transcript = make_transcript(num_lines, duration, seed=seed, speakers=speakers)
+    translation = make_translation(transcript, seed=seed)
+    with open(os.path.join(folder, 'transcript.json'), 'w', encoding='utf-8') as f:
+        json.dump(transcript, f, indent=4, ensure_ascii=False)
+    with open(os.path.join(folder, 'translation.json'), 'w', encoding='utf-8') as f:
+        json.dump(translation, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(folder, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump({'title': 'Benchmark', 'author': 'Unknown', 'summary': 'Synthetic benchmark fixture',
+                   'tags': [], 'language': '简体中文'}, f, indent=2, ensure_ascii=False)
+
+    speaker_folder = os.path.join(folder, 'SPEAKER')
+    os.makedirs(speaker_folder, exist_ok=True)
+    for s in range(speakers):
+        _write_wav(os.path.join(speaker_folder, f'SPEAKER_{s:02d}.wav'),
+                   make_vocals(min(duration, 10.0), sample_rate=24000, seed=seed + s)[0], 24000)
+
+    if video:
+        make_video(os.path.join(folder, 'download.mp4'), duration, os.path.join(folder, 'audio.wav'))
+    return folder
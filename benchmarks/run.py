@@ -0,0 +1,161 @@
+"""
+端到端基准测试入口，可在离线、仅CPU的机器上运行。
+
+    python -m benchmarks.run                        # 运行所有阶段
+    python -m benchmarks.run --stages tts_timeline  # 只运行指定阶段
+    python -m benchmarks.run --save-baseline        # 保存为基线
+    python -m benchmarks.run --compare              # 与基线比较，超过阈值时返回非零退出码
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+# 离线运行，禁止任何模型下载
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+from . import fixtures
+from .stages import BENCHMARKS
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def run_benchmark(name, options):
+    spec = BENCHMARKS[name]
+    timings = []
+    duration = None
+    with tempfile.TemporaryDirectory(prefix=f'bench_{name}_') as tmp:
+        folder = fixtures.make_folder(os.path.join(tmp, 'video'), duration=options.duration,
+                                      num_lines=options.lines, speakers=options.speakers,
+                                      seed=options.seed, video=spec['video'])
+        func, duration = spec['setup'](folder, options)
+        if func is None:
+            return {'stage': name, 'skipped': True}
+        for i in range(options.warmup + options.repeat):
+            t_start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - t_start
+            if i >= options.warmup:
+                timings.append(elapsed)
+    median = statistics.median(timings)
+    return {
+        'stage': name,
+        'repeat': len(timings),
+        'median': median,
+        'min': min(timings),
+        'max': max(timings),
+        'audio_seconds': duration,
+        'rtf': median / duration if duration else None,
+        'throughput': duration / median if duration and median else None,
+    }
+
+
+def baseline_path(options):
+    return options.baseline or os.path.join(BASELINE_DIR, f'{platform.node() or "default"}.json')
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for result in results:
+        base = baseline.get('results', {}).get(result['stage'])
+        if result.get('skipped') or not base:
+            continue
+        ratio = result['median'] / base['median']
+        result['baseline'] = base['median']
+        result['change'] = ratio - 1
+        if ratio > 1 + threshold:
+            regressions.append(result)
+    return regressions
+
+
+def format_results(results):
+    def fmt(value, spec='.3f'):
+        return '-' if value is None else format(value, spec)
+
+    header = f'{"stage":<26}{"median(s)":>11}{"min(s)":>10}{"RTF":>9}{"x realtime":>12}{"vs base":>10}'
+    lines = [header, '-' * len(header)]
+    for r in results:
+        if r.get('skipped'):
+            lines.append(f'{r["stage"]:<26}{"skipped":>11}')
+            continue
+        change = f'{r["change"] * 100:+.1f}%' if 'change' in r else '-'
+        lines.append(f'{r["stage"]:<26}{fmt(r["median"]):>11}{fmt(r["min"]):>10}{fmt(r["rtf"], ".4f"):>9}'
+                     f'{fmt(r["throughput"], ".1f"):>12}{change:>10}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Linly-Dubbing 流水线基准测试')
+    parser.add_argument('--stages', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--duration', type=float, default=60.0, help='合成音频时长（秒）')
+    parser.add_argument('--lines', type=int, default=20, help='假转写的行数')
+    parser.add_argument('--speakers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--demucs-model', default='tiny', help='tiny 表示随机初始化的小模型，也可以是本地已缓存的模型名')
+    parser.add_argument('--shifts', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=None, help='torch 计算线程数')
+    parser.add_argument('--baseline', default=None, help='基线文件路径')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.15, help='判定为性能回退的相对阈值')
+    parser.add_argument('--output', default=None, help='把结果写入JSON文件')
+    options = parser.parse_args(argv)
+
+    if options.threads:
+        import torch
+        torch.set_num_threads(options.threads)
+
+    results = []
+    for name in options.stages:
+        print(f'running {name} ...', flush=True)
+        results.append(run_benchmark(name, options))
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'machine': platform.platform(),
+        'python': platform.python_version(),
+        'params': {k: getattr(options, k) for k in ('duration', 'lines', 'speakers', 'seed', 'demucs_model', 'shifts', 'threads')},
+        'results': {r['stage']: r for r in results},
+    }
+
+    exit_code = 0
+    if options.compare:
+        path = baseline_path(options)
+        if not os.path.exists(path):
+            print(f'baseline not found: {path}')
+            exit_code = 2
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            if baseline.get('params') != report['params']:
+                print('warning: baseline was recorded with different parameters')
+            regressions = compare(results, baseline, options.threshold)
+            if regressions:
+                exit_code = 1
+
+    print(format_results(results))
+    if exit_code == 1:
+        print(f'\nREGRESSION (> {options.threshold * 100:.0f}% slower than baseline): '
+              + ', '.join(r['stage'] for r in regressions))
+
+    if options.save_baseline:
+        path = baseline_path(options)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'baseline saved to {path}')
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
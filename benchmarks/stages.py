@@ -0,0 +1,145 @@
+"""
+各流水线阶段的独立基准测试。
+
+每个基准函数接收一个已经准备好的夹具文件夹，返回 (被计时的函数, 处理的音频秒数)。
+在没有真实模型权重的离线 CPU 机器上，使用随机初始化的小模型或桩函数代替。
+"""
+import os
+import shutil
+
+import numpy as np
+
+from . import fixtures
+
+BENCHMARKS = {}
+
+
+def benchmark(name, video=False):
+    def decorator(func):
+        BENCHMARKS[name] = {'setup': func, 'video': video}
+        return func
+    return decorator
+
+
+def _tiny_demucs():
+    import torch
+    from demucs.htdemucs import HTDemucs
+    torch.manual_seed(0)
+    model = HTDemucs(sources=['drums', 'bass', 'other', 'vocals'], channels=8, t_layers=1, dconv_depth=1)
+    model.eval()
+    return model
+
+
+@benchmark('separation')
+def separation(folder, options):
+    """demucs.apply.apply_model，默认使用随机初始化的小 HTDemucs"""
+    import torch
+    from demucs.apply import apply_model
+    from demucs.pretrained import get_model
+    from tools.step005_audio_ingest import load_audio
+
+    model = _tiny_demucs() if options.demucs_model == 'tiny' else get_model(options.demucs_model)
+    wav = torch.from_numpy(load_audio(folder, 'audio.wav', 44100, 2))
+    duration = wav.shape[-1] / 44100
+
+    def run():
+        with torch.no_grad():
+            apply_model(model, wav[None], shifts=options.shifts, split=True, overlap=0.25, progress=False,
+                        device='cpu')
+    return run, duration
+
+
+@benchmark('speaker_audio')
+def speaker_audio(folder, options):
+    """step020_asr 中的 merge_segments 与 generate_speaker_audio"""
+    import json
+    from tools.step020_asr import merge_segments, generate_speaker_audio
+
+    with open(os.path.join(folder, 'transcript.json'), 'r', encoding='utf-8') as f:
+        transcript = json.load(f)
+
+    def run():
+        shutil.rmtree(os.path.join(folder, 'SPEAKER'), ignore_errors=True)
+        generate_speaker_audio(folder, merge_segments([dict(line) for line in transcript]))
+    return run, transcript[-1]['end']
+
+
+@benchmark('translation_postprocess')
+def translation_postprocess(folder, options):
+    """step030_translation 中不依赖大模型的部分: valid_translation 与 split_sentences"""
+    import json
+    from tools.step030_translation import valid_translation, split_sentences
+
+    with open(os.path.join(folder, 'translation.json'), 'r', encoding='utf-8') as f:
+        translation = json.load(f)
+
+    def run():
+        for line in translation:
+            valid_translation(line['text'], f'翻译：“{line["translation"]}”')
+        split_sentences(translation)
+    return run, translation[-1]['end']
+
+
+def _stub_tts(text, output_path, *args, **kwargs):
+    """确定性的 TTS 桩函数: 按字符数生成 24kHz 的音调"""
+    from tools.utils import save_wav
+    duration = 0.18 * max(1, len(text))
+    wav = fixtures.make_vocals(duration, sample_rate=24000, seed=len(text))[0]
+    save_wav(wav, output_path)
+
+
+@benchmark('tts_timeline')
+def tts_timeline(folder, options):
+    """step040_tts.generate_wavs: 变速对齐、拼接时间线和混音，TTS 模型替换为桩函数"""
+    from tools import step040_tts
+
+    step040_tts.edge_tts = _stub_tts
+    translation_path = os.path.join(folder, 'translation.json')
+    with open(translation_path, 'r', encoding='utf-8') as f:
+        original = f.read()
+
+    def run():
+        # generate_wavs 会改写 translation.json 并跳过已存在的 wav，每次运行前恢复
+        with open(translation_path, 'w', encoding='utf-8') as f:
+            f.write(original)
+        shutil.rmtree(os.path.join(folder, 'wavs'), ignore_errors=True)
+        step040_tts.generate_wavs('EdgeTTS', folder, target_language='中文')
+    duration = fixtures.make_transcript(options.lines, options.duration)[-1]['end']
+    return run, duration
+
+
+@benchmark('synthesis', video=True)
+def synthesis(folder, options):
+    """step050_synthesize_video.synthesize_video（需要 ffmpeg）"""
+    from tools.step050_synthesize_video import synthesize_video
+
+    if not os.path.exists(os.path.join(folder, 'download.mp4')):
+        return None, None
+    shutil.copyfile(os.path.join(folder, 'audio.wav'), os.path.join(folder, 'audio_combined.wav'))
+
+    def run():
+        synthesize_video(folder, subtitles=False, resolution='240p', fps=15)
+    return run, options.duration
+
+
+def _dtw_matrices(options, seed=0):
+    # 每个 30 秒窗口 1500 帧，token 数随机，按总时长生成对应数量的窗口
+    rng = np.random.RandomState(seed)
+    windows = max(1, int(options.duration // 30))
+    return [rng.randn(rng.randint(20, 120), 1500) for _ in range(windows)], windows * 30.0
+
+
+@benchmark('whisper_dtw')
+def whisper_dtw(folder, options):
+    """whisper.timing.dtw_cpu 逐个窗口对齐"""
+    try:
+        from whisper.timing import dtw_cpu
+    except ImportError:
+        return None, None
+    matrices, duration = _dtw_matrices(options)
+    dtw_cpu(matrices[0])  # 触发 numba 编译
+
+    def run():
+        for x in matrices:
+            dtw_cpu(x)
+    return run, duration
@@ -0,0 +1,157 @@
+"""
+XTTS CPU 部署对比报告：在固定句子集上比较 fp32 与 int8 动态量化 / bf16 的速度和输出差异。
+
+    python -m benchmarks.xtts_quantization --speaker-wav ref.wav
+    python -m benchmarks.xtts_quantization --speaker-wav ref.wav --modes int8 bf16 --threads 4 --output report.json
+
+为了让各精度的输出可比较，GPT 使用贪心解码（do_sample=False）。
+准确度用两项指标衡量: 与 fp32 输出的时长比，以及两者 log-mel 频谱的平均 L1 距离。
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+
+import torch
+import torchaudio
+
+from tools.step042_tts_xtts import configure_cpu_threads, quantize_gpt, bf16_supported, language_map
+
+SENTENCES = {
+    'zh-cn': [
+        '大家好，欢迎来到今天的节目。',
+        '这是一段用于比较量化前后语音质量的测试句子。',
+        '今天的天气非常好，我们一起去公园散步吧。',
+        '人工智能正在改变我们生活和工作的方式。',
+        '请在下一个路口向右转，然后直行三百米。',
+    ],
+    'en': [
+        'Hello everyone, and welcome to today\'s show.',
+        'This sentence is used to compare speech quality before and after quantization.',
+        'The weather is lovely today, so let\'s take a walk in the park.',
+        'Artificial intelligence is changing the way we live and work.',
+        'Turn right at the next intersection and go straight for three hundred meters.',
+    ],
+}
+
+SAMPLE_RATE = 24000
+
+
+def load_xtts(model_path):
+    from TTS.api import TTS
+    if os.path.isdir(model_path):
+        tts = TTS(model_path=model_path, config_path=os.path.join(model_path, 'config.json'))
+    else:
+        tts = TTS('tts_models/multilingual/multi-dataset/xtts_v2')
+    return tts.to('cpu').synthesizer.tts_model
+
+
+def log_mel(wav, mel):
+    return torch.log(mel(wav.float()).clamp(min=1e-5))
+
+
+def synthesize(xtts, sentences, language, gpt_cond_latent, speaker_embedding, bf16=False):
+    outputs = []
+    for text in sentences:
+        torch.manual_seed(0)
+        t_start = time.perf_counter()
+        with torch.autocast('cpu', dtype=torch.bfloat16, enabled=bf16):
+            out = xtts.inference(text, language, gpt_cond_latent, speaker_embedding, do_sample=False)
+        elapsed = time.perf_counter() - t_start
+        wav = torch.as_tensor(out['wav']).float()
+        outputs.append({'text': text, 'wav': wav, 'elapsed': elapsed, 'audio_seconds': wav.shape[-1] / SAMPLE_RATE})
+    return outputs
+
+
+def compare(reference, outputs, mel):
+    rows = []
+    for ref, out in zip(reference, outputs):
+        length = min(ref['wav'].shape[-1], out['wav'].shape[-1])
+        distance = (log_mel(ref['wav'][:length], mel) - log_mel(out['wav'][:length], mel)).abs().mean().item()
+        rows.append({
+            'text': out['text'],
+            'elapsed': out['elapsed'],
+            'audio_seconds': out['audio_seconds'],
+            'rtf': out['elapsed'] / out['audio_seconds'] if out['audio_seconds'] else None,
+            'duration_ratio': out['audio_seconds'] / ref['audio_seconds'] if ref['audio_seconds'] else None,
+            'mel_l1': distance,
+        })
+    return rows
+
+
+def summarize(rows):
+    elapsed = sum(r['elapsed'] for r in rows)
+    audio_seconds = sum(r['audio_seconds'] for r in rows)
+    return {
+        'elapsed': elapsed,
+        'audio_seconds': audio_seconds,
+        'rtf': elapsed / audio_seconds if audio_seconds else None,
+        'mean_duration_ratio': sum(r['duration_ratio'] for r in rows) / len(rows),
+        'mean_mel_l1': sum(r['mel_l1'] for r in rows) / len(rows),
+    }
+
+
+def format_report(summaries):
+    header = f'{"mode":<8}{"time(s)":>10}{"audio(s)":>10}{"RTF":>8}{"speedup":>9}{"dur ratio":>11}{"mel L1":>9}'
+    lines = [header, '-' * len(header)]
+    base_rtf = summaries['fp32']['rtf']
+    for mode, s in summaries.items():
+        speedup = base_rtf / s['rtf'] if s['rtf'] else 0
+        lines.append(f'{mode:<8}{s["elapsed"]:>10.2f}{s["audio_seconds"]:>10.2f}{s["rtf"]:>8.3f}{speedup:>8.2f}x'
+                     f'{s["mean_duration_ratio"]:>11.3f}{s["mean_mel_l1"]:>9.3f}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='XTTS fp32 / int8 / bf16 CPU 推理对比')
+    parser.add_argument('--model', default='models/TTS/XTTS-v2', help='本地模型目录，不存在时使用 TTS 默认的 xtts_v2')
+    parser.add_argument('--speaker-wav', required=True, help='说话人参考音频')
+    parser.add_argument('--language', default='中文', choices=list(language_map))
+    parser.add_argument('--modes', nargs='+', default=['int8'], choices=['int8', 'bf16'])
+    parser.add_argument('--threads', type=int, default=None, help='intra-op 线程数')
+    parser.add_argument('--interop-threads', type=int, default=None, help='inter-op 线程数')
+    parser.add_argument('--output', default=None, help='把报告写入JSON文件')
+    options = parser.parse_args(argv)
+
+    configure_cpu_threads(options.threads, options.interop_threads)
+    language = language_map[options.language]
+    sentences = SENTENCES.get(language, SENTENCES['en'])
+
+    xtts = load_xtts(options.model)
+    gpt_cond_latent, speaker_embedding = xtts.get_conditioning_latents(audio_path=options.speaker_wav)
+    mel = torchaudio.transforms.MelSpectrogram(sample_rate=SAMPLE_RATE, n_fft=1024, hop_length=256, n_mels=80)
+
+    print('running fp32 ...', flush=True)
+    reference = synthesize(xtts, sentences, language, gpt_cond_latent, speaker_embedding)
+    results = {'fp32': compare(reference, reference, mel)}
+    for mode in options.modes:
+        if mode == 'bf16' and not bf16_supported():
+            print('bf16 is not supported on this CPU, skipped')
+            continue
+        print(f'running {mode} ...', flush=True)
+        model = quantize_gpt(copy.deepcopy(xtts)) if mode == 'int8' else xtts
+        outputs = synthesize(model, sentences, language, gpt_cond_latent, speaker_embedding, bf16=mode == 'bf16')
+        results[mode] = compare(reference, outputs, mel)
+
+    summaries = {mode: summarize(rows) for mode, rows in results.items()}
+    print(format_report(summaries))
+    if options.output:
+        report = {
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'machine': platform.platform(),
+            'threads': torch.get_num_threads(),
+            'interop_threads': torch.get_num_interop_threads(),
+            'language': language,
+            'summary': summaries,
+            'sentences': results,
+        }
+        with open(options.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,6 +15,9 @@ class ConfigUtils:
             "model": "htdemucs_ft",
             "device": "auto",
             "shifts": 5,
+            "demucs_preset": "custom",
+            "speech_map": False,
+            "skip_silence": False,
             "asr_model": "WhisperX",
             "whisperx_size": "large",
             "batch_size": 32,
@@ -26,6 +29,8 @@ class ConfigUtils:
             "tts_method": "EdgeTTS",
             "target_language_tts": "中文",
             "edge_tts_voice": "zh-CN-XiaoxiaoNeural",
+            "streaming_tts": False,
+            "pipeline_tts": False,
             "add_subtitles": True,
             "speed_factor": 1.00,
             "frame_rate": 30,
@@ -85,9 +90,10 @@ class ConfigUtils:
 
         summary_text = "● 视频输出目录: {}\n".format(config.get("video_folder", "videos"))
         summary_text += "● 分辨率: {}\n".format(config.get("resolution", "1080p"))
-        summary_text += "● 人声分离: {}, 设备: {}\n".format(
+        summary_text += "● 人声分离: {}, 设备: {}, 预设: {}\n".format(
             config.get("model", "htdemucs_ft"),
-            config.get("device", "auto")
+            config.get("device", "auto"),
+            config.get("demucs_preset", "custom")
         )
         summary_text += "● 语音识别: {}, 模型: {}\n".format(
             config.get("asr_model", "WhisperX"),
@@ -74,6 +74,8 @@ class FullAutoTab(QWidget):
         # 处理线程
         self.worker_thread = None
         self._processing = False
+        # 每次运行新建一个中止标志，停止后立即重新运行时旧线程仍然能看到自己的中止标志
+        self.abort_event = threading.Event()
         self.signals = WorkerSignals()
         self.signals.finished.connect(self.process_finished)
         self.signals.progress.connect(self.update_progress)
@@ -439,8 +441,8 @@ class FullAutoTab(QWidget):
         # 开始处理
         self.run_process(task_id=task.id)
 
-    def process_thread(self, task_id=None):
-        """异步处理线程"""
+    def process_thread(self, task_id=None, abort_event=None):
+        """异步处理线程，abort_event 是本次运行专用的中止标志"""
         config = self.config or {}
         try:
             self.signals.log.emit("开始处理...")
@@ -460,6 +462,7 @@ class FullAutoTab(QWidget):
             self.signals.log.emit(f"人声分离模型: {config.get('model', 'htdemucs_ft')}")
             self.signals.log.emit(f"计算设备: {config.get('device', 'auto')}")
             self.signals.log.emit(f"移位次数: {config.get('shifts', 5)}")
+            self.signals.log.emit(f"人声分离预设: {config.get('demucs_preset', 'custom')}")
             self.signals.log.emit(f"ASR模型: {config.get('asr_model', 'WhisperX')}")
             self.signals.log.emit(f"WhisperX模型大小: {config.get('whisperx_size', 'large')}")
             self.signals.log.emit(f"翻译方法: {config.get('translation_method', 'LLM')}")
@@ -499,9 +502,20 @@ class FullAutoTab(QWidget):
                 config.get('output_resolution', '1080p'),
                 config.get('max_workers', 1),
                 config.get('max_retries', 3),
-                progress_callback
+                progress_callback,
+                config.get('streaming_tts', False),
+                abort_event,
+                config.get('demucs_preset', 'custom'),
+                config.get('speech_map', False),
+                config.get('skip_silence', False),
+                config.get('pipeline_tts', False)
             )
 
+            if abort_event is not None and abort_event.is_set():
+                # 已被用户停止，界面和任务状态已经在 stop_process 中更新，可能已经开始了新的运行
+                self.signals.log.emit(f"已停止的处理结束: {result}")
+                return
+
             # 完成处理，设置100%进度
             self.signals.progress.emit(100, "处理完成!")
             self.signals.log.emit(f"处理完成: {result}")
@@ -530,6 +544,8 @@ class FullAutoTab(QWidget):
             stack_trace = traceback.format_exc()
             error_msg = f"处理失败: {str(e)}\n\n堆栈跟踪:\n{stack_trace}"
             self.signals.log.emit(error_msg)
+            if abort_event is not None and abort_event.is_set():
+                return
             self.signals.progress.emit(0, "处理失败")
 
             # 更新任务状态为失败（如果是来自任务队列的请求）
@@ -560,7 +576,8 @@ class FullAutoTab(QWidget):
         self.open_folder_button.setEnabled(False)
         self.status_label.setText("正在处理...")
 
-        # 重置进度
+        # 新建中止标志并重置进度
+        self.abort_event = threading.Event()
         self.current_progress = 0
         self.current_step = 0
         self.progress_bar.setValue(0)
@@ -582,7 +599,8 @@ class FullAutoTab(QWidget):
             QTimer.singleShot(5000, lambda: self.process_finished("模拟处理完成", "", task_id))
         else:
             # 创建并启动处理线程
-            self.worker_thread = threading.Thread(target=lambda: self.process_thread(task_id))
+            abort_event = self.abort_event
+            self.worker_thread = threading.Thread(target=lambda: self.process_thread(task_id, abort_event))
             self.worker_thread.daemon = True
             self.worker_thread.start()
 
@@ -591,8 +609,8 @@ class FullAutoTab(QWidget):
         if not self._processing:
             return
 
-        # TODO: 添加中断处理线程的代码
-        # 注意：这里仅设置状态并更新UI，实际中断需要在process_thread中实现
+        # 通知处理线程中止，流式合成会在下一个音频块处停止，其它阶段在当前阶段结束后停止
+        self.abort_event.set()
 
         self._processing = False
         self.run_button.setEnabled(True)
@@ -49,6 +49,7 @@ class ProcessUtils:
                 signals.log.emit(f"人声分离模型: {config.get('model', 'htdemucs_ft')}")
                 signals.log.emit(f"计算设备: {config.get('device', 'auto')}")
                 signals.log.emit(f"移位次数: {config.get('shifts', 5)}")
+                signals.log.emit(f"人声分离预设: {config.get('demucs_preset', 'custom')}")
                 signals.log.emit(f"ASR模型: {config.get('asr_method', 'WhisperX')}")
                 signals.log.emit(f"WhisperX模型大小: {config.get('whisperx_size', 'large')}")
                 signals.log.emit(f"翻译方法: {config.get('translation_method', 'LLM')}")
@@ -87,7 +88,13 @@ class ProcessUtils:
                     config.get('output_resolution', '1080p'),
                     config.get('max_workers', 1),
                     config.get('max_retries', 3),
-                    progress_callback
+                    progress_callback,
+                    config.get('streaming_tts', False),
+                    None,  # abort_event
+                    config.get('demucs_preset', 'custom'),
+                    config.get('speech_map', False),
+                    config.get('skip_silence', False),
+                    config.get('pipeline_tts', False)
                 )
 
                 # Complete processing, set 100% progress
@@ -194,6 +194,18 @@ class SettingsTab(QWidget):
         self.shifts = CustomSlider(0, 10, 1, "", 5)
         audio_form.addRow("移位次数:", self.shifts)
 
+        # 质量/速度预设，custom 时使用上面的模型和移位次数
+        self.demucs_preset = DropdownSelector(['custom', 'fast', 'balanced', 'best'], "", 'custom')
+        audio_form.addRow("分离预设:", self.demucs_preset)
+
+        # 语音区间检测，语音识别和说话人参考音频只处理有人声的部分
+        self.speech_map = DropdownSelector([False, True], "", False)
+        audio_form.addRow("语音区间检测:", self.speech_map)
+
+        # 人声分离跳过非语音部分，原始混音直接作为伴奏
+        self.skip_silence = DropdownSelector([False, True], "", False)
+        audio_form.addRow("跳过非语音段:", self.skip_silence)
+
         audio_widget = QWidget()
         audio_widget.setLayout(audio_form)
         self.scroll_layout.addWidget(audio_widget)
@@ -282,6 +294,14 @@ class SettingsTab(QWidget):
         )
         tts_form.addRow("EdgeTTS声音:", self.edge_tts_voice)
 
+        # 流式合成，边合成边生成预览
+        self.streaming_tts = DropdownSelector([False, True], "", False)
+        tts_form.addRow("流式合成预览:", self.streaming_tts)
+
+        # 翻译与语音合成流水线，每翻译完一句就开始合成
+        self.pipeline_tts = DropdownSelector([False, True], "", False)
+        tts_form.addRow("边翻译边合成:", self.pipeline_tts)
+
         tts_widget = QWidget()
         tts_widget.setLayout(tts_form)
         self.scroll_layout.addWidget(tts_widget)
@@ -359,6 +379,9 @@ class SettingsTab(QWidget):
             "model": self.model.value(),
             "device": self.device.value(),
             "shifts": self.shifts.value(),
+            "demucs_preset": self.demucs_preset.value(),
+            "speech_map": self.speech_map.value(),
+            "skip_silence": self.skip_silence.value(),
             "asr_model": self.asr_model.value(),
             "whisperx_size": self.whisperx_size.value(),
             "batch_size": self.batch_size.value(),
@@ -370,6 +393,8 @@ class SettingsTab(QWidget):
             "tts_method": self.tts_method.value(),
             "target_language_tts": self.target_language_tts.value(),
             "edge_tts_voice": self.edge_tts_voice.value(),
+            "streaming_tts": self.streaming_tts.value(),
+            "pipeline_tts": self.pipeline_tts.value(),
             "add_subtitles": self.add_subtitles.value(),
             "speed_factor": self.speed_factor.value(),
             "frame_rate": self.frame_rate.value(),
@@ -394,6 +419,9 @@ class SettingsTab(QWidget):
             self.model.setValue(config.get("model", "htdemucs_ft"))
             self.device.setValue(config.get("device", "auto"))
             self.shifts.setValue(config.get("shifts", 5))
+            self.demucs_preset.setValue(config.get("demucs_preset", "custom"))
+            self.speech_map.setValue(config.get("speech_map", False))
+            self.skip_silence.setValue(config.get("skip_silence", False))
             self.asr_model.setValue(config.get("asr_model", "WhisperX"))
             self.whisperx_size.setValue(config.get("whisperx_size", "large"))
             self.batch_size.setValue(config.get("batch_size", 32))
@@ -405,6 +433,8 @@ class SettingsTab(QWidget):
             self.tts_method.setValue(config.get("tts_method", "EdgeTTS"))
             self.target_language_tts.setValue(config.get("target_language_tts", "中文"))
             self.edge_tts_voice.setValue(config.get("edge_tts_voice", "zh-CN-XiaoxiaoNeural"))
+            self.streaming_tts.setValue(config.get("streaming_tts", False))
+            self.pipeline_tts.setValue(config.get("pipeline_tts", False))
             self.add_subtitles.setValue(config.get("add_subtitles", True))
             self.speed_factor.setValue(config.get("speed_factor", 1.00))
             self.frame_rate.setValue(config.get("frame_rate", 30))
@@ -464,6 +494,9 @@ class SettingsTab(QWidget):
                 "model": "htdemucs_ft",
                 "device": "auto",
                 "shifts": 5,
+                "demucs_preset": "custom",
+                "speech_map": False,
+                "skip_silence": False,
                 "asr_model": "WhisperX",
                 "whisperx_size": "large",
                 "batch_size": 32,
@@ -475,6 +508,8 @@ class SettingsTab(QWidget):
                 "tts_method": "EdgeTTS",
                 "target_language_tts": "中文",
                 "edge_tts_voice": "zh-CN-XiaoxiaoNeural",
+                "streaming_tts": False,
+                "pipeline_tts": False,
                 "add_subtitles": True,
                 "speed_factor": 1.00,
                 "frame_rate": 30,
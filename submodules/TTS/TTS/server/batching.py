@@ -0,0 +1,228 @@
+import queue
+import struct
+import threading
+import time
+from collections import deque
+from typing import Callable, Hashable, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+
+class QueueFull(Exception):
+    """Raised by `BatchingQueue.submit` when the queue already holds `max_queue_size` requests."""
+
+
+class TTSRequest:
+    """A queued synthesis request. The model thread pushes audio chunks into it as they are ready.
+
+    Args:
+        text (str): input text.
+        key (Hashable): requests with the same key (model, speaker, language, style) can share a batch.
+    """
+
+    _END = object()
+
+    def __init__(self, text: str, key: Hashable):
+        self.text = text
+        self.key = key
+        self.enqueued_at = time.monotonic()
+        self.done = False
+        self._chunks = queue.Queue()
+
+    def put(self, chunk):
+        self._chunks.put(chunk)
+
+    def finish(self):
+        if not self.done:
+            self.done = True
+            self._chunks.put(self._END)
+
+    def fail(self, error: BaseException):
+        if not self.done:
+            self.done = True
+            self._chunks.put(error)
+
+    def chunks(self, timeout: Optional[float] = None) -> Iterator[np.ndarray]:
+        """Yield the audio chunks as they are synthesized. Re-raises the error of a failed request."""
+        while True:
+            item = self._chunks.get(timeout=timeout)
+            if item is self._END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def result(self, timeout: Optional[float] = None) -> np.ndarray:
+        """Wait for the whole waveform."""
+        chunks = list(self.chunks(timeout=timeout))
+        return np.concatenate(chunks) if chunks else np.zeros((0,), dtype=np.float32)
+
+
+class BatchingQueue:
+    """Collect concurrent TTS requests and run them on a single model thread in batches.
+
+    The model thread waits up to `max_wait_ms` after the first pending request for more requests
+    to arrive, then takes up to `max_batch_size` requests sharing the key of the oldest one.
+
+    A `synthesize` function that runs its texts one after the other gains nothing from batching; it
+    declares this with a `supports_batching = False` attribute, and the queue then runs requests
+    one at a time without waiting for more to arrive.
+
+    Args:
+        synthesize (Callable): `synthesize(key, texts) -> iterable of (index, chunk)` runs a batch and
+            yields the audio chunks of each text, in order per text. A chunk is a 1D float array, or
+            None to mark text `index` as complete so that its response can end before the batch does.
+        max_batch_size (int): maximum number of requests in a batch. Defaults to 8.
+        max_wait_ms (float): how long to wait for more requests before running a batch. Defaults to 0.
+        max_queue_size (int): pending requests above this are rejected with `QueueFull`. Defaults to 64.
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[[Hashable, List[str]], Iterable],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 0,
+        max_queue_size: int = 64,
+    ):
+        self.synthesize = synthesize
+        self.supports_batching = getattr(synthesize, "supports_batching", True)
+        self.max_batch_size = max(1, max_batch_size) if self.supports_batching else 1
+        self.max_wait = max_wait_ms / 1000 if self.supports_batching else 0.0
+        self.max_queue_size = max_queue_size
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self.in_flight = 0
+        self.requests_total = 0
+        self.rejected_total = 0
+        self.failed_total = 0
+        self.batches_total = 0
+        self.wait_seconds_total = 0.0
+        self.synthesis_seconds_total = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="tts-batching", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, text: str, key: Hashable = None) -> TTSRequest:
+        request = TTSRequest(text, key)
+        with self._cond:
+            if len(self._pending) >= self.max_queue_size:
+                self.rejected_total += 1
+                raise QueueFull(f"TTS queue is full ({self.max_queue_size} pending requests)")
+            self._pending.append(request)
+            self.requests_total += 1
+            self._cond.notify()
+        return request
+
+    @property
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _next_batch(self) -> List[TTSRequest]:
+        with self._cond:
+            while not self._pending and not self._stopped:
+                self._cond.wait()
+            if self._stopped:
+                return []
+            deadline = self._pending[0].enqueued_at + self.max_wait
+            while len(self._pending) < self.max_batch_size and not self._stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            key = self._pending[0].key
+            batch = [r for r in self._pending if r.key == key][: self.max_batch_size]
+            for request in batch:
+                self._pending.remove(request)
+            self.in_flight = len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            t_start = time.monotonic()
+            with self._cond:
+                self.wait_seconds_total += sum(t_start - r.enqueued_at for r in batch)
+            failed = 0
+            try:
+                for idx, chunk in self.synthesize(batch[0].key, [r.text for r in batch]):
+                    if chunk is None:
+                        batch[idx].finish()
+                    else:
+                        batch[idx].put(chunk)
+                for request in batch:
+                    request.finish()
+            except Exception as e:  # pylint: disable=broad-except
+                for request in batch:
+                    if not request.done:
+                        failed += 1
+                        request.fail(e)
+            # the counters are read by `stats` from the request threads
+            with self._cond:
+                self.failed_total += failed
+                self.synthesis_seconds_total += time.monotonic() - t_start
+                self.batches_total += 1
+                self.in_flight = 0
+
+    def stats(self) -> dict:
+        with self._cond:
+            queue_depth = len(self._pending)
+            batched = self.requests_total - queue_depth - self.in_flight
+            return {
+                "queue_depth": queue_depth,
+                "max_queue_size": self.max_queue_size,
+                "in_flight": self.in_flight,
+                "requests_total": self.requests_total,
+                "rejected_total": self.rejected_total,
+                "failed_total": self.failed_total,
+                "batches_total": self.batches_total,
+                "avg_batch_size": batched / self.batches_total if self.batches_total else 0.0,
+                "wait_seconds_total": self.wait_seconds_total,
+                "synthesis_seconds_total": self.synthesis_seconds_total,
+            }
+
+    def metrics_text(self, prefix: str = "tts") -> str:
+        """The stats in the Prometheus text exposition format."""
+        gauges = {"queue_depth", "max_queue_size", "in_flight", "avg_batch_size"}
+        lines = []
+        for name, value in self.stats().items():
+            lines.append(f"# TYPE {prefix}_{name} {'gauge' if name in gauges else 'counter'}")
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def wav_stream_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """RIFF/WAV header for a stream of unknown length: the size fields are set to the maximum value,
+    which players and decoders treat as "read until the end"."""
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    return (
+        b"RIFF"
+        + struct.pack("<I", 0xFFFFFFFF)
+        + b"WAVEfmt "
+        + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample)
+        + b"data"
+        + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def pcm16(chunk) -> bytes:
+    """Float waveform in [-1, 1] to little endian 16 bit PCM. Unlike `save_wav` the chunks are not
+    peak normalized, so that the loudness stays consistent across the chunks of a stream."""
+    chunk = np.clip(np.asarray(chunk, dtype=np.float32), -1, 1)
+    return (chunk * 32767).astype("<i2").tobytes()
@@ -5,13 +5,14 @@ import json
 import os
 import sys
 from pathlib import Path
-from threading import Lock
 from typing import Union
 from urllib.parse import parse_qs
 
-from flask import Flask, render_template, render_template_string, request, send_file
+import numpy as np
+from flask import Flask, Response, render_template, render_template_string, request, send_file
 
 from TTS.config import load_config
+from TTS.server.batching import BatchingQueue, QueueFull, pcm16, wav_stream_header
 from TTS.utils.manage import ModelManager
 from TTS.utils.synthesizer import Synthesizer
 
@@ -57,6 +58,16 @@ def create_argparser():
     parser.add_argument("--use_cuda", type=convert_boolean, default=False, help="true to use CUDA.")
     parser.add_argument("--debug", type=convert_boolean, default=False, help="true to enable Flask debug mode.")
     parser.add_argument("--show_details", type=convert_boolean, default=False, help="Generate model detail page.")
+    parser.add_argument("--max_batch_size", type=int, default=8, help="maximum number of requests run as one batch.")
+    parser.add_argument(
+        "--batch_wait_ms",
+        type=float,
+        default=0,
+        help="how long to collect concurrent requests before running a batch (ignored when the model cannot batch).",
+    )
+    parser.add_argument(
+        "--max_queue_size", type=int, default=64, help="pending requests above this are rejected with HTTP 503."
+    )
     return parser
 
 
@@ -185,25 +196,83 @@ def details():
     )
 
 
-lock = Lock()
+model_id = args.model_name if not args.model_path else args.model_path
+
+
+def synthesize_batch(key, texts):
+    """Run a batch of requests sharing the same model, speaker, language and style on the model thread.
+    Each text is synthesized sentence by sentence so that streaming responses get audio early.
+
+    `Synthesizer.tts` handles one text at a time, so requests are run one by one: the queue serializes access
+    to the model and applies backpressure, but does not wait to collect batches."""
+    _, speaker_idx, language_idx, style_wav = key
+    style_wav = style_wav_uri_to_dict(style_wav)
+    for idx, text in enumerate(texts):
+        for sentence in synthesizer.split_into_sentences(text) or [text]:
+            wav = synthesizer.tts(
+                sentence,
+                speaker_name=speaker_idx,
+                language_name=language_idx,
+                style_wav=style_wav,
+                split_sentences=False,
+            )
+            yield idx, np.asarray(wav, dtype=np.float32)
+        yield idx, None
+
+
+synthesize_batch.supports_batching = False
+
+tts_queue = BatchingQueue(
+    synthesize_batch,
+    max_batch_size=args.max_batch_size,
+    max_wait_ms=args.batch_wait_ms,
+    max_queue_size=args.max_queue_size,
+).start()
+
+
+def queue_full_response(error):
+    return Response(str(error), status=503, headers={"Retry-After": "1"}, mimetype="text/plain")
+
+
+def wav_response(tts_request, stream=False):
+    """Return the synthesized audio, either as a complete WAV file or streamed chunk by chunk."""
+    if stream:
+
+        def generate():
+            yield wav_stream_header(synthesizer.output_sample_rate)
+            for chunk in tts_request.chunks():
+                yield pcm16(chunk)
+
+        return Response(generate(), mimetype="audio/wav")
+    out = io.BytesIO()
+    synthesizer.save_wav(tts_request.result(), out)
+    return send_file(out, mimetype="audio/wav")
 
 
 @app.route("/api/tts", methods=["GET", "POST"])
 def tts():
-    with lock:
-        text = request.headers.get("text") or request.values.get("text", "")
-        speaker_idx = request.headers.get("speaker-id") or request.values.get("speaker_id", "")
-        language_idx = request.headers.get("language-id") or request.values.get("language_id", "")
-        style_wav = request.headers.get("style-wav") or request.values.get("style_wav", "")
-        style_wav = style_wav_uri_to_dict(style_wav)
-
-        print(f" > Model input: {text}")
-        print(f" > Speaker Idx: {speaker_idx}")
-        print(f" > Language Idx: {language_idx}")
-        wavs = synthesizer.tts(text, speaker_name=speaker_idx, language_name=language_idx, style_wav=style_wav)
-        out = io.BytesIO()
-        synthesizer.save_wav(wavs, out)
-    return send_file(out, mimetype="audio/wav")
+    text = request.headers.get("text") or request.values.get("text", "")
+    speaker_idx = request.headers.get("speaker-id") or request.values.get("speaker_id", "")
+    language_idx = request.headers.get("language-id") or request.values.get("language_id", "")
+    style_wav = request.headers.get("style-wav") or request.values.get("style_wav", "")
+    stream = (request.headers.get("stream") or request.values.get("stream", "")).lower() in ["true", "1", "yes"]
+    # validate before queueing, so that a bad style does not fail the whole batch
+    style_wav_uri_to_dict(style_wav)
+
+    print(f" > Model input: {text}")
+    print(f" > Speaker Idx: {speaker_idx}")
+    print(f" > Language Idx: {language_idx}")
+    try:
+        tts_request = tts_queue.submit(text, key=(model_id, speaker_idx, language_idx, style_wav))
+    except QueueFull as e:
+        return queue_full_response(e)
+    return wav_response(tts_request, stream=stream)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Queue depth and batching statistics in the Prometheus text format."""
+    return Response(tts_queue.metrics_text(), mimetype="text/plain; version=0.0.4")
 
 
 # Basic MaryTTS compatibility layer
@@ -236,22 +305,22 @@ def mary_tts_api_voices():
 @app.route("/process", methods=["GET", "POST"])
 def mary_tts_api_process():
     """MaryTTS-compatible /process endpoint"""
-    with lock:
-        if request.method == "POST":
-            data = parse_qs(request.get_data(as_text=True))
-            # NOTE: we ignore param. LOCALE and VOICE for now since we have only one active model
-            text = data.get("INPUT_TEXT", [""])[0]
-        else:
-            text = request.args.get("INPUT_TEXT", "")
-        print(f" > Model input: {text}")
-        wavs = synthesizer.tts(text)
-        out = io.BytesIO()
-        synthesizer.save_wav(wavs, out)
-    return send_file(out, mimetype="audio/wav")
+    if request.method == "POST":
+        data = parse_qs(request.get_data(as_text=True))
+        # NOTE: we ignore param. LOCALE and VOICE for now since we have only one active model
+        text = data.get("INPUT_TEXT", [""])[0]
+    else:
+        text = request.args.get("INPUT_TEXT", "")
+    print(f" > Model input: {text}")
+    try:
+        tts_request = tts_queue.submit(text, key=(model_id, "", "", ""))
+    except QueueFull as e:
+        return queue_full_response(e)
+    return wav_response(tts_request)
 
 
 def main():
-    app.run(debug=args.debug, host="::", port=args.port)
+    app.run(debug=args.debug, host="::", port=args.port, threaded=True)
 
 
 if __name__ == "__main__":
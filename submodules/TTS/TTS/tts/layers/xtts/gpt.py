@@ -584,20 +584,40 @@ class GPT(nn.Module):
         self,
         cond_latents,
         text_inputs,
+        return_latent=False,
         **hf_generate_kwargs,
     ):
+        """
+        If return_latent is specified, the final-layer latents of every generated code are gathered during
+        generation and returned as a second output, so no extra forward pass is needed to get them. This
+        is only supported for a single sequence without beam search.
+        """
         gpt_inputs = self.compute_embeddings(cond_latents, text_inputs)
-        gen = self.gpt_inference.generate(
-            gpt_inputs,
-            bos_token_id=self.start_audio_token,
-            pad_token_id=self.stop_audio_token,
-            eos_token_id=self.stop_audio_token,
-            max_length=self.max_gen_mel_tokens + gpt_inputs.shape[-1],
-            **hf_generate_kwargs,
-        )
+        if return_latent:
+            assert (
+                gpt_inputs.shape[0] == 1
+                and hf_generate_kwargs.get("num_beams", 1) == 1
+                and hf_generate_kwargs.get("num_return_sequences", 1) == 1
+            ), " ❗ return_latent is only supported for a single sequence without beam search."
+            self.gpt_inference.start_latent_collection()
+        try:
+            gen = self.gpt_inference.generate(
+                gpt_inputs,
+                bos_token_id=self.start_audio_token,
+                pad_token_id=self.stop_audio_token,
+                eos_token_id=self.stop_audio_token,
+                max_length=self.max_gen_mel_tokens + gpt_inputs.shape[-1],
+                **hf_generate_kwargs,
+            )
+        finally:
+            latents = self.gpt_inference.stop_latent_collection() if return_latent else None
         if "return_dict_in_generate" in hf_generate_kwargs:
-            return gen.sequences[:, gpt_inputs.shape[1] :], gen
-        return gen[:, gpt_inputs.shape[1] :]
+            codes = gen.sequences[:, gpt_inputs.shape[1] :]
+            return (codes, latents[:, : codes.shape[-1]], gen) if return_latent else (codes, gen)
+        codes = gen[:, gpt_inputs.shape[1] :]
+        if return_latent:
+            return codes, latents[:, : codes.shape[-1]]
+        return codes
 
     def get_generator(self, fake_inputs, **hf_generate_kwargs):
         return self.gpt_inference.generate_stream(
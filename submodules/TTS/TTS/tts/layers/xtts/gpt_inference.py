@@ -17,10 +17,22 @@ class GPT2InferenceModel(GPT2PreTrainedModel):
         self.final_norm = norm
         self.lm_head = nn.Sequential(norm, linear)
         self.kv_cache = kv_cache
+        self.collected_latents = None
 
     def store_prefix_emb(self, prefix_emb):
         self.cached_prefix_emb = prefix_emb
 
+    def start_latent_collection(self):
+        """Record the normalized last-position hidden state of every generation step."""
+        self.collected_latents = []
+
+    def stop_latent_collection(self):
+        """Stop recording and return the latents as a (batch, steps, dim) tensor."""
+        latents, self.collected_latents = self.collected_latents, None
+        if not latents:
+            return None
+        return torch.stack(latents, dim=1)
+
     def prepare_inputs_for_generation(self, input_ids, past_key_values=None, **kwargs):
         token_type_ids = kwargs.get("token_type_ids", None)  # usually None
         if not self.kv_cache:
@@ -110,6 +122,9 @@ class GPT2InferenceModel(GPT2PreTrainedModel):
         )
         hidden_states = transformer_outputs[0]
         lm_logits = self.lm_head(hidden_states)
+        if self.collected_latents is not None:
+            # the hidden state that predicts the next code is the latent the decoder expects for it
+            self.collected_latents.append(self.final_norm(hidden_states[:, -1]))
 
         if not return_dict:
             return (lm_logits,) + transformer_outputs[1:]
@@ -1,10 +1,13 @@
+import math
+from fractions import Fraction
+
 import torch
 import torchaudio
 from torch import nn
 from torch.nn import Conv1d, ConvTranspose1d
 from torch.nn import functional as F
 from torch.nn.utils.parametrizations import weight_norm
-from torch.nn.utils.parametrize import remove_parametrizations
+from torch.nn.utils.parametrize import is_parametrized, remove_parametrizations
 
 from TTS.utils.io import load_fsspec
 
@@ -321,8 +324,11 @@ class HifiganGenerator(torch.nn.Module):
             remove_parametrizations(l, "weight")
         for l in self.resblocks:
             l.remove_weight_norm()
-        remove_parametrizations(self.conv_pre, "weight")
-        remove_parametrizations(self.conv_post, "weight")
+        # conv_pre / conv_post may have been built without weight norm
+        if is_parametrized(self.conv_pre, "weight"):
+            remove_parametrizations(self.conv_pre, "weight")
+        if is_parametrized(self.conv_post, "weight"):
+            remove_parametrizations(self.conv_post, "weight")
 
     def load_checkpoint(
         self, config, checkpoint_path, eval=False, cache=False
@@ -643,6 +649,8 @@ class HifiDecoder(torch.nn.Module):
         self.output_hop_length = output_hop_length
         self.ar_mel_length_compression = ar_mel_length_compression
         self.speaker_encoder_audio_config = speaker_encoder_audio_config
+        self.upsample_factor = math.prod(upsample_rates_decoder)
+        self.inference_ready = False
         self.waveform_decoder = HifiganGenerator(
             decoder_input_dim,
             1,
@@ -700,12 +708,60 @@ class HifiDecoder(torch.nn.Module):
         o = self.waveform_decoder(z, g=g)
         return o
 
+    def init_for_inference(self, compile=False):  # pylint: disable=redefined-builtin
+        """Prepare the waveform decoder for inference: fold the weight norm parametrizations into plain conv
+        weights once, and optionally compile the decoder with `torch.compile`.
+
+        Args:
+            compile (bool): wrap the waveform decoder with `torch.compile`. Defaults to False.
+        """
+        if self.inference_ready:
+            return
+        self.eval()
+        self.waveform_decoder.remove_weight_norm()
+        if compile:
+            self.waveform_decoder = torch.compile(self.waveform_decoder, dynamic=True)
+        self.inference_ready = True
+
+    def num_output_samples(self, num_frames):
+        """Number of waveform samples `forward` produces for `num_frames` GPT latent frames."""
+        num_samples = int(num_frames * self.ar_mel_length_compression / self.output_hop_length)
+        if self.output_sample_rate != self.input_sample_rate:
+            num_samples = int(num_samples * self.output_sample_rate / self.input_sample_rate)
+        return num_samples * self.upsample_factor
+
+    @property
+    def samples_per_frame(self):
+        """Exact (rational) number of output samples per GPT latent frame."""
+        return (
+            Fraction(self.ar_mel_length_compression, self.output_hop_length)
+            * Fraction(self.output_sample_rate, self.input_sample_rate)
+            * self.upsample_factor
+        )
+
+    @property
+    def frame_period(self):
+        """Smallest number of latent frames that maps to a whole number of frames after both interpolations.
+
+        A window starting at a multiple of this period is interpolated on the same grid as the full sequence, so
+        its output lines up sample-exactly with a full decode (22050 -> 24000 Hz gives 147 frames).
+        """
+        mel_ratio = Fraction(self.ar_mel_length_compression, self.output_hop_length)
+        ratio = mel_ratio * Fraction(self.output_sample_rate, self.input_sample_rate)
+        return math.lcm(mel_ratio.denominator, ratio.denominator)
+
     @torch.no_grad()
-    def inference(self, c, g):
+    def inference(self, c, g, chunk_size=None, overlap=8):
         """
         Args:
             x (Tensor): feature input tensor (GPT latent).
             g (Tensor): global conditioning input tensor.
+            chunk_size (int, optional): decode the latents in windows of about this many frames to bound memory.
+                Window starts are rounded down to a multiple of `frame_period` so that every window is sample
+                aligned with a full decode. Defaults to None (decode the whole sequence at once).
+            overlap (int): number of latent frames shared by consecutive windows. A quarter of the overlap on each
+                side is dropped as edge context (interpolation and convolution borders) and the middle half is
+                linearly crossfaded. Defaults to 8.
 
         Returns:
             Tensor: output waveform.
@@ -714,7 +770,42 @@ class HifiDecoder(torch.nn.Module):
             x: [B, C, T]
             Tensor: [B, 1, T]
         """
-        return self.forward(c, g=g)
+        num_frames = c.shape[1]
+        if chunk_size is None or num_frames <= chunk_size:
+            return self.forward(c, g=g)
+        assert 0 <= overlap < chunk_size, " [!] overlap must be smaller than chunk_size."
+
+        period = self.frame_period
+        step = max(period, (chunk_size - overlap) // period * period)
+        margin = overlap // 4
+        samples_per_frame = self.samples_per_frame
+
+        pieces = []
+        wav = None  # decoded samples not yet final, starting at global sample `wav_start`
+        wav_start = 0
+        for start in range(0, num_frames, step):
+            end = min(start + step + overlap, num_frames)
+            wav_chunk = self.forward(c[:, start:end], g=g)
+            if wav is None:
+                wav = wav_chunk
+            else:
+                # global sample index of the first sample of this window, exact since start % period == 0
+                offset = int(start * samples_per_frame)
+                fade_start = max(wav_start, int((start + margin) * samples_per_frame))
+                fade_end = int((start + overlap - margin) * samples_per_frame)
+                fade_end = max(fade_start, min(fade_end, wav_start + wav.shape[-1], offset + wav_chunk.shape[-1]))
+                fade_len = fade_end - fade_start
+                fade_in = torch.linspace(0.0, 1.0, fade_len, device=wav.device, dtype=wav.dtype)
+                crossfade = (
+                    wav[..., fade_start - wav_start : fade_end - wav_start] * (1.0 - fade_in)
+                    + wav_chunk[..., fade_start - offset : fade_end - offset] * fade_in
+                )
+                pieces += [wav[..., : fade_start - wav_start], crossfade]
+                wav = wav_chunk[..., fade_end - offset :]
+                wav_start = fade_end
+            if end == num_frames:
+                break
+        return torch.cat(pieces + [wav], dim=-1)
 
     def load_checkpoint(self, checkpoint_path, eval=False):  # pylint: disable=unused-argument, redefined-builtin
         state = load_fsspec(checkpoint_path, map_location=torch.device("cpu"))
@@ -727,6 +818,5 @@ class HifiDecoder(torch.nn.Module):
 
         self.load_state_dict(state)
         if eval:
-            self.eval()
+            self.init_for_inference()
             assert not self.training
-            self.waveform_decoder.remove_weight_norm()
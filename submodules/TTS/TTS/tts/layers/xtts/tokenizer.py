@@ -1,6 +1,8 @@
 import os
 import re
 import textwrap
+import threading
+from collections import OrderedDict
 from functools import cached_property
 
 import pypinyin
@@ -32,42 +34,70 @@ def get_spacy_lang(lang):
         return English()
 
 
-def split_sentence(text, lang, text_split_length=250):
-    """Preprocess the input text"""
-    text_splits = []
-    if text_split_length is not None and len(text) >= text_split_length:
-        text_splits.append("")
+# Building a spaCy pipeline (Chinese() in particular) is expensive, so the sentencizer pipelines are built once
+# per language and reused across calls.
+_spacy_sentencizers = {}
+
+
+def get_spacy_sentencizer(lang):
+    lang = lang if lang in ("zh", "ja", "ar", "es") else "en"
+    nlp = _spacy_sentencizers.get(lang)
+    if nlp is None:
         nlp = get_spacy_lang(lang)
         nlp.add_pipe("sentencizer")
-        doc = nlp(text)
-        for sentence in doc.sents:
-            if len(text_splits[-1]) + len(str(sentence)) <= text_split_length:
-                # if the last sentence + the current sentence is less than the text_split_length
-                # then add the current sentence to the last sentence
-                text_splits[-1] += " " + str(sentence)
-                text_splits[-1] = text_splits[-1].lstrip()
-            elif len(str(sentence)) > text_split_length:
-                # if the current sentence is greater than the text_split_length
-                for line in textwrap.wrap(
-                    str(sentence),
-                    width=text_split_length,
-                    drop_whitespace=True,
-                    break_on_hyphens=False,
-                    tabsize=1,
-                ):
-                    text_splits.append(str(line))
-            else:
-                text_splits.append(str(sentence))
-
-        if len(text_splits) > 1:
-            if text_splits[0] == "":
-                del text_splits[0]
-    else:
-        text_splits = [text.lstrip()]
+        _spacy_sentencizers[lang] = nlp
+    return nlp
+
+
+def _merge_sentences(sentences, text_split_length):
+    text_splits = [""]
+    for sentence in sentences:
+        if len(text_splits[-1]) + len(str(sentence)) <= text_split_length:
+            # if the last sentence + the current sentence is less than the text_split_length
+            # then add the current sentence to the last sentence
+            text_splits[-1] += " " + str(sentence)
+            text_splits[-1] = text_splits[-1].lstrip()
+        elif len(str(sentence)) > text_split_length:
+            # if the current sentence is greater than the text_split_length
+            for line in textwrap.wrap(
+                str(sentence),
+                width=text_split_length,
+                drop_whitespace=True,
+                break_on_hyphens=False,
+                tabsize=1,
+            ):
+                text_splits.append(str(line))
+        else:
+            text_splits.append(str(sentence))
 
+    if len(text_splits) > 1:
+        if text_splits[0] == "":
+            del text_splits[0]
     return text_splits
 
 
+def split_sentence(text, lang, text_split_length=250):
+    """Preprocess the input text"""
+    return split_sentences([text], lang, text_split_length)[0]
+
+
+def split_sentences(texts, lang, text_split_length=250):
+    """Split a batch of texts in one `nlp.pipe` pass. Returns one list of splits per input text."""
+    results = [None] * len(texts)
+    long_texts = []
+    for i, text in enumerate(texts):
+        if text_split_length is not None and len(text) >= text_split_length:
+            long_texts.append(i)
+        else:
+            results[i] = [text.lstrip()]
+
+    if long_texts:
+        nlp = get_spacy_sentencizer(lang)
+        for i, doc in zip(long_texts, nlp.pipe(texts[i] for i in long_texts)):
+            results[i] = _merge_sentences(doc.sents, text_split_length)
+    return results
+
+
 _whitespace_re = re.compile(r"\s+")
 
 # List of (regular expression, replacement) pairs for abbreviations:
@@ -519,9 +549,15 @@ def _expand_number(m, lang="en"):
     return num2words(int(m.group(0)), lang=lang if lang != "cs" else "cz")
 
 
+_zh_num2words = None
+
+
 def expand_numbers_multilingual(text, lang="en"):
     if lang == "zh":
-        text = zh_num2words()(text)
+        global _zh_num2words
+        if _zh_num2words is None:
+            _zh_num2words = zh_num2words()
+        text = _zh_num2words(text)
     else:
         if lang in ["en", "ru"]:
             text = re.sub(_comma_number_re, _remove_commas, text)
@@ -581,19 +617,28 @@ def japanese_cleaners(text, katsu):
     return text
 
 
+_korean_transliter = None
+
+
 def korean_transliterate(text):
-    r = Transliter(academic)
-    return r.translit(text)
+    global _korean_transliter
+    if _korean_transliter is None:
+        _korean_transliter = Transliter(academic)
+    return _korean_transliter.translit(text)
 
 
 DEFAULT_VOCAB_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../data/tokenizer.json")
 
 
 class VoiceBpeTokenizer:
-    def __init__(self, vocab_file=None):
+    def __init__(self, vocab_file=None, cache_size=4096):
         self.tokenizer = None
         if vocab_file is not None:
             self.tokenizer = Tokenizer.from_file(vocab_file)
+        # LRU of cleaned-and-encoded token ids keyed by (text, lang), so retries and re-renders skip text processing
+        self.cache_size = cache_size
+        self._encode_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
         self.char_limits = {
             "en": 250,
             "de": 253,
@@ -643,14 +688,60 @@ class VoiceBpeTokenizer:
             raise NotImplementedError(f"Language '{lang}' is not supported.")
         return txt
 
-    def encode(self, txt, lang):
+    def prepare_text(self, txt, lang):
         lang = lang.split("-")[0]  # remove the region
         self.check_input_length(txt, lang)
         txt = self.preprocess_text(txt, lang)
         lang = "zh-cn" if lang == "zh" else lang
         txt = f"[{lang}]{txt}"
         txt = txt.replace(" ", "[SPACE]")
-        return self.tokenizer.encode(txt).ids
+        return txt
+
+    def encode(self, txt, lang):
+        return self.encode_batch([txt], lang)[0]
+
+    def encode_batch(self, texts, lang):
+        """Encode a list of texts, cleaning only the ones not in the cache and running the
+        Rust tokenizer once over all of them."""
+        results = [None] * len(texts)
+        missing = OrderedDict()
+        with self._cache_lock:
+            for i, txt in enumerate(texts):
+                ids = self._encode_cache.get((txt, lang))
+                if ids is not None:
+                    self._encode_cache.move_to_end((txt, lang))
+                    results[i] = list(ids)
+                else:
+                    missing.setdefault(txt, []).append(i)
+        if not missing:
+            return results
+
+        encodings = self.tokenizer.encode_batch([self.prepare_text(txt, lang) for txt in missing])
+        with self._cache_lock:
+            for (txt, indices), encoding in zip(missing.items(), encodings):
+                ids = tuple(encoding.ids)
+                for i in indices:
+                    results[i] = list(ids)
+                if self.cache_size:
+                    self._encode_cache[(txt, lang)] = ids
+                    if len(self._encode_cache) > self.cache_size:
+                        self._encode_cache.popitem(last=False)
+        return results
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._encode_cache.clear()
+
+    def __getstate__(self):
+        # locks can't be pickled (e.g. when the tokenizer is sent to DataLoader workers)
+        state = self.__dict__.copy()
+        state["_encode_cache"] = OrderedDict()
+        del state["_cache_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache_lock = threading.Lock()
 
     def decode(self, seq):
         if isinstance(seq, torch.Tensor):
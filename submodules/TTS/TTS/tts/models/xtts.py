@@ -148,6 +148,11 @@ class XttsArgs(Coqpit):
         gpt_code_stride_len (int, optional): The hop_size of dvae and consequently of the gpt output. Defaults to 1024.
         gpt_use_masking_gt_prompt_approach (bool, optional):  If True, it will use ground truth as prompt and it will mask the loss to avoid repetition. Defaults to True.
         gpt_use_perceiver_resampler (bool, optional):  If True, it will use perceiver resampler from flamingo paper - https://arxiv.org/abs/2204.14198. Defaults to False.
+
+        For the HiFiGAN decoder at inference:
+        decoder_chunk_size (int, optional): Decode long GPT latent sequences in windows of about this many frames with a crossfade, to bound memory. Window starts are aligned to `HifiDecoder.frame_period` (147 frames for 22050 -> 24000 Hz). Defaults to None (decode at once).
+        decoder_chunk_overlap (int, optional): Number of latent frames shared by consecutive decoder windows. Defaults to 8.
+        decoder_compile (bool, optional): Wrap the waveform decoder with `torch.compile` at load time. Defaults to False.
     """
 
     gpt_batch_size: int = 1
@@ -183,6 +188,9 @@ class XttsArgs(Coqpit):
     decoder_input_dim: int = 1024
     d_vector_dim: int = 512
     cond_d_vector_in_each_upsampling_layer: bool = True
+    decoder_chunk_size: int = None
+    decoder_chunk_overlap: int = 8
+    decoder_compile: bool = False
 
     # constants
     duration_const: int = 102400
@@ -529,14 +537,17 @@ class Xtts(BaseTTS):
 
         wavs = []
         gpt_latents_list = []
-        for sent in text:
-            sent = sent.strip().lower()
-            text_tokens = torch.IntTensor(self.tokenizer.encode(sent, lang=language)).unsqueeze(0).to(self.device)
+        sent_tokens = self.tokenizer.encode_batch([sent.strip().lower() for sent in text], lang=language)
+        for tokens in sent_tokens:
+            text_tokens = torch.IntTensor(tokens).unsqueeze(0).to(self.device)
 
             assert (
                 text_tokens.shape[-1] < self.args.gpt_max_text_tokens
             ), " ❗ XTTS can only generate text with a maximum of 400 tokens."
 
+            # with a single sequence the latents are gathered while generating, otherwise (beam search or
+            # several return sequences) they are recomputed with a full forward pass over the generated codes
+            single_pass = num_beams == 1 and self.gpt_batch_size == 1
             with torch.no_grad():
                 gpt_codes = self.gpt.generate(
                     cond_latents=gpt_cond_latent,
@@ -551,22 +562,26 @@ class Xtts(BaseTTS):
                     length_penalty=length_penalty,
                     repetition_penalty=repetition_penalty,
                     output_attentions=False,
+                    return_latent=single_pass,
                     **hf_generate_kwargs,
                 )
-                expected_output_len = torch.tensor(
-                    [gpt_codes.shape[-1] * self.gpt.code_stride_len], device=text_tokens.device
-                )
+                if single_pass:
+                    gpt_codes, gpt_latents = gpt_codes
+                else:
+                    expected_output_len = torch.tensor(
+                        [gpt_codes.shape[-1] * self.gpt.code_stride_len], device=text_tokens.device
+                    )
 
-                text_len = torch.tensor([text_tokens.shape[-1]], device=self.device)
-                gpt_latents = self.gpt(
-                    text_tokens,
-                    text_len,
-                    gpt_codes,
-                    expected_output_len,
-                    cond_latents=gpt_cond_latent,
-                    return_attentions=False,
-                    return_latent=True,
-                )
+                    text_len = torch.tensor([text_tokens.shape[-1]], device=self.device)
+                    gpt_latents = self.gpt(
+                        text_tokens,
+                        text_len,
+                        gpt_codes,
+                        expected_output_len,
+                        cond_latents=gpt_cond_latent,
+                        return_attentions=False,
+                        return_latent=True,
+                    )
 
                 if length_scale != 1.0:
                     gpt_latents = F.interpolate(
@@ -574,14 +589,22 @@ class Xtts(BaseTTS):
                     ).transpose(1, 2)
 
                 gpt_latents_list.append(gpt_latents.cpu())
-                wavs.append(self.hifigan_decoder(gpt_latents, g=speaker_embedding).cpu().squeeze())
+                wavs.append(self.decode_latents(gpt_latents, speaker_embedding).cpu().squeeze())
 
         return {
-            "wav": torch.cat(wavs, dim=0).numpy(),
-            "gpt_latents": torch.cat(gpt_latents_list, dim=1).numpy(),
+            "wav": torch.cat(wavs, dim=0).float().numpy(),
+            "gpt_latents": torch.cat(gpt_latents_list, dim=1).float().numpy(),
             "speaker_embedding": speaker_embedding,
         }
 
+    def decode_latents(self, gpt_latents, speaker_embedding):
+        return self.hifigan_decoder.inference(
+            gpt_latents,
+            g=speaker_embedding,
+            chunk_size=self.args.decoder_chunk_size,
+            overlap=self.args.decoder_chunk_overlap,
+        )
+
     def handle_chunks(self, wav_gen, wav_gen_prev, wav_overlap, overlap_len):
         """Handle chunk formatting in streaming mode"""
         wav_chunk = wav_gen[:-overlap_len]
@@ -684,7 +707,7 @@ class Xtts(BaseTTS):
                         gpt_latents = F.interpolate(
                             gpt_latents.transpose(1, 2), scale_factor=length_scale, mode="linear"
                         ).transpose(1, 2)
-                    wav_gen = self.hifigan_decoder(gpt_latents, g=speaker_embedding.to(self.device))
+                    wav_gen = self.decode_latents(gpt_latents, speaker_embedding.to(self.device))
                     wav_chunk, wav_gen_prev, wav_overlap = self.handle_chunks(
                         wav_gen.squeeze(), wav_gen_prev, wav_overlap, overlap_wav_len
                     )
@@ -781,7 +804,7 @@ class Xtts(BaseTTS):
             self.load_state_dict(checkpoint, strict=strict)
 
         if eval:
-            self.hifigan_decoder.eval()
+            self.hifigan_decoder.init_for_inference(compile=self.args.decoder_compile)
             self.gpt.init_gpt_for_inference(kv_cache=self.args.kv_cache, use_deepspeed=use_deepspeed)
             self.gpt.eval()
 
@@ -0,0 +1,118 @@
+import struct
+import threading
+import unittest
+
+import numpy as np
+
+from TTS.server.batching import BatchingQueue, QueueFull, pcm16, wav_stream_header
+
+
+class TestBatchingQueue(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def synthesize(self, key, texts):
+        self.release.wait()
+        self.batches.append((key, list(texts)))
+        for idx, text in enumerate(texts):
+            yield idx, np.full(len(text), 0.5, dtype=np.float32)
+            yield idx, np.zeros(2, dtype=np.float32)
+            yield idx, None
+
+    def test_groups_concurrent_requests_by_key(self):
+        batcher = BatchingQueue(self.synthesize, max_batch_size=4, max_wait_ms=200)
+        requests = [
+            batcher.submit("a", key="x"),
+            batcher.submit("bb", key="y"),
+            batcher.submit("ccc", key="x"),
+        ]
+        batcher.start()
+        try:
+            wavs = [r.result(timeout=5) for r in requests]
+        finally:
+            batcher.stop()
+        self.assertEqual(self.batches, [("x", ["a", "ccc"]), ("y", ["bb"])])
+        self.assertEqual([len(w) for w in wavs], [3, 4, 5])
+        stats = batcher.stats()
+        self.assertEqual(stats["batches_total"], 2)
+        self.assertEqual(stats["requests_total"], 3)
+        self.assertEqual(stats["avg_batch_size"], 1.5)
+
+    def test_max_batch_size(self):
+        batcher = BatchingQueue(self.synthesize, max_batch_size=2, max_wait_ms=0)
+        requests = [batcher.submit(str(i), key="x") for i in range(5)]
+        batcher.start()
+        try:
+            for r in requests:
+                r.result(timeout=5)
+        finally:
+            batcher.stop()
+        self.assertEqual([len(texts) for _, texts in self.batches], [2, 2, 1])
+
+    def test_unbatched_synthesize_runs_requests_one_by_one(self):
+        def synthesize(key, texts):
+            yield from self.synthesize(key, texts)
+
+        synthesize.supports_batching = False
+        batcher = BatchingQueue(synthesize, max_batch_size=4, max_wait_ms=10000)
+        requests = [batcher.submit(str(i), key="x") for i in range(3)]
+        batcher.start()
+        try:
+            for r in requests:
+                r.result(timeout=5)
+        finally:
+            batcher.stop()
+        self.assertEqual(self.batches, [("x", ["0"]), ("x", ["1"]), ("x", ["2"])])
+        self.assertEqual(batcher.stats()["avg_batch_size"], 1.0)
+
+    def test_backpressure(self):
+        batcher = BatchingQueue(self.synthesize, max_queue_size=2)
+        batcher.submit("a")
+        batcher.submit("b")
+        with self.assertRaises(QueueFull):
+            batcher.submit("c")
+        self.assertEqual(batcher.stats()["rejected_total"], 1)
+        self.assertEqual(batcher.stats()["queue_depth"], 2)
+        self.assertIn("tts_queue_depth 2", batcher.metrics_text())
+
+    def test_streaming_chunks(self):
+        self.release.clear()
+        batcher = BatchingQueue(self.synthesize, max_wait_ms=0).start()
+        try:
+            request = batcher.submit("abcd")
+            self.release.set()
+            chunks = list(request.chunks(timeout=5))
+        finally:
+            batcher.stop()
+        self.assertEqual([len(c) for c in chunks], [4, 2])
+
+    def test_failure_is_reported_to_unfinished_requests(self):
+        def synthesize(key, texts):
+            yield 0, np.zeros(1, dtype=np.float32)
+            yield 0, None
+            raise RuntimeError("model error")
+
+        batcher = BatchingQueue(synthesize, max_wait_ms=100)
+        ok, failed = batcher.submit("a"), batcher.submit("b")
+        batcher.start()
+        try:
+            self.assertEqual(len(ok.result(timeout=5)), 1)
+            with self.assertRaises(RuntimeError):
+                failed.result(timeout=5)
+        finally:
+            batcher.stop()
+        self.assertEqual(batcher.stats()["failed_total"], 1)
+
+
+class TestWavStream(unittest.TestCase):
+    def test_header(self):
+        header = wav_stream_header(22050)
+        self.assertEqual(len(header), 44)
+        self.assertEqual(header[:4], b"RIFF")
+        self.assertEqual(struct.unpack("<I", header[24:28])[0], 22050)
+
+    def test_pcm16(self):
+        data = np.frombuffer(pcm16([0.0, 1.0, -2.0]), dtype="<i2")
+        self.assertEqual(data.tolist(), [0, 32767, -32767])
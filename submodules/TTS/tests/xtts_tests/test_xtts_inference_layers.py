@@ -0,0 +1,181 @@
+import string
+
+import torch
+from tokenizers import Tokenizer
+from tokenizers.models import BPE
+
+from TTS.tts.layers.xtts.gpt import GPT
+from TTS.tts.layers.xtts.hifigan_decoder import HifiDecoder
+from TTS.tts.layers.xtts.tokenizer import VoiceBpeTokenizer, get_spacy_sentencizer, split_sentence, split_sentences
+
+device = torch.device("cpu")
+
+
+def _tiny_gpt():
+    torch.manual_seed(0)
+    gpt = GPT(
+        layers=2,
+        model_dim=64,
+        heads=4,
+        max_text_tokens=20,
+        max_mel_tokens=24,
+        max_prompt_tokens=8,
+        number_text_tokens=64,
+        start_text_token=62,
+        stop_text_token=63,
+        num_audio_tokens=40,
+        start_audio_token=38,
+        stop_audio_token=39,
+    ).to(device)
+    gpt.init_gpt_for_inference(kv_cache=True)
+    gpt.eval()
+    return gpt
+
+
+def test_generate_latents_match_forward_pass():
+    gpt = _tiny_gpt()
+    cond_latents = torch.randn(1, 8, 64, device=device)
+    text_tokens = torch.randint(1, 60, (1, 10), device=device)
+
+    with torch.no_grad():
+        codes, latents = gpt.generate(cond_latents, text_tokens, return_latent=True, do_sample=False, num_beams=1)
+        expected = gpt(
+            text_tokens,
+            torch.tensor([text_tokens.shape[-1]], device=device),
+            codes,
+            torch.tensor([codes.shape[-1] * gpt.code_stride_len], device=device),
+            cond_latents=cond_latents,
+            return_attentions=False,
+            return_latent=True,
+        )
+
+    assert latents.shape == expected.shape
+    assert torch.allclose(latents, expected, atol=1e-4)
+
+
+def test_generate_without_latents_is_unchanged():
+    gpt = _tiny_gpt()
+    cond_latents = torch.randn(1, 8, 64, device=device)
+    text_tokens = torch.randint(1, 60, (1, 10), device=device)
+
+    with torch.no_grad():
+        codes = gpt.generate(cond_latents, text_tokens, do_sample=False, num_beams=1)
+        codes_with_latents, _ = gpt.generate(cond_latents, text_tokens, return_latent=True, do_sample=False, num_beams=1)
+
+    assert torch.equal(codes, codes_with_latents)
+    assert gpt.gpt_inference.collected_latents is None
+
+
+def test_split_sentences_batch_matches_single():
+    texts = [
+        "Short line.",
+        "This is the first sentence. " * 8 + "And a final one that closes the paragraph.",
+        "Another long paragraph, with commas and clauses, keeps going. " * 6,
+    ]
+    batch = split_sentences(texts, "en", text_split_length=120)
+    assert batch == [split_sentence(text, "en", text_split_length=120) for text in texts]
+    assert batch[0] == ["Short line."]
+    assert all(len(split) <= 120 for splits in batch for split in splits)
+
+
+def test_spacy_sentencizer_is_cached():
+    assert get_spacy_sentencizer("en") is get_spacy_sentencizer("en")
+    # languages without a dedicated spaCy pipeline share the English one
+    assert get_spacy_sentencizer("de") is get_spacy_sentencizer("en")
+
+
+def _char_tokenizer():
+    vocab = {"[UNK]": 0}
+    for char in string.ascii_lowercase + string.digits + ".,'":
+        vocab[char] = len(vocab)
+    tokenizer = Tokenizer(BPE(vocab=vocab, merges=[], unk_token="[UNK]"))
+    tokenizer.add_special_tokens(["[SPACE]", "[en]"])
+    return tokenizer
+
+
+def _voice_tokenizer(cache_size=4096):
+    tokenizer = VoiceBpeTokenizer(cache_size=cache_size)
+    tokenizer.tokenizer = _char_tokenizer()
+    return tokenizer
+
+
+def test_encode_batch_matches_encode():
+    texts = ["hello world.", "it's 12 o'clock", "hello world."]
+    tokenizer = _voice_tokenizer(cache_size=0)
+    expected = [tokenizer.encode(text, "en") for text in texts]
+    assert tokenizer.encode_batch(texts, "en") == expected
+    assert expected[0] == expected[2]
+    assert tokenizer.tokenizer.token_to_id("[SPACE]") in expected[0]
+
+
+def test_encode_cache_skips_text_processing():
+    tokenizer = _voice_tokenizer(cache_size=2)
+    calls = []
+    preprocess_text = tokenizer.preprocess_text
+    tokenizer.preprocess_text = lambda txt, lang: calls.append(txt) or preprocess_text(txt, lang)
+
+    first = tokenizer.encode("hello world.", "en")
+    assert tokenizer.encode("hello world.", "en") == first
+    assert tokenizer.encode_batch(["hello world.", "good night"], "en")[0] == first
+    assert calls == ["hello world.", "good night"]
+
+    # least recently used entries are evicted
+    tokenizer.encode("third line", "en")
+    tokenizer.encode("hello world.", "en")
+    assert calls[-1] == "hello world."
+
+
+def _tiny_hifigan(**kwargs):
+    torch.manual_seed(0)
+    decoder = HifiDecoder(
+        decoder_input_dim=16,
+        upsample_rates_decoder=[2, 2],
+        upsample_initial_channel_decoder=16,
+        upsample_kernel_sizes_decoder=[4, 4],
+        d_vector_dim=8,
+        **kwargs,
+    ).to(device)
+    decoder.eval()
+    return decoder
+
+
+def test_hifigan_init_for_inference_keeps_output():
+    decoder = _tiny_hifigan()
+    latents = torch.randn(1, 20, 16, device=device)
+    g = torch.randn(1, 8, 1, device=device)
+    with torch.no_grad():
+        expected = decoder(latents, g=g)
+        decoder.init_for_inference()
+        decoder.init_for_inference()  # idempotent
+        wav = decoder.inference(latents, g)
+    assert torch.allclose(wav, expected, atol=1e-5)
+
+
+def _assert_chunked_matches_full(decoder, num_frames, chunk_size, overlap):
+    decoder.init_for_inference()
+    latents = torch.randn(1, num_frames, 16, device=device)
+    g = torch.randn(1, 8, 1, device=device)
+    full = decoder.inference(latents, g)
+    assert torch.equal(decoder.inference(latents, g, chunk_size=num_frames), full)
+
+    chunked = decoder.inference(latents, g, chunk_size=chunk_size, overlap=overlap)
+    assert chunked.shape[:-1] == full.shape[:-1]
+    # output lengths only differ by float rounding of the interpolation size
+    assert abs(chunked.shape[-1] - full.shape[-1]) <= decoder.upsample_factor
+    length = min(chunked.shape[-1], full.shape[-1])
+    assert torch.allclose(chunked[..., :length], full[..., :length], atol=1e-4)
+
+
+def test_hifigan_chunked_inference_matches_full():
+    decoder = _tiny_hifigan(output_sample_rate=22050)
+    assert decoder.frame_period == 1
+    assert decoder.inference(torch.randn(1, 50, 16), torch.randn(1, 8, 1)).shape[-1] == decoder.num_output_samples(50)
+    _assert_chunked_matches_full(decoder, num_frames=300, chunk_size=128, overlap=64)
+
+
+def test_hifigan_chunked_inference_matches_full_with_resampling():
+    decoder = _tiny_hifigan()
+    # 22050 -> 24000 Hz: windows must start on multiples of 147 frames to stay on the full decode's grid
+    assert decoder.frame_period == 147
+    assert decoder.samples_per_frame * 147 == 640 * decoder.upsample_factor
+    _assert_chunked_matches_full(decoder, num_frames=400, chunk_size=211, overlap=64)
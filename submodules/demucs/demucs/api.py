@@ -9,6 +9,8 @@
 Classes
 -------
 `demucs.api.Separator`: The base separator class
+`demucs.api.SeparationEngine`: Separate many tracks with one `Separator`, prefetching the next \
+    tracks and writing stems in the background
 
 Functions
 ---------
@@ -20,14 +22,17 @@ Examples
 See the end of this module (if __name__ == "__main__")
 """
 
+import queue
 import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import torch as th
 import torchaudio as ta
 
 from dora.log import fatal
 from pathlib import Path
-from typing import Optional, Callable, Dict, Tuple, Union
+from typing import Any, Iterable, List, Optional, Callable, Dict, Tuple, Union
 
 from .apply import apply_model, _replace_dict
 from .audio import AudioFile, convert_audio, save_audio
@@ -319,6 +324,108 @@ class Separator:
         return self._model
 
 
+class SeparationEngine:
+    """
+    Separate many tracks with a single loaded `Separator`, keeping the model busy: the next tracks
+    are decoded by a background thread while the model works on the current one, and the stems are
+    written by a pool of writer threads.
+
+    Parameters
+    ----------
+    separator: The separator whose model is shared by all the tracks.
+    load: Function `load(track) -> (wav, sr, *extra)` run in the prefetch thread. It may return \
+        None to skip the track. Defaults to decoding the file at the model sample rate.
+    save: Function `save(track, origin, separated)` run in a writer thread.
+    separate: Function `separate(wav, sr, *extra) -> (origin, separated)` run in the calling \
+        thread, `extra` being whatever `load` returned after `sr`. Defaults to \
+        `separator.separate_tensor`.
+    prefetch: How many decoded tracks may wait for the model.
+    write_workers: Number of writer threads. At most `2 * write_workers` results are kept in \
+        memory waiting to be written.
+    """
+
+    def __init__(
+        self,
+        separator: Separator,
+        save: Callable[[Any, th.Tensor, Dict[str, th.Tensor]], None],
+        load: Optional[Callable[[Any], Optional[Tuple[th.Tensor, int]]]] = None,
+        separate: Optional[
+            Callable[[th.Tensor, int], Tuple[th.Tensor, Dict[str, th.Tensor]]]
+        ] = None,
+        prefetch: int = 1,
+        write_workers: int = 1,
+    ):
+        self.separator = separator
+        self.save = save
+        self.load = load if load is not None else self._default_load
+        self.separate = separate if separate is not None else separator.separate_tensor
+        self.prefetch = max(1, prefetch)
+        self.write_workers = max(1, write_workers)
+
+    def _default_load(self, track):
+        return self.separator._load_audio(track), self.separator.samplerate
+
+    def _prefetch(self, tracks, loaded, stop):
+        for track in tracks:
+            if stop.is_set():
+                break
+            try:
+                item = (track, self.load(track), None)
+            except Exception as err:  # reported by `run` for this track
+                item = (track, None, err)
+            loaded.put(item)
+        loaded.put(None)
+
+    def run(self, tracks: Iterable[Any]) -> List[Tuple[Any, Optional[BaseException]]]:
+        """
+        Separate all the tracks. Returns a list of `(track, error)` in input order, where `error`
+        is None on success. Skipped tracks are not reported.
+        """
+        loaded: queue.Queue = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        loader = threading.Thread(target=self._prefetch, args=(tracks, loaded, stop), daemon=True)
+        loader.start()
+
+        results: List[Tuple[Any, Any]] = []
+        pending: List[Any] = []
+        with ThreadPoolExecutor(max_workers=self.write_workers) as writers:
+            try:
+                while True:
+                    item = loaded.get()
+                    if item is None:
+                        break
+                    track, audio, error = item
+                    if error is None and audio is None:
+                        continue
+                    if error is None:
+                        try:
+                            origin, separated = self.separate(*audio)
+                        except KeyboardInterrupt:
+                            raise
+                        except Exception as err:
+                            error = err
+                    if error is not None:
+                        results.append((track, error))
+                        continue
+                    del audio
+                    # bound the number of separated tracks held in memory
+                    while len(pending) >= 2 * self.write_workers:
+                        pending.pop(0).exception()
+                    future = writers.submit(self.save, track, origin, separated)
+                    pending.append(future)
+                    results.append((track, future))
+            finally:
+                stop.set()
+                # unblock the prefetch thread if it waits on a full queue
+                while loader.is_alive():
+                    try:
+                        loaded.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+        return [(track, error.exception() if isinstance(error, Future) else error)
+                for track, error in results]
+
+
 def list_models(repo: Optional[Path] = None) -> Dict[str, Dict[str, Union[str, Path]]]:
     """
     List the available models. Please remember that not all the returned models can be
@@ -11,7 +11,7 @@ from pathlib import Path
 from dora.log import fatal
 import torch as th
 
-from .api import Separator, save_audio, list_models
+from .api import Separator, SeparationEngine, save_audio, list_models
 
 from .apply import BagOfModels
 from .htdemucs import HTDemucs
@@ -151,30 +151,26 @@ def main(opts=None):
     out = args.out / args.name
     out.mkdir(parents=True, exist_ok=True)
     print(f"Separated tracks will be stored in {out.resolve()}")
-    for track in args.tracks:
-        if not track.exists():
-            print(f"File {track} does not exist. If the path contains spaces, "
-                  'please try again after surrounding the entire path with quotes "".',
-                  file=sys.stderr)
-            continue
+    if args.mp3:
+        ext = "mp3"
+    elif args.flac:
+        ext = "flac"
+    else:
+        ext = "wav"
+    kwargs = {
+        "samplerate": separator.samplerate,
+        "bitrate": args.mp3_bitrate,
+        "preset": args.mp3_preset,
+        "clip": args.clip_mode,
+        "as_float": args.float32,
+        "bits_per_sample": 24 if args.int24 else 16,
+    }
+
+    def load(track):
         print(f"Separating track {track}")
+        return separator._load_audio(track), separator.samplerate
 
-        origin, res = separator.separate_audio_file(track)
-
-        if args.mp3:
-            ext = "mp3"
-        elif args.flac:
-            ext = "flac"
-        else:
-            ext = "wav"
-        kwargs = {
-            "samplerate": separator.samplerate,
-            "bitrate": args.mp3_bitrate,
-            "preset": args.mp3_preset,
-            "clip": args.clip_mode,
-            "as_float": args.float32,
-            "bits_per_sample": 24 if args.int24 else 16,
-        }
+    def save(track, origin, res):
         if args.stem is None:
             for name, source in res.items():
                 stem = out / args.filename.format(
@@ -217,6 +213,25 @@ def main(opts=None):
                 stem.parent.mkdir(parents=True, exist_ok=True)
                 save_audio(other_stem, str(stem), **kwargs)
 
+    tracks = []
+    for track in args.tracks:
+        if not track.exists():
+            print(f"File {track} does not exist. If the path contains spaces, "
+                  'please try again after surrounding the entire path with quotes "".',
+                  file=sys.stderr)
+            continue
+        tracks.append(track)
+
+    # the next track is decoded while the current one is separated, and stems are written
+    # in the background, so the model never waits on I/O
+    engine = SeparationEngine(separator, save, load=load, prefetch=1, write_workers=2)
+    failed = False
+    for track, error in engine.run(tracks):
+        if error is not None:
+            failed = True
+            print(f"Failed to separate track {track}: {error}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
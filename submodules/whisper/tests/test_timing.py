@@ -52,6 +52,55 @@ def test_dtw(N: int, M: int):
     assert np.allclose(trace, dtw_trace)
 
 
+def dtw_reference(x: np.ndarray) -> np.ndarray:
+    # the original column-major, pure-Python implementation
+    N, M = x.shape
+    cost = np.ones((N + 1, M + 1), dtype=np.float32) * np.inf
+    trace = -np.ones((N + 1, M + 1), dtype=np.float32)
+
+    cost[0, 0] = 0
+    for j in range(1, M + 1):
+        for i in range(1, N + 1):
+            c0 = cost[i - 1, j - 1]
+            c1 = cost[i - 1, j]
+            c2 = cost[i, j - 1]
+
+            if c0 < c1 and c0 < c2:
+                c, t = c0, 0
+            elif c1 < c0 and c1 < c2:
+                c, t = c1, 1
+            else:
+                c, t = c2, 2
+
+            cost[i, j] = x[i - 1, j - 1] + c
+            trace[i, j] = t
+
+    i, j = N, M
+    trace[0, :] = 2
+    trace[:, 0] = 1
+    result = []
+    while i > 0 or j > 0:
+        result.append((i - 1, j - 1))
+        if trace[i, j] == 0:
+            i -= 1
+            j -= 1
+        elif trace[i, j] == 1:
+            i -= 1
+        else:
+            j -= 1
+    return np.array(result)[::-1, :].T
+
+
+@pytest.mark.parametrize("N, M", [(10, 20), (32, 16), (45, 300)])
+def test_dtw_reference_equivalence(N: int, M: int):
+    x = np.random.randn(N, M)
+    # quantized costs produce ties, which exercise the tie-breaking order
+    x_ties = np.round(np.random.rand(N, M) * 4).astype(np.float32)
+
+    for matrix in (x, x_ties):
+        assert np.array_equal(dtw_reference(matrix), dtw_cpu(matrix))
+
+
 @pytest.mark.requires_cuda
 @pytest.mark.parametrize("N, M", sizes)
 def test_dtw_cuda_equivalence(N: int, M: int):
@@ -79,15 +79,17 @@ def backtrace(trace: np.ndarray):
     return result[::-1, :].T
 
 
-@numba.jit(nopython=True, parallel=True)
+@numba.jit(nopython=True)
 def dtw_cpu(x: np.ndarray):
     N, M = x.shape
     cost = np.ones((N + 1, M + 1), dtype=np.float32) * np.inf
     trace = -np.ones((N + 1, M + 1), dtype=np.float32)
 
     cost[0, 0] = 0
-    for j in range(1, M + 1):
-        for i in range(1, N + 1):
+    # row-major sweep: every cell only depends on its upper, left and upper-left
+    # neighbours, so this visits cells in a valid order and matches column-major results
+    for i in range(1, N + 1):
+        for j in range(1, M + 1):
             c0 = cost[i - 1, j - 1]
             c1 = cost[i - 1, j]
             c2 = cost[i, j - 1]
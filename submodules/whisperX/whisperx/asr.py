@@ -1,5 +1,8 @@
 import os
+import queue
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Union, Optional, NamedTuple
 
 import ctranslate2
@@ -9,8 +12,8 @@ import torch
 from transformers import Pipeline
 from transformers.pipelines.pt_utils import PipelineIterator
 
-from .audio import N_SAMPLES, SAMPLE_RATE, load_audio, log_mel_spectrogram
-from .vad import load_vad_model, merge_chunks
+from .audio import N_SAMPLES, SAMPLE_RATE, load_audio, log_mel_spectrogram, log_mel_spectrogram_batch, pad_or_trim
+from .vad import load_vad_model, merge_chunks, merge_regions
 from .types import TranscriptionResult, SingleSegment
 
 def find_numeral_symbol_tokens(tokenizer):
@@ -22,6 +25,100 @@ def find_numeral_symbol_tokens(tokenizer):
             numeral_symbol_tokens.append(i)
     return numeral_symbol_tokens
 
+BATCH_ORDERS = ("chronological", "duration")
+
+
+def batch_order_indices(segments: List[dict], batch_order: str = "duration") -> List[int]:
+    """
+    The order in which the VAD chunks are batched. "duration" sorts them longest first, so that
+    each batch holds chunks of similar length and is not held up decoding a single long one.
+    """
+    if batch_order == "chronological":
+        return list(range(len(segments)))
+    if batch_order == "duration":
+        return sorted(range(len(segments)), key=lambda i: segments[i]['end'] - segments[i]['start'], reverse=True)
+    raise ValueError(f"Unsupported batch_order: {batch_order}, expected one of {BATCH_ORDERS}")
+
+
+class AudioChunks(torch.utils.data.Dataset):
+    """
+    The VAD chunks of an audio, each padded to 30 seconds. Map-style, so that it can be split
+    between DataLoader worker processes.
+    """
+
+    def __init__(self, audio: np.ndarray, segments: List[dict]):
+        self.audio = audio
+        self.segments = segments
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __getitem__(self, idx):
+        f1 = int(self.segments[idx]['start'] * SAMPLE_RATE)
+        f2 = int(self.segments[idx]['end'] * SAMPLE_RATE)
+        return pad_or_trim(torch.from_numpy(self.audio[f1:f2]))
+
+
+class BatchFeatures:
+    """
+    DataLoader collate function computing the log-Mel features of a whole batch with one STFT.
+    """
+
+    def __init__(self, n_mels: int):
+        self.n_mels = n_mels
+
+    def __call__(self, chunks):
+        return {'inputs': log_mel_spectrogram_batch(chunks, self.n_mels)}
+
+
+class BackgroundLoader:
+    """
+    Iterate over a loader in a background thread, so that the next batches are prepared while
+    CTranslate2 decodes the current one (both release the GIL).
+    """
+
+    def __init__(self, loader, prefetch: int = 2):
+        self.loader = loader
+        self.prefetch = prefetch
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        items = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for item in self.loader:
+                    if stop.is_set():
+                        return
+                    items.put((item, None))
+                items.put((done, None))
+            except Exception as e:
+                items.put((done, e))
+
+        worker = threading.Thread(target=produce, daemon=True)
+        worker.start()
+        try:
+            while True:
+                item, error = items.get()
+                if error is not None:
+                    raise error
+                if item is done:
+                    return
+                yield item
+        finally:
+            stop.set()
+            # unblock the producer if it waits on a full queue
+            while worker.is_alive():
+                try:
+                    items.get_nowait()
+                except queue.Empty:
+                    worker.join(0.01)
+
+
 class WhisperModel(faster_whisper.WhisperModel):
     '''
     FasterWhisperModel provides batched inference for faster-whisper.
@@ -158,38 +255,54 @@ class FasterWhisperPipeline(Pipeline):
     def get_iterator(
         self, inputs, num_workers: int, batch_size: int, preprocess_params, forward_params, postprocess_params
     ):
-        dataset = PipelineIterator(inputs, self.preprocess, preprocess_params)
         if "TOKENIZERS_PARALLELISM" not in os.environ:
             os.environ["TOKENIZERS_PARALLELISM"] = "false"
-        # TODO hack by collating feature_extractor and image_processor
-
-        def stack(items):
-            return {'inputs': torch.stack([x['inputs'] for x in items])}
-        dataloader = torch.utils.data.DataLoader(dataset, num_workers=num_workers, batch_size=batch_size, collate_fn=stack)
+        if isinstance(inputs, AudioChunks):
+            # features are computed per batch in the collate function
+            model_n_mels = self.model.feat_kwargs.get("feature_size")
+            dataset = inputs
+            collate = BatchFeatures(model_n_mels if model_n_mels is not None else 80)
+        else:
+            dataset = PipelineIterator(inputs, self.preprocess, preprocess_params)
+
+            # TODO hack by collating feature_extractor and image_processor
+            def collate(items):
+                return {'inputs': torch.stack([x['inputs'] for x in items])}
+        dataloader = torch.utils.data.DataLoader(dataset, num_workers=num_workers, batch_size=batch_size, collate_fn=collate)
+        if num_workers == 0:
+            dataloader = BackgroundLoader(dataloader)
         model_iterator = PipelineIterator(dataloader, self.forward, forward_params, loader_batch_size=batch_size)
         final_iterator = PipelineIterator(model_iterator, self.postprocess, postprocess_params)
         return final_iterator
 
     def transcribe(
-        self, audio: Union[str, np.ndarray], batch_size=None, num_workers=0, language=None, task=None, chunk_size=30, print_progress = False, combined_progress=False
+        self, audio: Union[str, np.ndarray], batch_size=None, num_workers=0, language=None, task=None, chunk_size=30, print_progress = False, combined_progress=False,
+        vad_segments=None, batch_order="duration", shards=1
     ) -> TranscriptionResult:
+        """
+        vad_segments: optional precomputed speech regions `[(start, end), ...]` in seconds. When
+            given, the VAD model is not run and only these regions are transcribed.
+        num_workers: DataLoader worker processes computing the features. With 0 they are computed
+            by a background thread, overlapping with decoding either way.
+        batch_order: "duration" batches chunks of similar length together, "chronological" keeps
+            the VAD order. The returned segments are always in chronological order.
+        shards: number of threads transcribing disjoint parts of the chunk list at the same time.
+            Only useful when the model has several replicas (`num_workers` / a `device_index` list
+            in `load_model`), since CTranslate2 runs one call per replica in parallel.
+        """
         if isinstance(audio, str):
             audio = load_audio(audio)
 
-        def data(audio, segments):
-            for seg in segments:
-                f1 = int(seg['start'] * SAMPLE_RATE)
-                f2 = int(seg['end'] * SAMPLE_RATE)
-                # print(f2-f1)
-                yield {'inputs': audio[f1:f2]}
-
-        vad_segments = self.vad_model({"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": SAMPLE_RATE})
-        vad_segments = merge_chunks(
-            vad_segments,
-            chunk_size,
-            onset=self._vad_params["vad_onset"],
-            offset=self._vad_params["vad_offset"],
-        )
+        if vad_segments is not None:
+            vad_segments = merge_regions(vad_segments, chunk_size)
+        else:
+            vad_segments = self.vad_model({"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": SAMPLE_RATE})
+            vad_segments = merge_chunks(
+                vad_segments,
+                chunk_size,
+                onset=self._vad_params["vad_onset"],
+                offset=self._vad_params["vad_offset"],
+            )
         if self.tokenizer is None:
             language = language or self.detect_language(audio)
             task = task or "transcribe"
@@ -212,24 +325,54 @@ class FasterWhisperPipeline(Pipeline):
             new_suppressed_tokens = list(set(new_suppressed_tokens))
             self.options = self.options._replace(suppress_tokens=new_suppressed_tokens)
 
-        segments: List[SingleSegment] = []
-        batch_size = batch_size or self._batch_size
+        batch_size = batch_size or self._batch_size or 1
         total_segments = len(vad_segments)
-        for idx, out in enumerate(self.__call__(data(audio, vad_segments), batch_size=batch_size, num_workers=num_workers)):
-            if print_progress:
-                base_progress = ((idx + 1) / total_segments) * 100
-                percent_complete = base_progress / 2 if combined_progress else base_progress
-                print(f"Progress: {percent_complete:.2f}%...")
-            text = out['text']
-            if batch_size in [0, 1, None]:
-                text = text[0]
-            segments.append(
-                {
-                    "text": text,
-                    "start": round(vad_segments[idx]['start'], 3),
-                    "end": round(vad_segments[idx]['end'], 3)
-                }
-            )
+        order = batch_order_indices(vad_segments, batch_order)
+        texts = [None] * total_segments
+        progress_lock = threading.Lock()
+        num_done = 0
+
+        def transcribe_shard(indices, outputs):
+            nonlocal num_done
+            for idx, out in zip(indices, outputs):
+                text = out['text']
+                if batch_size in [0, 1, None]:
+                    text = text[0]
+                texts[idx] = text
+                with progress_lock:
+                    num_done += 1
+                    if print_progress:
+                        base_progress = (num_done / total_segments) * 100
+                        percent_complete = base_progress / 2 if combined_progress else base_progress
+                        print(f"Progress: {percent_complete:.2f}%...")
+
+        shards = max(1, min(shards, total_segments))
+        if shards == 1:
+            chunks = AudioChunks(audio, [vad_segments[i] for i in order])
+            transcribe_shard(order, self.__call__(chunks, batch_size=batch_size, num_workers=num_workers))
+        else:
+            # round-robin over the batch order, so that every shard gets a similar mix of lengths
+            shard_indices = [order[s::shards] for s in range(shards)]
+            with ThreadPoolExecutor(max_workers=shards) as executor:
+                futures = [
+                    executor.submit(
+                        transcribe_shard, indices,
+                        self.get_iterator(AudioChunks(audio, [vad_segments[i] for i in indices]), num_workers,
+                                          batch_size, self._preprocess_params, self._forward_params,
+                                          self._postprocess_params))
+                    for indices in shard_indices
+                ]
+                for future in futures:
+                    future.result()
+
+        segments: List[SingleSegment] = [
+            {
+                "text": text,
+                "start": round(seg['start'], 3),
+                "end": round(seg['end'], 3)
+            }
+            for seg, text in zip(vad_segments, texts)
+        ]
 
         # revert the tokenizer if multilingual inference is enabled
         if self.preset_language is None:
@@ -267,7 +410,8 @@ def load_model(whisper_arch,
                model : Optional[WhisperModel] = None,
                task="transcribe",
                download_root=None,
-               threads=4):
+               threads=4,
+               num_workers=1):
     '''Load a Whisper model for inference.
     Args:
         whisper_arch: str - The name of the Whisper model to load.
@@ -278,6 +422,8 @@ def load_model(whisper_arch,
         model: Optional[WhisperModel] - The WhisperModel instance to use.
         download_root: Optional[str] - The root directory to download the model to.
         threads: int - The number of cpu threads to use per worker, e.g. will be multiplied by num workers.
+        num_workers: int - The number of model replicas (per device in `device_index`) that can run in parallel,
+            see `FasterWhisperPipeline.transcribe(shards=...)`.
     Returns:
         A Whisper pipeline.
     '''
@@ -290,7 +436,8 @@ def load_model(whisper_arch,
                          device_index=device_index,
                          compute_type=compute_type,
                          download_root=download_root,
-                         cpu_threads=threads)
+                         cpu_threads=threads,
+                         num_workers=num_workers)
     if language is not None:
         tokenizer = faster_whisper.tokenizer.Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task=task, language=language)
     else:
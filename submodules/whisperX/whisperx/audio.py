@@ -109,6 +109,14 @@ def mel_filters(device, n_mels: int) -> torch.Tensor:
         return torch.from_numpy(f[f"mel_{n_mels}"]).to(device)
 
 
+@lru_cache(maxsize=None)
+def hann_window(device) -> torch.Tensor:
+    """
+    the STFT window, cached per device like the mel filterbank
+    """
+    return torch.hann_window(N_FFT, device=device)
+
+
 def log_mel_spectrogram(
     audio: Union[str, np.ndarray, torch.Tensor],
     n_mels: int,
@@ -120,8 +128,9 @@ def log_mel_spectrogram(
 
     Parameters
     ----------
-    audio: Union[str, np.ndarray, torch.Tensor], shape = (*)
-        The path to audio or either a NumPy array or Tensor containing the audio waveform in 16 kHz
+    audio: Union[str, np.ndarray, torch.Tensor], shape = (*, n_samples)
+        The path to audio or either a NumPy array or Tensor containing the audio waveform in 16 kHz.
+        A 2D input is a batch of waveforms of the same length; each one is normalized on its own
 
     n_mels: int
         The number of Mel-frequency filters, only 80 is supported
@@ -134,7 +143,7 @@ def log_mel_spectrogram(
 
     Returns
     -------
-    torch.Tensor, shape = (80, n_frames)
+    torch.Tensor, shape = (*, 80, n_frames)
         A Tensor that contains the Mel spectrogram
     """
     if not torch.is_tensor(audio):
@@ -146,14 +155,34 @@ def log_mel_spectrogram(
         audio = audio.to(device)
     if padding > 0:
         audio = F.pad(audio, (0, padding))
-    window = torch.hann_window(N_FFT).to(audio.device)
-    stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=window, return_complex=True)
+    stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=hann_window(audio.device), return_complex=True)
     magnitudes = stft[..., :-1].abs() ** 2
 
     filters = mel_filters(audio.device, n_mels)
     mel_spec = filters @ magnitudes
 
     log_spec = torch.clamp(mel_spec, min=1e-10).log10()
-    log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+    log_spec = torch.maximum(log_spec, log_spec.amax(dim=(-2, -1), keepdim=True) - 8.0)
     log_spec = (log_spec + 4.0) / 4.0
     return log_spec
+
+
+def log_mel_spectrogram_batch(
+    chunks,
+    n_mels: int,
+    length: int = N_SAMPLES,
+    device: Optional[Union[str, torch.device]] = None,
+):
+    """
+    Pad (or trim) every chunk to `length` samples and compute their log-Mel spectrograms with a
+    single STFT. Same result as calling `log_mel_spectrogram` on each padded chunk.
+
+    Returns
+    -------
+    torch.Tensor, shape = (len(chunks), n_mels, n_frames)
+    """
+    audio = torch.stack([
+        pad_or_trim(chunk if torch.is_tensor(chunk) else torch.from_numpy(chunk), length)
+        for chunk in chunks
+    ])
+    return log_mel_spectrogram(audio, n_mels, device=device)
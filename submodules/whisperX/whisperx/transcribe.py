@@ -42,6 +42,7 @@ def cli():
     parser.add_argument("--vad_onset", type=float, default=0.500, help="Onset threshold for VAD (see pyannote.audio), reduce this if speech is not being detected")
     parser.add_argument("--vad_offset", type=float, default=0.363, help="Offset threshold for VAD (see pyannote.audio), reduce this if speech is not being detected.")
     parser.add_argument("--chunk_size", type=int, default=30, help="Chunk size for merging VAD segments. Default is 30, reduce this if the chunk is too long.")
+    parser.add_argument("--batch_order", type=str, default="duration", choices=["chronological", "duration"], help="order in which VAD chunks are batched; 'duration' groups chunks of similar length")
 
     # diarization params
     parser.add_argument("--diarize", action="store_true", help="Apply diarization to assign speaker labels to each segment/word")
@@ -106,6 +107,7 @@ def cli():
     vad_offset: float = args.pop("vad_offset")
 
     chunk_size: int = args.pop("chunk_size")
+    batch_order: str = args.pop("batch_order")
 
     diarize: bool = args.pop("diarize")
     min_speakers: int = args.pop("min_speakers")
@@ -173,7 +175,7 @@ def cli():
         audio = load_audio(audio_path)
         # >> VAD & ASR
         print(">>Performing transcription...")
-        result = model.transcribe(audio, batch_size=batch_size, chunk_size=chunk_size, print_progress=print_progress)
+        result = model.transcribe(audio, batch_size=batch_size, chunk_size=chunk_size, print_progress=print_progress, batch_order=batch_order)
         results.append((result, audio_path))
 
     # Unload Whisper and VAD
@@ -270,11 +270,6 @@ def merge_chunks(
     """
     Merge operation described in paper
     """
-    curr_end = 0
-    merged_segments = []
-    seg_idxs = []
-    speaker_idxs = []
-
     assert chunk_size > 0
     binarize = Binarize(max_duration=chunk_size, onset=onset, offset=offset)
     segments = binarize(segments)
@@ -285,6 +280,35 @@ def merge_chunks(
     if len(segments_list) == 0:
         print("No active speech found in audio")
         return []
+    return _merge_segments(segments_list, chunk_size)
+
+
+def merge_regions(regions, chunk_size):
+    """
+    Same as `merge_chunks`, but for precomputed speech regions `[(start, end), ...]` in seconds,
+    e.g. from a VAD pass shared with other stages. Regions longer than `chunk_size` are split
+    into equal parts, since no frame scores are available to pick the cut points.
+    """
+    assert chunk_size > 0
+    segments_list = []
+    for start, end in sorted(regions):
+        num_parts = max(1, int(np.ceil((end - start) / chunk_size)))
+        step = (end - start) / num_parts
+        for i in range(num_parts):
+            segments_list.append(SegmentX(start + i * step, start + (i + 1) * step, "UNKNOWN"))
+
+    if len(segments_list) == 0:
+        print("No active speech found in audio")
+        return []
+    return _merge_segments(segments_list, chunk_size)
+
+
+def _merge_segments(segments_list, chunk_size):
+    curr_end = 0
+    merged_segments = []
+    seg_idxs = []
+    speaker_idxs = []
+
     # assert segments_list, "segments_list is empty."
     # Make sur the starting point is the start of the segment.
     curr_start = segments_list[0].start
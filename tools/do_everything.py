@@ -5,16 +5,20 @@ import traceback
 
 import torch
 from loguru import logger
-from .step000_video_downloader import get_info_list_from_url, download_single_video, get_target_folder
+from .step000_video_downloader import get_info_list_from_url, download_single_video, get_target_folder, \
+    download_videos_concurrently
+from .step006_speech_map import compute_speech_map
 from .step010_demucs_vr import separate_all_audio_under_folder, init_demucs, release_model
 from .step020_asr import transcribe_all_audio_under_folder
 from .step021_asr_whisperx import init_whisperx, init_diarize
 from .step022_asr_funasr import init_funasr
 from .step030_translation import translate_all_transcript_under_folder
-from .step040_tts import generate_all_wavs_under_folder
+from .step040_tts import generate_all_wavs_under_folder, translate_and_synthesize_all_under_folder
 from .step042_tts_xtts import init_TTS
+from .step045_tts_stream import generate_all_wavs_under_folder_streaming, DubbingAborted
 from .step043_tts_cosyvoice import init_cosyvoice
 from .step050_synthesize_video import synthesize_all_video_under_folder
+from .metrics import MetricsRecorder, estimate_stage_weights, get_audio_duration
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 跟踪模型初始化状态
@@ -98,24 +102,28 @@ def process_video(info, root_folder, resolution,
                   translation_method, translation_target_language,
                   tts_method, tts_target_language, voice,
                   subtitles, speed_up, fps, background_music, bgm_volume, video_volume,
-                  target_resolution, max_retries, progress_callback=None):
+                  target_resolution, max_retries, progress_callback=None, streaming_tts=False, abort_event=None,
+                  demucs_preset=None, speech_map=False, skip_silence=False, pipeline_tts=False, folder=None):
     """
     处理单个视频的完整流程，增加了进度回调函数
 
     Args:
         progress_callback: 回调函数，用于报告进度和状态，格式为 progress_callback(progress_percent, status_message)
+        streaming_tts: 流式语音合成，边合成边生成 preview/index.m3u8 预览
+        abort_event: threading.Event，被设置后尽快中止处理
+        demucs_preset: 人声分离预设 fast / balanced / best，为 None 或 custom 时使用 demucs_model 和 shifts
+        speech_map: 在原始音频上检测一次语音区间（speech_map.json），语音识别和说话人参考音频只使用语音部分
+        skip_silence: 人声分离跳过非语音部分，直接把原始混音作为伴奏
+        pipeline_tts: 翻译与语音合成流水线并行，每翻译完一句就开始合成（流式合成预览时不生效）
+        folder: 视频已经下载好的文件夹（并发下载时传入），为 None 时在下载阶段下载
     """
     local_time = time.localtime()
 
-    # 定义进度阶段和权重
-    stages = [
-        ("下载视频...", 10),  # 10%
-        ("人声分离...", 15),  # 15%
-        ("AI智能语音识别...", 20),  # 20%
-        ("字幕翻译...", 25),  # 25%
-        ("AI语音合成...", 20),  # 20%
-        ("视频合成...", 10)  # 10%
-    ]
+    # 定义进度阶段，权重根据历史实测的各阶段耗时估计
+    stage_keys = ['download', 'separation', 'asr', 'translation', 'tts', 'synthesis']
+    stage_names = ["下载视频...", "人声分离...", "AI智能语音识别...", "字幕翻译...", "AI语音合成...", "视频合成..."]
+    stages = list(zip(stage_names, estimate_stage_weights(stage_keys)))
+    recorder = MetricsRecorder(video=info if isinstance(info, str) else info.get('webpage_url', info.get('title')))
 
     current_stage = 0
     progress_base = 0
@@ -124,135 +132,193 @@ def process_video(info, root_folder, resolution,
     if progress_callback:
         progress_callback(0, "准备处理...")
 
-    for retry in range(max_retries):
-        try:
-            # 报告进入下载阶段
-            stage_name, stage_weight = stages[current_stage]
-            if progress_callback:
-                progress_callback(progress_base, stage_name)
+    # 无论成功、失败还是中止都写入 total 记录，避免汇总和进度权重只统计成功的视频
+    succeeded = False
+    try:
+        for retry in range(max_retries):
+            try:
+                # 报告进入下载阶段
+                stage_name, stage_weight = stages[current_stage]
+                if progress_callback:
+                    progress_callback(progress_base, stage_name)
+
+                with recorder.stage('download'):
+                    if folder is not None:
+                        # 已经并发下载完成，不再重复下载
+                        pass
+                    elif isinstance(info, str) and info.endswith('.mp4'):
+                        folder = os.path.dirname(info)
+                        # os.rename(info, os.path.join(folder, 'download.mp4'))
+                    else:
+                        folder = get_target_folder(info, root_folder)
+                        if folder is None:
+                            error_msg = f'无法获取视频目标文件夹: {info["title"]}'
+                            logger.warning(error_msg)
+                            return False, None, error_msg
+
+                        folder = download_single_video(info, root_folder, resolution)
+                        if folder is None:
+                            error_msg = f'下载视频失败: {info["title"]}'
+                            logger.warning(error_msg)
+                            return False, None, error_msg
+
+                logger.info(f'处理视频: {folder}')
+
+                # 完成下载阶段，进入人声分离阶段
+                if abort_event is not None and abort_event.is_set():
+                    return False, None, '处理已被用户中止'
+                current_stage += 1
+                progress_base += stage_weight
+                stage_name, stage_weight = stages[current_stage]
+                if progress_callback:
+                    progress_callback(progress_base, stage_name)
 
-            if isinstance(info, str) and info.endswith('.mp4'):
-                folder = os.path.dirname(info)
-                # os.rename(info, os.path.join(folder, 'download.mp4'))
-            else:
-                folder = get_target_folder(info, root_folder)
-                if folder is None:
-                    error_msg = f'无法获取视频目标文件夹: {info["title"]}'
-                    logger.warning(error_msg)
+                if speech_map or skip_silence:
+                    try:
+                        with recorder.stage('speech_map'):
+                            compute_speech_map(folder, device)
+                    except Exception as e:
+                        # 语音区间只用于加速，失败时按整段音频处理
+                        logger.warning(f'语音区间检测失败，将处理完整音频: {str(e)}')
+                        skip_silence = False
+
+                try:
+                    with recorder.stage('separation'):
+                        status, vocals_path, _ = separate_all_audio_under_folder(
+                            folder, model_name=demucs_model, device=device, progress=True, shifts=shifts,
+                            preset=demucs_preset, skip_silence=skip_silence)
+                        logger.info(f'人声分离完成: {vocals_path}')
+                        # 之后各阶段的实时率都以原始音频时长为基准
+                        recorder.audio_duration = get_audio_duration(os.path.join(folder, 'audio.wav'))
+                except Exception as e:
+                    stack_trace = traceback.format_exc()
+                    error_msg = f'人声分离失败: {str(e)}\n{stack_trace}'
+                    logger.error(error_msg)
                     return False, None, error_msg
 
-                folder = download_single_video(info, root_folder, resolution)
-                if folder is None:
-                    error_msg = f'下载视频失败: {info["title"]}'
-                    logger.warning(error_msg)
+                # 完成人声分离阶段，进入语音识别阶段
+                if abort_event is not None and abort_event.is_set():
+                    return False, None, '处理已被用户中止'
+                current_stage += 1
+                progress_base += stage_weight
+                stage_name, stage_weight = stages[current_stage]
+                if progress_callback:
+                    progress_callback(progress_base, stage_name)
+
+                try:
+                    with recorder.stage('asr'):
+                        status, result_json = transcribe_all_audio_under_folder(
+                            folder, asr_method=asr_method, whisper_model_name=whisper_model, device=device,
+                            batch_size=batch_size, diarization=diarization,
+                            min_speakers=whisper_min_speakers,
+                            max_speakers=whisper_max_speakers, speech_map=speech_map)
+                        logger.info(f'语音识别完成: {status}')
+                except Exception as e:
+                    stack_trace = traceback.format_exc()
+                    error_msg = f'语音识别失败: {str(e)}\n{stack_trace}'
+                    logger.error(error_msg)
                     return False, None, error_msg
 
-            logger.info(f'处理视频: {folder}')
-
-            # 完成下载阶段，进入人声分离阶段
-            current_stage += 1
-            progress_base += stage_weight
-            stage_name, stage_weight = stages[current_stage]
-            if progress_callback:
-                progress_callback(progress_base, stage_name)
-
-            try:
-                status, vocals_path, _ = separate_all_audio_under_folder(
-                    folder, model_name=demucs_model, device=device, progress=True, shifts=shifts)
-                logger.info(f'人声分离完成: {vocals_path}')
-            except Exception as e:
-                stack_trace = traceback.format_exc()
-                error_msg = f'人声分离失败: {str(e)}\n{stack_trace}'
-                logger.error(error_msg)
-                return False, None, error_msg
-
-            # 完成人声分离阶段，进入语音识别阶段
-            current_stage += 1
-            progress_base += stage_weight
-            stage_name, stage_weight = stages[current_stage]
-            if progress_callback:
-                progress_callback(progress_base, stage_name)
-
-            try:
-                status, result_json = transcribe_all_audio_under_folder(
-                    folder, asr_method=asr_method, whisper_model_name=whisper_model, device=device,
-                    batch_size=batch_size, diarization=diarization,
-                    min_speakers=whisper_min_speakers,
-                    max_speakers=whisper_max_speakers)
-                logger.info(f'语音识别完成: {status}')
-            except Exception as e:
-                stack_trace = traceback.format_exc()
-                error_msg = f'语音识别失败: {str(e)}\n{stack_trace}'
-                logger.error(error_msg)
-                return False, None, error_msg
-
-            # 完成语音识别阶段，进入翻译阶段
-            current_stage += 1
-            progress_base += stage_weight
-            stage_name, stage_weight = stages[current_stage]
-            if progress_callback:
-                progress_callback(progress_base, stage_name)
-
-            try:
-                status, summary, translation = translate_all_transcript_under_folder(
-                    folder, method=translation_method, target_language=translation_target_language)
-                logger.info(f'翻译完成: {status}')
-            except Exception as e:
-                stack_trace = traceback.format_exc()
-                error_msg = f'翻译失败: {str(e)}\n{stack_trace}'
-                logger.error(error_msg)
-                return False, None, error_msg
+                # 完成语音识别阶段，进入翻译阶段
+                if abort_event is not None and abort_event.is_set():
+                    return False, None, '处理已被用户中止'
+                current_stage += 1
+                progress_base += stage_weight
+                stage_name, stage_weight = stages[current_stage]
+                if progress_callback:
+                    progress_callback(progress_base, stage_name)
+
+                try:
+                    with recorder.stage('translation'):
+                        if pipeline_tts and not streaming_tts:
+                            # 边翻译边合成，之后的语音合成阶段只需对齐和混音
+                            status, summary, translation = translate_and_synthesize_all_under_folder(
+                                folder, translation_method, translation_target_language,
+                                tts_method, tts_target_language, voice)
+                        else:
+                            status, summary, translation = translate_all_transcript_under_folder(
+                                folder, method=translation_method, target_language=translation_target_language)
+                        logger.info(f'翻译完成: {status}')
+                except Exception as e:
+                    stack_trace = traceback.format_exc()
+                    error_msg = f'翻译失败: {str(e)}\n{stack_trace}'
+                    logger.error(error_msg)
+                    return False, None, error_msg
 
-            # 完成翻译阶段，进入语音合成阶段
-            current_stage += 1
-            progress_base += stage_weight
-            stage_name, stage_weight = stages[current_stage]
-            if progress_callback:
-                progress_callback(progress_base, stage_name)
+                # 完成翻译阶段，进入语音合成阶段
+                if abort_event is not None and abort_event.is_set():
+                    return False, None, '处理已被用户中止'
+                current_stage += 1
+                progress_base += stage_weight
+                stage_name, stage_weight = stages[current_stage]
+                if progress_callback:
+                    progress_callback(progress_base, stage_name)
+
+                try:
+                    with recorder.stage('tts') as extra:
+                        if streaming_tts:
+                            def first_audio_callback(time_to_first_audio, preview_path, stage_name=stage_name,
+                                                     progress=progress_base):
+                                extra['time_to_first_audio'] = time_to_first_audio
+                                if progress_callback:
+                                    progress_callback(progress, f'{stage_name} 首段音频 {time_to_first_audio:.1f} 秒'
+                                                      + (f'，预览: {preview_path}' if preview_path else ''))
+
+                            status, synth_path, _ = generate_all_wavs_under_folder_streaming(
+                                folder, method=tts_method, target_language=tts_target_language, voice=voice,
+                                abort_event=abort_event, first_audio_callback=first_audio_callback)
+                        else:
+                            status, synth_path, _ = generate_all_wavs_under_folder(
+                                folder, method=tts_method, target_language=tts_target_language, voice=voice)
+                        logger.info(f'语音合成完成: {synth_path}')
+                except DubbingAborted as e:
+                    logger.info(str(e))
+                    return False, None, '处理已被用户中止'
+                except Exception as e:
+                    stack_trace = traceback.format_exc()
+                    error_msg = f'语音合成失败: {str(e)}\n{stack_trace}'
+                    logger.error(error_msg)
+                    return False, None, error_msg
 
-            try:
-                status, synth_path, _ = generate_all_wavs_under_folder(
-                    folder, method=tts_method, target_language=tts_target_language, voice=voice)
-                logger.info(f'语音合成完成: {synth_path}')
-            except Exception as e:
-                stack_trace = traceback.format_exc()
-                error_msg = f'语音合成失败: {str(e)}\n{stack_trace}'
-                logger.error(error_msg)
-                return False, None, error_msg
+                # 完成语音合成阶段，进入视频合成阶段
+                if abort_event is not None and abort_event.is_set():
+                    return False, None, '处理已被用户中止'
+                current_stage += 1
+                progress_base += stage_weight
+                stage_name, stage_weight = stages[current_stage]
+                if progress_callback:
+                    progress_callback(progress_base, stage_name)
+
+                try:
+                    with recorder.stage('synthesis'):
+                        status, output_video = synthesize_all_video_under_folder(
+                            folder, subtitles=subtitles, speed_up=speed_up, fps=fps, resolution=target_resolution,
+                            background_music=background_music, bgm_volume=bgm_volume, video_volume=video_volume)
+                        logger.info(f'视频合成完成: {output_video}')
+                except Exception as e:
+                    stack_trace = traceback.format_exc()
+                    error_msg = f'视频合成失败: {str(e)}\n{stack_trace}'
+                    logger.error(error_msg)
+                    return False, None, error_msg
 
-            # 完成语音合成阶段，进入视频合成阶段
-            current_stage += 1
-            progress_base += stage_weight
-            stage_name, stage_weight = stages[current_stage]
-            if progress_callback:
-                progress_callback(progress_base, stage_name)
+                # 完成所有阶段，报告100%进度
+                succeeded = True
+                if progress_callback:
+                    progress_callback(100, "处理完成!")
 
-            try:
-                status, output_video = synthesize_all_video_under_folder(
-                    folder, subtitles=subtitles, speed_up=speed_up, fps=fps, resolution=target_resolution,
-                    background_music=background_music, bgm_volume=bgm_volume, video_volume=video_volume)
-                logger.info(f'视频合成完成: {output_video}')
+                return True, output_video, "处理成功"
             except Exception as e:
                 stack_trace = traceback.format_exc()
-                error_msg = f'视频合成失败: {str(e)}\n{stack_trace}'
+                error_msg = f'处理视频时发生错误 {info["title"] if isinstance(info, dict) else info}: {str(e)}\n{stack_trace}'
                 logger.error(error_msg)
-                return False, None, error_msg
-
-            # 完成所有阶段，报告100%进度
-            if progress_callback:
-                progress_callback(100, "处理完成!")
-
-            return True, output_video, "处理成功"
-        except Exception as e:
-            stack_trace = traceback.format_exc()
-            error_msg = f'处理视频时发生错误 {info["title"] if isinstance(info, dict) else info}: {str(e)}\n{stack_trace}'
-            logger.error(error_msg)
-            if retry < max_retries - 1:
-                logger.info(f'尝试重试 {retry + 2}/{max_retries}...')
-            else:
-                return False, None, error_msg
+                if retry < max_retries - 1:
+                    logger.info(f'尝试重试 {retry + 2}/{max_retries}...')
+                else:
+                    return False, None, error_msg
 
-    return False, None, f"达到最大重试次数: {max_retries}"
+        return False, None, f"达到最大重试次数: {max_retries}"
+    finally:
+        recorder.finish(success=succeeded)
 
 
 def do_everything(root_folder, url, num_videos=5, resolution='1080p',
@@ -263,12 +329,19 @@ def do_everything(root_folder, url, num_videos=5, resolution='1080p',
                   tts_method='xtts', tts_target_language='中文', voice='zh-CN-XiaoxiaoNeural',
                   subtitles=True, speed_up=1.00, fps=30,
                   background_music=None, bgm_volume=0.5, video_volume=1.0, target_resolution='1080p',
-                  max_workers=3, max_retries=5, progress_callback=None):
+                  max_workers=3, max_retries=5, progress_callback=None, streaming_tts=False, abort_event=None,
+                  demucs_preset=None, speech_map=False, skip_silence=False, pipeline_tts=False):
     """
     处理整个视频处理流程，增加了进度回调函数
 
     Args:
         progress_callback: 回调函数，用于报告进度和状态，格式为 progress_callback(progress_percent, status_message)
+        streaming_tts: 流式语音合成，边合成边生成 HLS 预览
+        abort_event: threading.Event，被设置后尽快中止处理
+        demucs_preset: 人声分离预设 fast / balanced / best，为 None 或 custom 时使用 demucs_model 和 shifts
+        speech_map: 在原始音频上检测一次语音区间（speech_map.json），语音识别和说话人参考音频只使用语音部分
+        skip_silence: 人声分离跳过非语音部分，直接把原始混音作为伴奏
+        pipeline_tts: 翻译与语音合成流水线并行，每翻译完一句就开始合成（流式合成预览时不生效）
     """
     try:
         success_list = []
@@ -279,7 +352,7 @@ def do_everything(root_folder, url, num_videos=5, resolution='1080p',
         logger.info("-" * 50)
         logger.info(f"开始处理任务: {url}")
         logger.info(f"参数: 输出文件夹={root_folder}, 视频数量={num_videos}, 分辨率={resolution}")
-        logger.info(f"人声分离: 模型={demucs_model}, 设备={device}, 移位次数={shifts}")
+        logger.info(f"人声分离: 模型={demucs_model}, 设备={device}, 移位次数={shifts}, 预设={demucs_preset}")
         logger.info(f"语音识别: 方法={asr_method}, 模型={whisper_model}, 批大小={batch_size}")
         logger.info(f"翻译: 方法={translation_method}, 目标语言={translation_target_language}")
         logger.info(f"语音合成: 方法={tts_method}, 目标语言={tts_target_language}, 声音={voice}")
@@ -333,7 +406,8 @@ def do_everything(root_folder, url, num_videos=5, resolution='1080p',
                     translation_method, translation_target_language,
                     tts_method, tts_target_language, voice,
                     subtitles, speed_up, fps, background_music, bgm_volume, video_volume,
-                    target_resolution, max_retries, progress_callback
+                    target_resolution, max_retries, progress_callback, streaming_tts, abort_event, demucs_preset,
+                    speech_map, skip_silence, pipeline_tts
                 )
 
                 if success:
@@ -348,17 +422,24 @@ def do_everything(root_folder, url, num_videos=5, resolution='1080p',
                 return f"处理本地视频失败: {str(e)}", None
         else:
             try:
-                videos_info = []
                 if progress_callback:
                     progress_callback(10, "获取视频信息中...")
 
-                for video_info in get_info_list_from_url(urls, num_videos):
-                    videos_info.append(video_info)
-
-                if not videos_info:
-                    return "获取视频信息失败，请检查URL是否正确", None
-
-                for info in videos_info:
+                # 视频信息边解析边下载，多个视频并发下载，每下载完成一个就立即进入后续处理
+                has_video = False
+                downloads = download_videos_concurrently(
+                    get_info_list_from_url(urls, num_videos), root_folder, resolution,
+                    max_workers=max_workers, abort_event=abort_event)
+                for info, folder in downloads:
+                    has_video = True
+                    if abort_event is not None and abort_event.is_set():
+                        logger.info('处理已被用户中止')
+                        break
+                    if folder is None:
+                        fail_list.append(info)
+                        error_details.append(f"{info['title']}: 下载视频失败")
+                        logger.error(f"下载视频失败: {info['title']}")
+                        continue
                     try:
                         success, output_video, error_msg = process_video(
                             info, root_folder, resolution,
@@ -368,7 +449,8 @@ def do_everything(root_folder, url, num_videos=5, resolution='1080p',
                             translation_method, translation_target_language,
                             tts_method, tts_target_language, voice,
                             subtitles, speed_up, fps, background_music, bgm_volume, video_volume,
-                            target_resolution, max_retries, progress_callback
+                            target_resolution, max_retries, progress_callback, streaming_tts, abort_event, demucs_preset,
+                            speech_map, skip_silence, pipeline_tts, folder=folder
                         )
 
                         if success:
@@ -386,6 +468,10 @@ def do_everything(root_folder, url, num_videos=5, resolution='1080p',
                         error_details.append(f"{info['title'] if isinstance(info, dict) else info}: {str(e)}")
                         logger.error(
                             f"处理视频出错: {info['title'] if isinstance(info, dict) else info}, 错误: {str(e)}\n{stack_trace}")
+                # 中止时立即关闭生成器，取消还在排队的下载
+                downloads.close()
+                if not has_video:
+                    return "获取视频信息失败，请检查URL是否正确", None
             except Exception as e:
                 stack_trace = traceback.format_exc()
                 logger.error(f"获取视频列表失败: {str(e)}\n{stack_trace}")
@@ -0,0 +1,382 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import wave
+from contextlib import contextmanager
+
+from loguru import logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+METRICS_DB = 'metrics.db'
+METRICS_JSONL = 'metrics.jsonl'
+# 阶段内常驻内存的采样间隔（秒）
+RSS_SAMPLE_INTERVAL = 0.2
+
+# 没有历史数据时使用的默认阶段权重（百分比）
+DEFAULT_STAGE_WEIGHTS = {
+    'download': 10,
+    'separation': 15,
+    'asr': 20,
+    'translation': 25,
+    'tts': 20,
+    'synthesis': 10,
+}
+
+
+def get_audio_duration(wav_path):
+    """读取 wav 文件头获取时长（秒），文件不存在或无法解析时返回 None"""
+    try:
+        with wave.open(wav_path, 'rb') as f:
+            return f.getnframes() / float(f.getframerate())
+    except (OSError, wave.Error, EOFError):
+        return None
+
+
+def _peak_rss_mb():
+    """进程整个生命周期的峰值常驻内存（MB），只用于 total 记录"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 下单位为 KB，macOS 下为字节
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1024 / 1024
+    return None
+
+
+def _current_rss_mb():
+    """进程当前的常驻内存（MB）"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+class RssSampler:
+    """
+    在后台线程中定期采样常驻内存，记录阶段内的峰值
+    ru_maxrss 是整个进程生命周期的峰值，不能反映单个阶段的内存占用
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = _current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._sample()
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止采样并返回峰值（MB），无法读取内存时返回 None"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        return self.peak
+
+
+def _gpu_available():
+    return torch is not None and torch.cuda.is_available()
+
+
+class MetricsSink:
+    """把阶段指标写入 SQLite（与 task.db 放在同一目录）并追加到 JSONL 文件"""
+
+    def __init__(self, db_path=METRICS_DB, jsonl_path=METRICS_JSONL):
+        self.db_path = db_path
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self.init_db()
+
+    def init_db(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stage_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,
+            video TEXT,
+            stage TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            wall_time REAL NOT NULL,
+            cpu_time REAL,
+            peak_rss_mb REAL,
+            gpu_peak_mb REAL,
+            audio_duration REAL,
+            rtf REAL,
+            success INTEGER NOT NULL,
+            extra TEXT
+        )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def write(self, record):
+        with self._lock:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('''
+            INSERT INTO stage_metrics (run_id, video, stage, started_at, wall_time, cpu_time, peak_rss_mb,
+                                       gpu_peak_mb, audio_duration, rtf, success, extra)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                record['run_id'],
+                record['video'],
+                record['stage'],
+                record['started_at'],
+                record['wall_time'],
+                record['cpu_time'],
+                record['peak_rss_mb'],
+                record['gpu_peak_mb'],
+                record['audio_duration'],
+                record['rtf'],
+                int(record['success']),
+                json.dumps(record.get('extra') or {}, ensure_ascii=False),
+            ))
+            conn.commit()
+            conn.close()
+            if self.jsonl_path:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def query(self, sql, params=()):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+
+class MetricsRecorder:
+    """
+    记录单个视频各阶段的墙钟时间、CPU时间、峰值内存、GPU显存以及实时率（RTF = 处理耗时 / 音频时长）
+    阶段的峰值内存由 RssSampler 在阶段内采样得到，total 记录为进程生命周期的峰值
+
+    用法:
+        recorder = MetricsRecorder(video=folder)
+        with recorder.stage('asr') as extra:
+            ...
+        recorder.finish()
+    """
+
+    def __init__(self, video=None, sink=None, audio_duration=None):
+        self.video = video
+        self.sink = sink if sink is not None else get_default_sink()
+        self.audio_duration = audio_duration
+        self.run_id = f'{int(time.time() * 1000)}-{os.getpid()}-{id(self):x}'
+        self.records = []
+        self._t_start = time.time()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def stage(self, name, audio_duration=None):
+        extra = {}
+        started_at = time.time()
+        t_start = time.perf_counter()
+        cpu_start = time.process_time()
+        if _gpu_available():
+            torch.cuda.reset_peak_memory_stats()
+        rss_sampler = RssSampler().start()
+        success = False
+        try:
+            yield extra
+            success = True
+        finally:
+            wall_time = time.perf_counter() - t_start
+            peak_rss_mb = rss_sampler.stop()
+            gpu_peak_mb = torch.cuda.max_memory_allocated() / 1024 / 1024 if _gpu_available() else None
+            duration = audio_duration or extra.pop('audio_duration', None) or self.audio_duration
+            record = {
+                'run_id': self.run_id,
+                'video': self.video,
+                'stage': name,
+                'started_at': started_at,
+                'wall_time': wall_time,
+                'cpu_time': time.process_time() - cpu_start,
+                'peak_rss_mb': peak_rss_mb,
+                'gpu_peak_mb': gpu_peak_mb,
+                'audio_duration': duration,
+                'rtf': wall_time / duration if duration else None,
+                'success': success,
+                'extra': extra,
+            }
+            self.records.append(record)
+            self._write(record)
+            logger.info(f'[metrics] {name}: 用时 {wall_time:.2f} 秒'
+                        + (f', RTF {record["rtf"]:.3f}' if record['rtf'] else ''))
+
+    def finish(self, success=True):
+        """写入整个视频的 total 记录，显存峰值取各阶段峰值的最大值（每个阶段开始时都会重置显存统计）"""
+        wall_time = time.time() - self._t_start
+        gpu_peaks = [r['gpu_peak_mb'] for r in self.records if r['gpu_peak_mb'] is not None]
+        record = {
+            'run_id': self.run_id,
+            'video': self.video,
+            'stage': 'total',
+            'started_at': self._t_start,
+            'wall_time': wall_time,
+            'cpu_time': time.process_time() - self._cpu_start,
+            'peak_rss_mb': _peak_rss_mb(),
+            'gpu_peak_mb': max(gpu_peaks) if gpu_peaks else None,
+            'audio_duration': self.audio_duration,
+            'rtf': wall_time / self.audio_duration if self.audio_duration else None,
+            'success': success,
+            'extra': {},
+        }
+        self.records.append(record)
+        self._write(record)
+        return record
+
+    def _write(self, record):
+        if self.sink is None:
+            return
+        try:
+            self.sink.write(record)
+        except Exception as e:
+            # 指标写入失败不影响主流程
+            logger.warning(f'写入性能指标失败: {e}')
+
+
+_default_sink = None
+
+
+def get_default_sink():
+    global _default_sink
+    if _default_sink is None:
+        try:
+            _default_sink = MetricsSink()
+        except Exception as e:
+            logger.warning(f'初始化性能指标数据库失败: {e}')
+            return None
+    return _default_sink
+
+
+def estimate_stage_weights(stages, sink=None, history=50):
+    """
+    根据历史实测的各阶段平均实时率（RTF = 耗时 / 音频时长）估计进度权重（百分比，总和为100）
+    按实时率而不是耗时平均，避免个别长视频主导权重
+    没有历史数据（或没有音频时长，例如下载阶段）的阶段使用默认权重
+    """
+    sink = sink if sink is not None else get_default_sink()
+    measured = {}
+    if sink is not None:
+        try:
+            for stage in stages:
+                rows = sink.query('''
+                SELECT rtf FROM stage_metrics
+                WHERE stage = ? AND success = 1 AND rtf IS NOT NULL ORDER BY id DESC LIMIT ?
+                ''', (stage, history))
+                if rows:
+                    measured[stage] = sum(row[0] for row in rows) / len(rows)
+        except Exception as e:
+            logger.warning(f'读取历史性能指标失败: {e}')
+            measured = {}
+
+    if len(measured) < len(stages):
+        # 缺少部分阶段的数据时，用默认权重按比例补齐
+        known_default = sum(DEFAULT_STAGE_WEIGHTS.get(s, 10) for s in measured)
+        known_measured = sum(measured.values())
+        scale = known_measured / known_default if known_default and known_measured else None
+        for stage in stages:
+            if stage not in measured:
+                default = DEFAULT_STAGE_WEIGHTS.get(stage, 10)
+                measured[stage] = default * scale if scale else default
+
+    total = sum(measured.values()) or 1
+    weights = [measured[s] / total * 100 for s in stages]
+    # 取整并保证总和为100
+    rounded = [int(w) for w in weights]
+    for i in sorted(range(len(stages)), key=lambda i: weights[i] - rounded[i], reverse=True)[:100 - sum(rounded)]:
+        rounded[i] += 1
+    return rounded
+
+
+def summarize(sink=None, since=None):
+    """按阶段汇总: 次数、平均/最大耗时、平均CPU时间、峰值内存、峰值显存、平均RTF"""
+    sink = sink if sink is not None else MetricsSink()
+    sql = '''
+    SELECT stage, COUNT(*), AVG(wall_time), MAX(wall_time), AVG(cpu_time), MAX(peak_rss_mb), MAX(gpu_peak_mb),
+           AVG(rtf), SUM(audio_duration), SUM(1 - success)
+    FROM stage_metrics
+    '''
+    params = ()
+    if since is not None:
+        sql += ' WHERE started_at >= ?'
+        params = (since,)
+    sql += ' GROUP BY stage ORDER BY AVG(wall_time) DESC'
+    keys = ['stage', 'count', 'avg_wall_time', 'max_wall_time', 'avg_cpu_time', 'peak_rss_mb', 'gpu_peak_mb',
+            'avg_rtf', 'audio_seconds', 'failures']
+    return [dict(zip(keys, row)) for row in sink.query(sql, params)]
+
+
+def format_report(rows):
+    def fmt(value, spec='.2f'):
+        return '-' if value is None else format(value, spec)
+
+    header = f'{"stage":<14}{"count":>7}{"avg(s)":>10}{"max(s)":>10}{"cpu(s)":>10}{"rss(MB)":>10}{"gpu(MB)":>10}{"RTF":>8}{"fail":>6}'
+    lines = [header, '-' * len(header)]
+    for row in rows:
+        lines.append(f'{row["stage"]:<14}{row["count"]:>7}{fmt(row["avg_wall_time"]):>10}'
+                     f'{fmt(row["max_wall_time"]):>10}{fmt(row["avg_cpu_time"]):>10}{fmt(row["peak_rss_mb"], ".0f"):>10}'
+                     f'{fmt(row["gpu_peak_mb"], ".0f"):>10}{fmt(row["avg_rtf"], ".3f"):>8}{row["failures"]:>6}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Linly-Dubbing 性能指标汇总')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    report = subparsers.add_parser('report', help='按阶段汇总耗时、内存和实时率')
+    report.add_argument('--db', default=METRICS_DB, help='指标数据库路径')
+    report.add_argument('--days', type=float, default=None, help='只统计最近N天')
+    report.add_argument('--json', action='store_true', help='以JSON格式输出')
+    args = parser.parse_args(argv)
+
+    if args.command == 'report':
+        if not os.path.exists(args.db):
+            print(f'指标数据库不存在: {args.db}')
+            return 1
+        since = time.time() - args.days * 86400 if args.days else None
+        rows = summarize(MetricsSink(args.db, jsonl_path=None), since)
+        print(json.dumps(rows, indent=2, ensure_ascii=False) if args.json else format_report(rows))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
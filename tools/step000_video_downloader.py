@@ -1,5 +1,7 @@
 import os
 import re
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from loguru import logger
 import yt_dlp
 import json
@@ -23,7 +25,7 @@ def get_target_folder(info, folder_path):
 
     return output_folder
 
-def download_single_video(info, folder_path, resolution='1080p'):
+def download_single_video(info, folder_path, resolution='1080p', concurrent_fragment_downloads=1):
     sanitized_title = sanitize_title(info['title'])
     sanitized_uploader = sanitize_title(info.get('uploader', 'Unknown'))
     upload_date = info.get('upload_date', 'Unknown')
@@ -43,6 +45,7 @@ def download_single_video(info, folder_path, resolution='1080p'):
         'writethumbnail': True,
         'outtmpl': os.path.join(folder_path, sanitized_uploader, f'{upload_date} {sanitized_title}', 'download'),
         'ignoreerrors': True,
+        'concurrent_fragment_downloads': concurrent_fragment_downloads,  # DASH/HLS 分片并发下载数
         'cookiefile' : 'cookies.txt' if os.path.exists("cookies.txt") else None, # 得到cookies yt-dlp --cookies-from-browser chrome --cookies cookies.txt
         # 'cookiesfrombrowser': ('chrome', ), # 从chrome浏览器中获取cookie 
         # 'cookiesfrombrowser': ('firefox', 'default', None, 'Meta') # 从firefox浏览器中获取cookie
@@ -50,6 +53,10 @@ def download_single_video(info, folder_path, resolution='1080p'):
 
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         ydl.download([info['webpage_url']])
+    # ignoreerrors 时 yt-dlp 不会抛出异常，以是否生成 download.mp4 判断下载是否成功
+    if not os.path.exists(os.path.join(output_folder, 'download.mp4')):
+        logger.warning(f'Video download failed: {info["webpage_url"]}')
+        return None
     logger.info(f'Video downloaded in {output_folder}')
     return output_folder
 
@@ -58,11 +65,7 @@ def download_videos(info_list, folder_path, resolution='1080p'):
         output_folder = download_single_video(info, folder_path, resolution)
     return output_folder
 
-def get_info_list_from_url(url, num_videos):
-    if isinstance(url, str):
-        url = [url]
-
-    # Download JSON information first
+def _extract_info_entries(u, num_videos, output_queue):
     ydl_opts = {
         # 'format': 'b',
         'None': "b",
@@ -70,54 +73,111 @@ def get_info_list_from_url(url, num_videos):
         'playlistend': num_videos,
         'ignoreerrors': True
     }
-
-    # video_info_list = []
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        for u in url:
-            result = ydl.extract_info(u, download=False)
-            if 'entries' in result:
-                # Playlist
-                # video_info_list.extend(result['entries'])
-                for video_info in result['entries']:
-                    yield video_info
-            else:
-                # Single video
-                # video_info_list.append(result)
-                yield result
-
-    # return video_info_list
-
-def download_from_url(url, folder_path, resolution='1080p', num_videos=5):
-    resolution = resolution.replace('p', '')
+        # process=False 时播放列表的 entries 是惰性生成器，逐条解析逐条放入队列
+        result = ydl.extract_info(u, download=False, process=False)
+        if result is None:
+            logger.warning(f'获取视频信息失败: {u}')
+            return
+        if 'entries' in result:
+            # Playlist
+            for i, entry in enumerate(result['entries']):
+                if num_videos and i >= num_videos:
+                    break
+                video_info = ydl.process_ie_result(entry, download=False)
+                if video_info is not None:
+                    output_queue.put(video_info)
+        else:
+            # Single video
+            video_info = ydl.process_ie_result(result, download=False)
+            if video_info is not None:
+                output_queue.put(video_info)
+
+
+def get_info_list_from_url(url, num_videos, max_workers=4):
+    """
+    并行解析多个URL（视频、播放列表或频道）的视频信息。
+    每解析完一个视频就立即产出，不必等待整个播放列表解析完成。
+    """
     if isinstance(url, str):
         url = [url]
 
-    # Download JSON information first
-    ydl_opts = {
-        # 'format': 'b',
-        "None":"b",
-        'dumpjson': True,
-        'playlistend': num_videos,
-        'ignoreerrors': True,
-        'cookies-from-browser': 'chrome'
-    }
+    output_queue = queue.Queue()
+    done = object()
 
-    video_info_list = []
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    def worker(u):
+        try:
+            _extract_info_entries(u, num_videos, output_queue)
+        except Exception as e:
+            logger.error(f'解析视频信息出错 {u}: {e}')
+        finally:
+            output_queue.put(done)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(url)))) as executor:
         for u in url:
-            result = ydl.extract_info(u, download=False)
-            # print(result)
-       
-
-            if 'entries' in result:
-                # Playlist
-                video_info_list.extend(result['entries'])
-            else:
-                # Single video
-                video_info_list.append(result)
-        
-    # Now download videos with sanitized titles
-    example_output_folder = download_videos(video_info_list, folder_path, resolution)
+            executor.submit(worker, u)
+        remaining = len(url)
+        while remaining > 0:
+            item = output_queue.get()
+            if item is done:
+                remaining -= 1
+                continue
+            yield item
+
+
+def download_videos_concurrently(info_list, folder_path, resolution='1080p', max_workers=3,
+                                 concurrent_fragment_downloads=4, abort_event=None):
+    """
+    使用有界线程池并发下载视频。
+    info_list 可以是生成器，边解析边提交下载；每个视频下载完成后立即产出 (info, output_folder)，
+    下载失败时 output_folder 为 None，以便后续处理阶段无需等待全部下载结束。
+    abort_event 被设置后不再提交新的下载；提前关闭生成器时取消排队中的下载，不等待它们完成。
+    """
+    max_workers = max(1, max_workers)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending = set()
+        futures = {}
+        for info in info_list:
+            if abort_event is not None and abort_event.is_set():
+                break
+            future = executor.submit(download_single_video, info, folder_path, resolution,
+                                     concurrent_fragment_downloads)
+            futures[future] = info
+            pending.add(future)
+            # 限制已提交但未完成的任务数量，避免一次性把整个播放列表都塞进队列
+            if len(pending) >= max_workers * 2:
+                finished = next(as_completed(pending))
+                pending.discard(finished)
+                yield _download_result(finished, futures.pop(finished))
+        for finished in as_completed(pending):
+            yield _download_result(finished, futures.pop(finished))
+    except BaseException:
+        # 包括 GeneratorExit（调用方中止后关闭生成器）：取消排队中的下载，不等待
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+
+def _download_result(future, info):
+    try:
+        return info, future.result()
+    except Exception as e:
+        logger.error(f'下载视频失败 {info.get("title", info)}: {e}')
+        return info, None
+
+
+def download_from_url(url, folder_path, resolution='1080p', num_videos=5, max_workers=3,
+                      concurrent_fragment_downloads=4):
+    example_output_folder = None
+    download_info_json = None
+    for info, output_folder in download_videos_concurrently(
+            get_info_list_from_url(url, num_videos), folder_path, resolution,
+            max_workers=max_workers, concurrent_fragment_downloads=concurrent_fragment_downloads):
+        if output_folder is not None:
+            example_output_folder = output_folder
+    if example_output_folder is None:
+        return f"No video was downloaded under the {folder_path} folder", None, None
     if os.path.exists(os.path.join(example_output_folder, 'download.info.json')):
         download_info_json = json.load(open(os.path.join(example_output_folder, 'download.info.json'), 'r', encoding='utf-8'))
     return f"All videos have been downloaded under the {folder_path} folder", os.path.join(example_output_folder, 'download.mp4'), download_info_json
@@ -0,0 +1,200 @@
+import json
+import os
+import subprocess
+import threading
+
+import numpy as np
+from loguru import logger
+from scipy.io import wavfile
+
+REGISTRY_FILE = 'audio_registry.json'
+
+# 原始音频 audio.wav 的格式（Demucs 需要 44.1kHz 立体声）
+SOURCE_SAMPLE_RATE = 44100
+SOURCE_CHANNELS = 2
+
+# 流水线中各个源文件本身的格式，请求该格式时直接返回源文件
+SOURCE_FORMATS = {
+    'audio.wav': (SOURCE_SAMPLE_RATE, SOURCE_CHANNELS),
+    'audio_vocals.wav': (SOURCE_SAMPLE_RATE, SOURCE_CHANNELS),
+    'audio_instruments.wav': (SOURCE_SAMPLE_RATE, SOURCE_CHANNELS),
+}
+
+# 各个后端需要的派生音频格式: (采样率, 声道数)
+ASR_FORMAT = (16000, 1)  # WhisperX / FunASR / pyannote
+TTS_FORMAT = (24000, 1)  # 说话人参考音频、配音混音
+
+# 每个源文件需要预先生成的派生格式
+DEFAULT_VARIANTS = {
+    'audio.wav': [ASR_FORMAT],
+    'audio_vocals.wav': [ASR_FORMAT, TTS_FORMAT],
+    'audio_instruments.wav': [TTS_FORMAT],
+}
+
+_registry_lock = threading.Lock()
+
+
+def run_ffmpeg(args):
+    """
+    运行 ffmpeg 并检查退出码，失败时抛出 RuntimeError
+    """
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y'] + args
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        stderr_output = result.stderr.decode('utf-8', errors='ignore').strip()
+        raise RuntimeError(f'ffmpeg 执行失败 (exit code {result.returncode}): {stderr_output}')
+
+
+def variant_name(source_name, sample_rate, channels):
+    base, _ = os.path.splitext(source_name)
+    return f'{base}_{sample_rate // 1000}k_{"mono" if channels == 1 else f"{channels}ch"}.wav'
+
+
+def _variant_key(source_name, sample_rate, channels):
+    return f'{source_name}@{sample_rate}x{channels}'
+
+
+def load_registry(folder):
+    registry_path = os.path.join(folder, REGISTRY_FILE)
+    if not os.path.exists(registry_path):
+        return {}
+    try:
+        with open(registry_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        logger.warning(f'音频注册表损坏，重新生成: {registry_path}')
+        return {}
+
+
+def _save_registry(folder, registry):
+    registry_path = os.path.join(folder, REGISTRY_FILE)
+    tmp_path = registry_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, registry_path)
+
+
+def _register(folder, entries):
+    with _registry_lock:
+        registry = load_registry(folder)
+        registry.update(entries)
+        _save_registry(folder, registry)
+
+
+def _entry(folder, source_name, file_name, sample_rate, channels):
+    source_path = os.path.join(folder, source_name)
+    return {
+        'path': file_name,
+        'source': source_name,
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'source_mtime': os.path.getmtime(source_path) if os.path.exists(source_path) else None,
+    }
+
+
+def _is_valid(folder, entry):
+    if entry is None or not os.path.exists(os.path.join(folder, entry['path'])):
+        return False
+    source_path = os.path.join(folder, entry['source'])
+    # 源文件被重新生成后派生文件失效
+    if entry.get('source_mtime') is not None and os.path.exists(source_path):
+        return os.path.getmtime(source_path) <= entry['source_mtime']
+    return True
+
+
+def ingest_audio(folder, variants=None):
+    """
+    从 download.mp4 中提取音频，只解码一次，同时输出 audio.wav(44.1kHz 立体声) 以及各后端需要的派生格式
+    """
+    video_path = os.path.join(folder, 'download.mp4')
+    audio_path = os.path.join(folder, 'audio.wav')
+    if not os.path.exists(video_path):
+        return False
+    if variants is None:
+        variants = DEFAULT_VARIANTS['audio.wav']
+
+    outputs = []
+    if not os.path.exists(audio_path):
+        outputs.append(('audio.wav', SOURCE_SAMPLE_RATE, SOURCE_CHANNELS))
+    registry = load_registry(folder)
+    for sample_rate, channels in variants:
+        if not _is_valid(folder, registry.get(_variant_key('audio.wav', sample_rate, channels))):
+            outputs.append((variant_name('audio.wav', sample_rate, channels), sample_rate, channels))
+    if not outputs:
+        logger.info(f'音频已提取: {folder}')
+        return True
+
+    logger.info(f'正在从视频提取音频: {folder}')
+    args = ['-i', video_path]
+    for file_name, sample_rate, channels in outputs:
+        args += ['-map', '0:a:0', '-vn', '-acodec', 'pcm_s16le', '-ar', str(sample_rate), '-ac', str(channels),
+                 os.path.join(folder, file_name)]
+    run_ffmpeg(args)
+
+    _register(folder, {
+        _variant_key('audio.wav', sample_rate, channels): _entry(folder, 'audio.wav', file_name, sample_rate, channels)
+        for file_name, sample_rate, channels in outputs if file_name != 'audio.wav'
+    })
+    logger.info(f'音频提取完成: {folder}')
+    return True
+
+
+def derive_audio_variants(folder, source_name, variants=None):
+    """
+    为 folder 下的 source_name 生成所有需要的派生格式（一次 ffmpeg 解码，多路输出），并登记到注册表
+    返回 {(采样率, 声道数): 文件路径}
+    """
+    if variants is None:
+        variants = DEFAULT_VARIANTS.get(source_name, [])
+    source_path = os.path.join(folder, source_name)
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(source_path)
+
+    registry = load_registry(folder)
+    paths = {}
+    missing = []
+    for sample_rate, channels in variants:
+        entry = registry.get(_variant_key(source_name, sample_rate, channels))
+        if SOURCE_FORMATS.get(source_name) == (sample_rate, channels):
+            paths[(sample_rate, channels)] = source_path
+        elif _is_valid(folder, entry):
+            paths[(sample_rate, channels)] = os.path.join(folder, entry['path'])
+        else:
+            missing.append((variant_name(source_name, sample_rate, channels), sample_rate, channels))
+
+    if missing:
+        args = ['-i', source_path]
+        for file_name, sample_rate, channels in missing:
+            args += ['-acodec', 'pcm_s16le', '-ar', str(sample_rate), '-ac', str(channels),
+                     os.path.join(folder, file_name)]
+        run_ffmpeg(args)
+        _register(folder, {
+            _variant_key(source_name, sample_rate, channels): _entry(folder, source_name, file_name, sample_rate, channels)
+            for file_name, sample_rate, channels in missing
+        })
+        for file_name, sample_rate, channels in missing:
+            paths[(sample_rate, channels)] = os.path.join(folder, file_name)
+    return paths
+
+
+def get_audio_path(folder, source_name, sample_rate, channels=1):
+    """
+    获取指定格式的音频文件路径，不存在时才生成
+    """
+    return derive_audio_variants(folder, source_name, [(sample_rate, channels)])[(sample_rate, channels)]
+
+
+def load_audio(folder, source_name, sample_rate, channels=1):
+    """
+    读取指定格式的音频，返回 float32 数组（与 librosa.load 的取值范围一致），读取时不再重采样
+    """
+    wav_path = get_audio_path(folder, source_name, sample_rate, channels)
+    sr, wav = wavfile.read(wav_path)
+    assert sr == sample_rate, f'{wav_path} 采样率 {sr} 与注册表不一致'
+    if wav.dtype == np.int16:
+        wav = wav.astype(np.float32) / 32768.0
+    else:
+        wav = wav.astype(np.float32)
+    if channels > 1:
+        wav = wav.T
+    return wav
@@ -0,0 +1,130 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+import torch
+from loguru import logger
+
+from .step005_audio_ingest import ingest_audio, load_audio, ASR_FORMAT
+
+SPEECH_MAP_FILE = 'speech_map.json'
+
+vad_model = None
+_vad_lock = threading.Lock()
+
+
+def load_vad_model(device='auto', onset=0.5, offset=0.363):
+    global vad_model
+    with _vad_lock:
+        if vad_model is not None:
+            return vad_model
+        from whisperx.vad import load_vad_model as whisperx_load_vad_model
+        if device == 'auto':
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        t_start = time.time()
+        vad_model = whisperx_load_vad_model(device, vad_onset=onset, vad_offset=offset)
+        logger.info(f'Loaded VAD model in {time.time() - t_start:.2f}s')
+        return vad_model
+
+
+def detect_speech(audio, device='auto', onset=0.5, offset=0.363, min_duration_on=0.1, min_duration_off=0.1):
+    """
+    对 16kHz 单声道音频做语音活动检测，返回按时间排序的 [(start, end), ...]（秒）
+    """
+    from whisperx.vad import Binarize
+    model = load_vad_model(device, onset, offset)
+    scores = model({'waveform': torch.from_numpy(audio).unsqueeze(0), 'sample_rate': ASR_FORMAT[0]})
+    binarize = Binarize(onset=onset, offset=offset, min_duration_on=min_duration_on,
+                        min_duration_off=min_duration_off)
+    return [(round(max(0.0, s.start), 3), round(s.end, 3)) for s in binarize(scores).get_timeline().support()]
+
+
+def compute_speech_map(folder, device='auto', onset=0.5, offset=0.363):
+    """
+    在原始混音 audio.wav 上计算一次语音区间并保存到 speech_map.json，之后的各阶段直接读取
+    已存在时直接返回
+    """
+    speech_map = load_speech_map(folder)
+    if speech_map is not None:
+        logger.info(f'语音区间已存在: {folder}')
+        return speech_map
+    if not os.path.exists(os.path.join(folder, 'audio.wav')):
+        ingest_audio(folder)
+
+    t_start = time.time()
+    audio = load_audio(folder, 'audio.wav', *ASR_FORMAT)
+    regions = detect_speech(audio, device, onset, offset)
+    duration = len(audio) / ASR_FORMAT[0]
+    speech_map = {
+        'duration': duration,
+        'speech_duration': sum(end - start for start, end in regions),
+        'onset': onset,
+        'offset': offset,
+        'regions': [list(region) for region in regions],
+    }
+    with open(os.path.join(folder, SPEECH_MAP_FILE), 'w', encoding='utf-8') as f:
+        json.dump(speech_map, f, indent=2)
+    logger.info(f'语音区间检测完成，语音占比 {speech_ratio(speech_map):.1%}，用时 {time.time() - t_start:.2f} 秒')
+    return speech_map
+
+
+def load_speech_map(folder):
+    path = os.path.join(folder, SPEECH_MAP_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def speech_regions(folder):
+    """返回 speech_map.json 中的语音区间，文件不存在时返回 None"""
+    speech_map = load_speech_map(folder)
+    if speech_map is None:
+        return None
+    return [tuple(region) for region in speech_map['regions']]
+
+
+def speech_ratio(speech_map):
+    return speech_map['speech_duration'] / speech_map['duration'] if speech_map['duration'] else 0.0
+
+
+def intersect_regions(start, end, regions):
+    """返回 [start, end] 与语音区间的交集"""
+    starts = [region[0] for region in regions]
+    i = max(0, bisect.bisect_right(starts, start) - 1)
+    result = []
+    for region_start, region_end in regions[i:]:
+        if region_start >= end:
+            break
+        if region_end > start:
+            result.append((max(start, region_start), min(end, region_end)))
+    return result
+
+
+def speech_spans(regions, duration, pad=1.0, min_gap=5.0):
+    """
+    给语音区间两端各加 pad 秒余量，并合并间隔小于 min_gap 秒的区间，
+    返回需要完整处理的 (start, end) 列表；其余部分可以视为没有人声
+    """
+    spans = []
+    for start, end in regions:
+        start, end = max(0.0, start - pad), min(duration, end + pad)
+        if spans and start - spans[-1][1] < min_gap:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def compute_all_speech_maps_under_folder(root_folder, device='auto'):
+    speech_map = None
+    for root, dirs, files in os.walk(root_folder):
+        if 'download.mp4' in files or 'audio.wav' in files:
+            speech_map = compute_speech_map(root, device)
+    return f'Computed speech maps under {root_folder}', speech_map
+
+
+if __name__ == '__main__':
+    print(compute_all_speech_maps_under_folder('videos'))
@@ -1,9 +1,11 @@
 import shutil
-from demucs.api import Separator
+from demucs.api import Separator, SeparationEngine
 import os
 from loguru import logger
 import time
 from .utils import save_wav, normalize_wav
+from .step005_audio_ingest import ingest_audio, derive_audio_variants, load_audio, SOURCE_SAMPLE_RATE, SOURCE_CHANNELS
+from .step006_speech_map import compute_speech_map, speech_spans
 import torch
 import gc
 
@@ -13,6 +15,29 @@ separator = None
 model_loaded = False  # 新增标志，跟踪模型是否已加载
 current_model_config = {}  # 新增变量，存储当前加载模型的配置
 
+# 质量/速度预设。htdemucs_ft 是4个模型的 BagOfModels，每个分段要跑 4 * max(1, shifts) 次前向
+# 不提供 segment: HTDemucs 默认的 7.8 秒已是上限，更短的分段在模型内部会补零回 7.8 秒，只会增加前向次数
+DEMUCS_PRESETS = {
+    'fast': {'model_name': 'htdemucs', 'shifts': 0, 'overlap': 0.1},
+    'balanced': {'model_name': 'htdemucs_ft', 'shifts': 0, 'overlap': 0.25},
+    'best': {'model_name': 'htdemucs_ft', 'shifts': 2, 'overlap': 0.25},
+}
+CUSTOM_PRESET = 'custom'
+
+# 语音区间（加余量后）覆盖超过这个比例时，跳过静音段带来的收益不值得多次调用模型，直接整段分离
+SKIP_SILENCE_MAX_COVERAGE = 0.9
+
+
+def resolve_preset(preset, model_name="htdemucs_ft", shifts=5, overlap=0.25):
+    """
+    预设为 None 或 custom 时使用传入的参数，否则使用预设中的模型、shifts、overlap
+    """
+    if preset in (None, '', CUSTOM_PRESET):
+        return {'model_name': model_name, 'shifts': shifts, 'overlap': overlap}
+    if preset not in DEMUCS_PRESETS:
+        raise ValueError(f'未知的人声分离预设: {preset}，可选: {", ".join(list(DEMUCS_PRESETS) + [CUSTOM_PRESET])}')
+    return dict(DEMUCS_PRESETS[preset])
+
 
 def init_demucs():
     """
@@ -28,24 +53,30 @@ def init_demucs():
 
 
 def load_model(model_name: str = "htdemucs_ft", device: str = 'auto', progress: bool = True,
-               shifts: int = 5) -> Separator:
+               shifts: int = 5, overlap: float = 0.25) -> Separator:
     """
     加载Demucs模型。
-    如果相同配置的模型已加载，直接返回现有模型而不重新加载。
+    如果相同模型已加载，直接返回现有模型而不重新加载；只有 shifts/overlap 不同时只更新参数。
     """
     global separator, model_loaded, current_model_config
 
+    requested_config = {
+        'model_name': model_name,
+        'device': 'auto' if device == 'auto' else device,
+        'shifts': shifts,
+        'overlap': overlap,
+    }
     if separator is not None:
         # 检查是否需要重新加载模型（配置不同）
-        requested_config = {
-            'model_name': model_name,
-            'device': 'auto' if device == 'auto' else device,
-            'shifts': shifts
-        }
-
         if current_model_config == requested_config:
             logger.info(f'Demucs模型已加载且配置相同，重用现有模型')
             return separator
+        elif current_model_config.get('model_name') == model_name and \
+                current_model_config.get('device') == requested_config['device']:
+            logger.info(f'Demucs模型相同，更新分离参数: shifts={shifts}, overlap={overlap}')
+            separator.update_parameter(shifts=shifts, overlap=overlap, progress=progress)
+            current_model_config = requested_config
+            return separator
         else:
             logger.info(f'Demucs模型配置改变，需要重新加载')
             # 释放现有模型资源
@@ -55,14 +86,10 @@ def load_model(model_name: str = "htdemucs_ft", device: str = 'auto', progress:
     t_start = time.time()
 
     device_to_use = auto_device if device == 'auto' else device
-    separator = Separator(model_name, device=device_to_use, progress=progress, shifts=shifts)
+    separator = Separator(model_name, device=device_to_use, progress=progress, shifts=shifts, overlap=overlap)
 
     # 存储当前模型配置
-    current_model_config = {
-        'model_name': model_name,
-        'device': 'auto' if device == 'auto' else device,
-        'shifts': shifts
-    }
+    current_model_config = requested_config
 
     model_loaded = True
     t_end = time.time()
@@ -91,12 +118,90 @@ def release_model():
         logger.info('Demucs模型资源已释放')
 
 
+def _separate_tensor(wav, sample_rate, model_name, device, progress, shifts, overlap=0.25):
+    t_start = time.time()
+    try:
+        origin, separated = separator.separate_tensor(wav, sample_rate)
+    except Exception as e:
+        logger.error(f'音频分离出错: {e}')
+        # 在发生错误时尝试重新加载模型一次
+        release_model()
+        load_model(model_name, device, progress, shifts, overlap)
+        logger.info(f'已重新加载模型，重试分离...')
+        origin, separated = separator.separate_tensor(wav, sample_rate)
+    t_end = time.time()
+    logger.info(f'音频分离完成，用时 {t_end - t_start:.2f} 秒')
+    return origin, separated
+
+
+def _separate_speech_only(wav, sample_rate, spans, separate):
+    """
+    只分离 spans 中的区间，其余部分人声为静音，伴奏直接使用原始混音
+    """
+    vocals = torch.zeros_like(wav)
+    instruments = wav.clone()
+    for start, end in spans:
+        start, end = int(start * sample_rate), int(end * sample_rate)
+        _, separated = separate(wav[:, start:end], sample_rate)
+        vocals[:, start:end] = separated['vocals']
+        instruments[:, start:end] = sum(v for k, v in separated.items() if k != 'vocals')
+    return wav, {'vocals': vocals, 'instruments': instruments}
+
+
+def _load_source(folder, skip_silence=False, device='auto'):
+    """
+    读取 audio.wav（不存在时先从视频提取），返回 (波形, 采样率, 需要分离的区间)
+    skip_silence 为 False 或者非语音部分太少时区间为 None，表示整段分离
+    """
+    if not os.path.exists(os.path.join(folder, 'audio.wav')):
+        extract_audio_from_video(folder)
+    # audio.wav 已经是 44.1kHz 立体声，直接读取，避免 Demucs 再起一次 ffmpeg 解码
+    wav = torch.from_numpy(load_audio(folder, 'audio.wav', SOURCE_SAMPLE_RATE, SOURCE_CHANNELS))
+    spans = None
+    if skip_silence:
+        duration = wav.shape[-1] / SOURCE_SAMPLE_RATE
+        spans = speech_spans(compute_speech_map(folder, device)['regions'], duration)
+        covered = sum(end - start for start, end in spans)
+        if covered > SKIP_SILENCE_MAX_COVERAGE * duration:
+            spans = None
+        else:
+            logger.info(f'跳过 {duration - covered:.1f} 秒非语音音频，只分离 {covered:.1f} 秒')
+    return wav, SOURCE_SAMPLE_RATE, spans
+
+
+def _save_stems(folder, origin, separated):
+    vocal_output_path = os.path.join(folder, 'audio_vocals.wav')
+    instruments_output_path = os.path.join(folder, 'audio_instruments.wav')
+
+    vocals = separated['vocals'].numpy().T
+    instruments = None
+    for k, v in separated.items():
+        if k == 'vocals':
+            continue
+        if instruments is None:
+            instruments = v
+        else:
+            instruments += v
+    instruments = instruments.numpy().T
+
+    save_wav(vocals, vocal_output_path, sample_rate=44100)
+    logger.info(f'已保存人声: {vocal_output_path}')
+
+    save_wav(instruments, instruments_output_path, sample_rate=44100)
+    logger.info(f'已保存伴奏: {instruments_output_path}')
+
+    # 一次性生成 ASR / TTS 需要的派生格式，后续阶段不再重采样
+    derive_audio_variants(folder, 'audio_vocals.wav')
+    derive_audio_variants(folder, 'audio_instruments.wav')
+    return vocal_output_path, instruments_output_path
+
+
 def separate_audio(folder: str, model_name: str = "htdemucs_ft", device: str = 'auto', progress: bool = True,
-                   shifts: int = 5) -> None:
+                   shifts: int = 5, overlap: float = 0.25, skip_silence: bool = False) -> None:
     """
     分离音频文件
+    skip_silence 为 True 时只分离语音区间，非语音部分直接作为伴奏
     """
-    global separator
     audio_path = os.path.join(folder, 'audio.wav')
     if not os.path.exists(audio_path):
         return None, None
@@ -110,45 +215,17 @@ def separate_audio(folder: str, model_name: str = "htdemucs_ft", device: str = '
     logger.info(f'正在分离音频: {folder}')
 
     try:
-        # 确保模型已加载并且配置正确
-        if not model_loaded or current_model_config.get('model_name') != model_name or \
-                (current_model_config.get('device') == 'auto') != (device == 'auto') or \
-                current_model_config.get('shifts') != shifts:
-            load_model(model_name, device, progress, shifts)
-
-        t_start = time.time()
-
-        try:
-            origin, separated = separator.separate_audio_file(audio_path)
-        except Exception as e:
-            logger.error(f'音频分离出错: {e}')
-            # 在发生错误时尝试重新加载模型一次
-            release_model()
-            load_model(model_name, device, progress, shifts)
-            logger.info(f'已重新加载模型，重试分离...')
-            origin, separated = separator.separate_audio_file(audio_path)
-
-        t_end = time.time()
-        logger.info(f'音频分离完成，用时 {t_end - t_start:.2f} 秒')
-
-        vocals = separated['vocals'].numpy().T
-        instruments = None
-        for k, v in separated.items():
-            if k == 'vocals':
-                continue
-            if instruments is None:
-                instruments = v
-            else:
-                instruments += v
-        instruments = instruments.numpy().T
-
-        save_wav(vocals, vocal_output_path, sample_rate=44100)
-        logger.info(f'已保存人声: {vocal_output_path}')
-
-        save_wav(instruments, instruments_output_path, sample_rate=44100)
-        logger.info(f'已保存伴奏: {instruments_output_path}')
+        load_model(model_name, device, progress, shifts, overlap)
+        wav, sample_rate, spans = _load_source(folder, skip_silence, device)
 
-        return vocal_output_path, instruments_output_path
+        def separate(wav, sample_rate):
+            return _separate_tensor(wav, sample_rate, model_name, device, progress, shifts, overlap)
+
+        if spans is None:
+            origin, separated = separate(wav, sample_rate)
+        else:
+            origin, separated = _separate_speech_only(wav, sample_rate, spans, separate)
+        return _save_stems(folder, origin, separated)
 
     except Exception as e:
         logger.error(f'分离音频失败: {str(e)}')
@@ -164,44 +241,60 @@ def extract_audio_from_video(folder: str) -> bool:
     video_path = os.path.join(folder, 'download.mp4')
     if not os.path.exists(video_path):
         return False
-    audio_path = os.path.join(folder, 'audio.wav')
-    if os.path.exists(audio_path):
-        logger.info(f'音频已提取: {folder}')
-        return True
-    logger.info(f'正在从视频提取音频: {folder}')
-
-    os.system(
-        f'ffmpeg -loglevel error -i "{video_path}" -vn -acodec pcm_s16le -ar 44100 -ac 2 "{audio_path}"')
-
-    time.sleep(1)
-    logger.info(f'音频提取完成: {folder}')
-    return True
+    return ingest_audio(folder)
 
 
 def separate_all_audio_under_folder(root_folder: str, model_name: str = "htdemucs_ft", device: str = 'auto',
-                                    progress: bool = True, shifts: int = 5) -> None:
+                                    progress: bool = True, shifts: int = 5, prefetch: int = 1,
+                                    write_workers: int = 1, preset=None, overlap: float = 0.25,
+                                    skip_silence: bool = False) -> None:
     """
     分离文件夹下所有音频
+    所有文件夹共用同一个 Separator: 后台线程提前提取/读取下一个文件夹的音频，人声和伴奏由写线程异步保存，
+    模型不需要等待读写
+    preset 为 fast / balanced / best 时覆盖 model_name、shifts、overlap
+    skip_silence 为 True 时只分离语音区间（speech_map.json，不存在时先计算），非语音部分直接作为伴奏
     """
-    global separator
-    vocal_output_path, instruments_output_path = None, None
+    params = resolve_preset(preset, model_name, shifts, overlap)
+    last_folder = None
+    pending = []
+    for subdir, dirs, files in os.walk(root_folder):
+        if 'download.mp4' not in files:
+            continue
+        last_folder = subdir
+        if 'audio_vocals.wav' in files and 'audio_instruments.wav' in files:
+            logger.info(f'音频已分离: {subdir}')
+        else:
+            pending.append(subdir)
 
     try:
-        for subdir, dirs, files in os.walk(root_folder):
-            if 'download.mp4' not in files:
-                continue
-            if 'audio.wav' not in files:
-                extract_audio_from_video(subdir)
-            if 'audio_vocals.wav' not in files:
-                vocal_output_path, instruments_output_path = separate_audio(subdir, model_name, device, progress,
-                                                                            shifts)
-            elif 'audio_vocals.wav' in files and 'audio_instruments.wav' in files:
-                vocal_output_path = os.path.join(subdir, 'audio_vocals.wav')
-                instruments_output_path = os.path.join(subdir, 'audio_instruments.wav')
-                logger.info(f'音频已分离: {subdir}')
+        if pending:
+            load_model(params['model_name'], device, progress, params['shifts'], params['overlap'])
+
+            def load(folder):
+                logger.info(f'正在分离音频: {folder}')
+                return _load_source(folder, skip_silence, device)
+
+            def separate_tensor(wav, sample_rate):
+                return _separate_tensor(wav, sample_rate, params['model_name'], device, progress, params['shifts'],
+                                        params['overlap'])
+
+            def separate(wav, sample_rate, spans):
+                if spans is None:
+                    return separate_tensor(wav, sample_rate)
+                return _separate_speech_only(wav, sample_rate, spans, separate_tensor)
+
+            engine = SeparationEngine(separator, _save_stems, load=load, separate=separate,
+                                      prefetch=prefetch, write_workers=write_workers)
+            for folder, error in engine.run(pending):
+                if error is not None:
+                    raise error
 
         logger.info(f'已完成所有音频分离: {root_folder}')
-        return f'所有音频分离完成: {root_folder}', vocal_output_path, instruments_output_path
+        if last_folder is None:
+            return f'所有音频分离完成: {root_folder}', None, None
+        return f'所有音频分离完成: {root_folder}', os.path.join(last_folder, 'audio_vocals.wav'), \
+            os.path.join(last_folder, 'audio_instruments.wav')
 
     except Exception as e:
         logger.error(f'分离音频过程中出错: {str(e)}')
@@ -209,7 +302,6 @@ def separate_all_audio_under_folder(root_folder: str, model_name: str = "htdemuc
         release_model()
         raise
 
-
 if __name__ == '__main__':
     folder = r"videos"
     separate_all_audio_under_folder(folder, shifts=0)
\ No newline at end of file
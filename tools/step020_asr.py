@@ -4,8 +4,10 @@ import torch
 import numpy as np
 from dotenv import load_dotenv
 from .step021_asr_whisperx import whisperx_transcribe_audio
-from .step022_asr_funasr import funasr_transcribe_audio
+from .step022_asr_funasr import funasr_transcribe_audio, funasr_transcribe_batch
 from .utils import save_wav
+from .step005_audio_ingest import load_audio, TTS_FORMAT
+from .step006_speech_map import speech_regions, intersect_regions
 import json
 import librosa
 from loguru import logger
@@ -35,18 +37,24 @@ def merge_segments(transcript, ending='!"\').:;?]}~！“”’）。：；？
 
     return merged_transcription
 
-def generate_speaker_audio(folder, transcript):
-    wav_path = os.path.join(folder, 'audio_vocals.wav')
-    audio_data, samplerate = librosa.load(wav_path, sr=24000)
+def generate_speaker_audio(folder, transcript, speech_map=False):
+    samplerate = TTS_FORMAT[0]
+    audio_data = load_audio(folder, 'audio_vocals.wav', *TTS_FORMAT)
     speaker_dict = dict()
     length = len(audio_data)
     delay = 0.05
+    # 开启 speech_map 时只保留句子中真正有人声的部分作为参考音频
+    regions = speech_regions(folder) if speech_map else None
     for segment in transcript:
-        start = max(0, int((segment['start'] - delay) * samplerate))
-        end = min(int((segment['end']+delay) * samplerate), length)
-        speaker_segment_audio = audio_data[start:end]
-        speaker_dict[segment['speaker']] = np.concatenate((speaker_dict.get(
-            segment['speaker'], np.zeros((0, ))), speaker_segment_audio))
+        spans = [(segment['start'] - delay, segment['end'] + delay)]
+        if regions is not None:
+            spans = intersect_regions(spans[0][0], spans[0][1], regions) or spans
+        for span_start, span_end in spans:
+            start = max(0, int(span_start * samplerate))
+            end = min(int(span_end * samplerate), length)
+            speaker_segment_audio = audio_data[start:end]
+            speaker_dict[segment['speaker']] = np.concatenate((speaker_dict.get(
+                segment['speaker'], np.zeros((0, ))), speaker_segment_audio))
 
     speaker_folder = os.path.join(folder, 'SPEAKER')
     if not os.path.exists(speaker_folder):
@@ -58,7 +66,7 @@ def generate_speaker_audio(folder, transcript):
         save_wav(audio, speaker_file_path)
 
 
-def transcribe_audio(method, folder, model_name: str = 'large', download_root='models/ASR/whisper', device='auto', batch_size=32, diarization=True,min_speakers=None, max_speakers=None):
+def transcribe_audio(method, folder, model_name: str = 'large', download_root='models/ASR/whisper', device='auto', batch_size=32, diarization=True,min_speakers=None, max_speakers=None, speech_map=False):
     if os.path.exists(os.path.join(folder, 'transcript.json')):
         logger.info(f'Transcript already exists in {folder}')
         return True
@@ -72,29 +80,45 @@ def transcribe_audio(method, folder, model_name: str = 'large', download_root='m
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
     
     if method == 'WhisperX':
-        transcript = whisperx_transcribe_audio(wav_path, model_name, download_root, device, batch_size, diarization, min_speakers, max_speakers)
+        transcript = whisperx_transcribe_audio(wav_path, model_name, download_root, device, batch_size, diarization, min_speakers, max_speakers, speech_regions(folder) if speech_map else None)
     elif method == 'FunASR':
         transcript = funasr_transcribe_audio(wav_path, device, batch_size, diarization)
     else:
         logger.error('Invalid ASR method')
         raise ValueError('Invalid ASR method')
 
+    return save_transcript(folder, transcript, speech_map)
+
+
+def save_transcript(folder, transcript, speech_map=False):
     transcript = merge_segments(transcript)
     with open(os.path.join(folder, 'transcript.json'), 'w', encoding='utf-8') as f:
         json.dump(transcript, f, indent=4, ensure_ascii=False)
-    logger.info(f'Transcribed {wav_path} successfully, and saved to {os.path.join(folder, "transcript.json")}')
-    generate_speaker_audio(folder, transcript)
+    logger.info(f'Transcribed {os.path.join(folder, "audio_vocals.wav")} successfully, and saved to {os.path.join(folder, "transcript.json")}')
+    generate_speaker_audio(folder, transcript, speech_map)
     return transcript
 
-def transcribe_all_audio_under_folder(folder, asr_method, whisper_model_name: str = 'large', device='auto', batch_size=32, diarization=False, min_speakers=None, max_speakers=None):
+def transcribe_all_audio_under_folder(folder, asr_method, whisper_model_name: str = 'large', device='auto', batch_size=32, diarization=False, min_speakers=None, max_speakers=None, speech_map=False):
+    """speech_map 为 True 时语音识别和说话人参考音频只使用 speech_map.json 中的语音区间"""
     transcribe_json = None
+    # FunASR 先收集所有待转写的文件夹，再用一次 generate 调用逐个转写
+    pending = []
     for root, dirs, files in os.walk(folder):
         if 'audio_vocals.wav' in files and 'transcript.json' not in files:
-            transcribe_json = transcribe_audio(asr_method, root, whisper_model_name, 'models/ASR/whisper', device, batch_size, diarization, min_speakers, max_speakers)
+            if asr_method == 'FunASR':
+                pending.append(root)
+                continue
+            transcribe_json = transcribe_audio(asr_method, root, whisper_model_name, 'models/ASR/whisper', device, batch_size, diarization, min_speakers, max_speakers, speech_map)
         elif 'transcript.json' in files:
             transcribe_json = json.load(open(os.path.join(root, 'transcript.json'), 'r', encoding='utf-8'))
 
             # logger.info(f'Transcript already exists in {root}')
+    if pending:
+        logger.info(f'Transcribing {len(pending)} files with FunASR')
+        transcripts = funasr_transcribe_batch([os.path.join(root, 'audio_vocals.wav') for root in pending], device,
+                                              diarization)
+        for root, transcript in zip(pending, transcripts):
+            transcribe_json = save_transcript(root, transcript, speech_map)
     return f'Transcribed all audio under {folder}', transcribe_json
 
 if __name__ == '__main__':
@@ -7,10 +7,14 @@ import os
 from loguru import logger
 import torch
 from dotenv import load_dotenv
+from .step005_audio_ingest import load_audio, ASR_FORMAT
+from .utils import env_int, env_int_list
 load_dotenv()
 
 whisper_model = None
 diarize_model = None
+# 同时转写的分片数，等于模型副本总数（每个 GPU 的副本数 x GPU 数）
+asr_shards = 1
 
 align_model = None
 language_code = None
@@ -23,24 +27,38 @@ def init_whisperx():
 def init_diarize():
     load_diarize_model()
     
-def load_whisper_model(model_name: str = 'large', download_root = 'models/ASR/whisper', device='auto'):
+def load_whisper_model(model_name: str = 'large', download_root = 'models/ASR/whisper', device='auto',
+                       device_index=None, num_replicas=None, cpu_threads=None):
+    """
+    device_index: CUDA 设备编号列表，每个设备各加载一份模型，默认读取 ASR_DEVICE_INDEX，否则只用 0 号设备
+    num_replicas: 每个设备上的模型副本数，默认读取 ASR_NUM_REPLICAS，否则为 1
+    cpu_threads: 每个副本的 CPU 线程数，默认读取 ASR_CPU_THREADS，否则为 4
+    多个副本时 VAD 分段会被分成同样数量的分片并行转写
+    """
     if model_name == 'large':
         pretrain_model = os.path.join(download_root,"faster-whisper-large-v3")
         model_name = 'large-v3' if not os.path.isdir(pretrain_model) else pretrain_model
         
-    global whisper_model
+    global whisper_model, asr_shards
     if whisper_model is not None:
         return
     if device == 'auto':
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    device_index = device_index or env_int_list('ASR_DEVICE_INDEX') or [0]
+    num_replicas = num_replicas or env_int('ASR_NUM_REPLICAS') or 1
+    cpu_threads = cpu_threads or env_int('ASR_CPU_THREADS') or 4
     logger.info(f'Loading WhisperX model: {model_name}')
     t_start = time.time()
     if device=='cpu':
-        whisper_model = whisperx.load_model(model_name, download_root=download_root, device=device, compute_type='int8')
+        whisper_model = whisperx.load_model(model_name, download_root=download_root, device=device, compute_type='int8',
+                                            threads=cpu_threads, num_workers=num_replicas)
+        asr_shards = num_replicas
     else:
-        whisper_model = whisperx.load_model(model_name, download_root=download_root, device=device)
+        whisper_model = whisperx.load_model(model_name, download_root=download_root, device=device,
+                                            device_index=device_index, threads=cpu_threads, num_workers=num_replicas)
+        asr_shards = num_replicas * len(device_index)
     t_end = time.time()
-    logger.info(f'Loaded WhisperX model: {model_name} in {t_end - t_start:.2f}s')
+    logger.info(f'Loaded WhisperX model: {model_name} in {t_end - t_start:.2f}s, {asr_shards} replica(s)')
 
 def load_align_model(language='en', device='auto', model_dir='models/ASR/whisper'):
     global align_model, language_code, align_metadata
@@ -72,11 +90,14 @@ def load_diarize_model(device='auto'):
         logger.info("You have not set the HF_TOKEN, so the pyannote/speaker-diarization-3.1 model could not be downloaded.")
         logger.info("If you need to use the speaker diarization feature, please request access to the pyannote/speaker-diarization-3.1 model. Alternatively, you can choose not to enable this feature.")
 
-def whisperx_transcribe_audio(wav_path, model_name: str = 'large', download_root='models/ASR/whisper', device='auto', batch_size=32, diarization=True,min_speakers=None, max_speakers=None):
+def whisperx_transcribe_audio(wav_path, model_name: str = 'large', download_root='models/ASR/whisper', device='auto', batch_size=32, diarization=True,min_speakers=None, max_speakers=None, speech_regions=None):
     if device == 'auto':
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
     load_whisper_model(model_name, download_root, device)
-    rec_result = whisper_model.transcribe(wav_path, batch_size=batch_size)
+    # 只解码一次 16kHz 单声道音频，转写、对齐、说话人分离共用同一份数据
+    audio = load_audio(os.path.dirname(wav_path), os.path.basename(wav_path), *ASR_FORMAT)
+    # 有共享的语音区间时跳过 WhisperX 自带的 VAD，只转写语音部分
+    rec_result = whisper_model.transcribe(audio, batch_size=batch_size, vad_segments=speech_regions, shards=asr_shards)
     
     if rec_result['language'] == 'nn':
         logger.warning(f'No language detected in {wav_path}')
@@ -84,12 +105,12 @@ def whisperx_transcribe_audio(wav_path, model_name: str = 'large', download_root
     
     load_align_model(rec_result['language'])
     rec_result = whisperx.align(rec_result['segments'], align_model, align_metadata,
-                                wav_path, device, return_char_alignments=False)
+                                audio, device, return_char_alignments=False)
     
     if diarization:
         load_diarize_model(device)
         if diarize_model:
-            diarize_segments = diarize_model(wav_path,min_speakers=min_speakers, max_speakers=max_speakers)
+            diarize_segments = diarize_model(audio, min_speakers=min_speakers, max_speakers=max_speakers)
             rec_result = whisperx.assign_word_speakers(diarize_segments, rec_result)
         else:
             logger.warning("Diarization model is not loaded, skipping speaker diarization")
@@ -5,9 +5,13 @@ import os
 from loguru import logger
 import torch
 from dotenv import load_dotenv
+from .step005_audio_ingest import get_audio_path, ASR_FORMAT
+from .utils import env_int
 load_dotenv()
 
 funasr_model = None
+# 同一文件内每个 ASR 批次包含的 VAD 分段总时长（秒），显存充足时调大可以提高长音频的 GPU 利用率
+DEFAULT_BATCH_SIZE_S = 300
 
 def init_funasr():
     load_funasr_model()
@@ -44,23 +48,43 @@ def load_funasr_model(device='auto'):
     logger.info(f'Loaded FunASR model in {t_end - t_start:.2f}s')
 
 
-def funasr_transcribe_audio(wav_path, device='auto', batch_size=1, diarization=True):
+def sentences_to_transcript(rec_result):
+    return [{'start': sentence['timestamp'][0][0]/1000, 'end': sentence['timestamp'][-1][-1]/1000, 'text': sentence['text'].strip(), 'speaker': f"SPEAKER_{sentence.get('spk', 0):02d}"} for sentence in rec_result['sentence_info']]
+
+
+def funasr_transcribe_batch(wav_paths, device='auto', diarization=True, batch_size_s=None):
+    """
+    一次 generate 调用转写多个音频，返回与 wav_paths 顺序一致的转写结果列表
+    注意 FunASR 带 VAD 时仍然逐个文件处理，batch_size_s 只在同一文件的 VAD 分段之间组批，并不会跨文件组批
+    """
+    if not wav_paths:
+        return []
     if device == 'auto':
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
     load_funasr_model(device)
-    rec_result = funasr_model.generate(
-        wav_path,
-        device=device, 
-        # batch_size=batch_size,
+    batch_size_s = batch_size_s or env_int('FUNASR_BATCH_SIZE_S') or DEFAULT_BATCH_SIZE_S
+    # 直接使用 16kHz 单声道的派生音频，FunASR 无需再重采样
+    inputs = [get_audio_path(os.path.dirname(wav_path), os.path.basename(wav_path), *ASR_FORMAT)
+              for wav_path in wav_paths]
+    t_start = time.time()
+    rec_results = funasr_model.generate(
+        inputs,
+        device=device,
         return_spk_res=True if diarization else False,
         sentence_timestamp=True,
         return_raw_text=True,
         is_final=True,
-        batch_size_s=300
-        )[0]
-    # print(rec_result)
-    transcript = [{'start': sentence['timestamp'][0][0]/1000, 'end': sentence['timestamp'][-1][-1]/1000, 'text': sentence['text'].strip(), 'speaker': f"SPEAKER_{sentence.get('spk', 0):02d}"} for sentence in rec_result['sentence_info']] 
-    return transcript
+        batch_size_s=batch_size_s
+        )
+    # 所有文件都叫 audio_vocals，结果的 key 会重复，按输入顺序对应
+    if len(rec_results) != len(inputs):
+        raise RuntimeError(f'FunASR returned {len(rec_results)} results for {len(inputs)} inputs')
+    logger.info(f'FunASR transcribed {len(inputs)} files in {time.time() - t_start:.2f}s')
+    return [sentences_to_transcript(rec_result) for rec_result in rec_results]
+
+
+def funasr_transcribe_audio(wav_path, device='auto', batch_size=1, diarization=True, batch_size_s=None):
+    return funasr_transcribe_batch([wav_path], device, diarization, batch_size_s)[0]
 
 if __name__ == '__main__':
     for root, dirs, files in os.walk("videos"):
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import itertools
 import json
 import os
 import re
@@ -7,15 +8,20 @@ from dotenv import load_dotenv
 import time
 from loguru import logger
 from tools.step031_translation_openai import openai_response
-from tools.step032_translation_llm import llm_response
+from tools.step032_translation_llm import llm_response, llm_batch_response
 from tools.step033_translation_translator import translator_response
 from tools.step034_translation_ernie import ernie_response
 from tools.step035_translation_qwen import qwen_response
 from tools.step036_translation_ollama import ollama_response
+from tools.translation_memory import get_translation_memory, content_key
+from tools.utils import env_int
 
 load_dotenv()
 import traceback
 
+# 逐句翻译的断点文件，翻译完成后删除
+TRANSLATION_CHECKPOINT = 'translation.partial.jsonl'
+
 def get_necessary_info(info: dict):
     return {
         'title': info['title'],
@@ -144,7 +150,38 @@ def split_sentences(translation, use_char_based_end=True):
 
     return output_data
 
+def translation_model(method):
+    """翻译方式实际使用的模型名，作为翻译记忆键的一部分，换模型后不复用旧译文"""
+    if method == 'LLM':
+        from tools.step032_translation_llm import model_name
+        return model_name
+    if method == 'OpenAI':
+        from tools.step031_translation_openai import model_name
+        return model_name
+    if method == '阿里云-通义千问':
+        from tools.step035_translation_qwen import model_name
+        return model_name
+    if method == 'Ollama':
+        return os.getenv('OLLAMA_MODEL', 'qwen2.5:14b')
+    return ''
+
 def summarize(info, transcript, target_language='简体中文', method = 'LLM'):
+    """总结结果按 (标题, 作者, 转写文本) 缓存在翻译记忆中"""
+    memory = get_translation_memory()
+    if memory is None:
+        return _summarize(info, transcript, target_language, method)
+    key = content_key(info['title'], info['uploader'], *(line['text'] for line in transcript))
+    model = translation_model(method)
+    summary = memory.lookup_summary(key, target_language, method, model)
+    if summary is not None:
+        logger.info(f'翻译记忆命中总结: {summary["title"]}')
+        return summary
+    summary = _summarize(info, transcript, target_language, method)
+    if summary is not None:
+        memory.store_summary(key, summary, target_language, method, model)
+    return summary
+
+def _summarize(info, transcript, target_language='简体中文', method = 'LLM'):
     transcript = ' '.join(line['text'] for line in transcript)
     transcript = ensure_transcript_length(transcript, max_length=2000)
     info_message = f'Title: "{info["title"]}" Author: "{info["uploader"]}". ' 
@@ -241,9 +278,15 @@ def summarize(info, transcript, target_language='简体中文', method = 'LLM'):
             time.sleep(1)
 
 def _translate(summary, transcript, target_language='简体中文', method='LLM'):
+    return list(_iter_translate(summary, transcript, target_language, method))
+
 
+def _iter_translate(summary, transcript, target_language='简体中文', method='LLM', done=()):
+    """
+    逐句翻译，每翻译完一句就产出译文
+    done 为已经翻译好的前若干句译文（断点续译），只用于恢复上下文，不会重新产出
+    """
     info = f'This is a video called "{summary["title"]}". {summary["summary"]}.'
-    full_translation = []
     if target_language == '简体中文':
         fixed_message = [
             {'role': 'system', 'content': f'You are an expert in the field of this video.\n{info}\nTranslate the sentence into {target_language}. 下面我让你来充当翻译家，你的目标是把任何语言翻译成{target_language}，请翻译时不要带翻译腔，而是要翻译得自然、流畅和地道，使用优美和高雅的表达方式。请将人工智能的“agent”翻译为“智能体”，强化学习中是`Q-Learning`而不是`Queue Learning`。数学公式写成plain text，不要使用latex。确保翻译正确和简洁。注意信达雅。'},
@@ -263,15 +306,39 @@ def _translate(summary, transcript, target_language='简体中文', method='LLM'
         ]
 
     history = []
-    
-    for line in transcript:
+    for line, translation in zip(transcript, done):
+        history.append({'role': 'user', 'content': f'Translate:"{line["text"]}"'})
+        history.append({'role': 'assistant', 'content': f'翻译：“{translation}”'})
+
+    memory = get_translation_memory()
+    model = translation_model(method)
+    # 本地 LLM 批量翻译：接下来的若干句不带逐句历史、只用固定的系统提示和示例一起生成，
+    # 没有通过 valid_translation 的句子再按原来的方式逐句重试
+    batch_size = (env_int('LLM_BATCH_SIZE') or 1) if method == 'LLM' else 1
+    prefetched = {}
+    remaining = transcript[len(done):]
+    for i, line in enumerate(remaining):
         text = line['text']
+        if batch_size > 1 and i not in prefetched:
+            prefetched.update(_batch_translate(remaining, i, batch_size, fixed_message, memory, target_language,
+                                               method, model, skip=prefetched))
 
         retry_message = 'Only translate the quoted sentence and give me the final translation.'
-        if method == 'Google Translate':
+        cached = memory.lookup(text, target_language, method, model) if memory is not None else None
+        batched = prefetched.pop(i, None)
+        success = False
+        if cached is not None:
+            translation = cached
+            logger.info(f'翻译记忆命中：{text} -> {translation}')
+        elif batched:
+            translation = batched
+            success = True
+        elif method == 'Google Translate':
             translation = translator_response(text, to_language = target_language, translator_server='google')
+            success = bool(translation) and valid_translation(text, translation)[0]
         elif method == 'Bing Translate':
             translation = translator_response(text, to_language = target_language, translator_server='bing')
+            success = bool(translation) and valid_translation(text, translation)[0]
         else:
             for retry in range(10):
                 messages = fixed_message + \
@@ -305,18 +372,88 @@ def _translate(summary, transcript, target_language='简体中文', method='LLM'
                     logger.error(e)
                     logger.warning('翻译失败')
                     time.sleep(1)
-        full_translation.append(translation)
+        # 只缓存通过 valid_translation 的非空译文，网络错误等返回的空译文不会写入
+        if success and translation and memory is not None:
+            memory.store(text, translation, target_language, method, model)
+        yield translation
         history.append({'role': 'user', 'content': f'Translate:"{text}"'})
         history.append({'role': 'assistant', 'content': f'翻译：“{translation}”'})
-        time.sleep(0.1)
-        
-    return full_translation
+        if cached is None:
+            time.sleep(0.1)
 
-def translate(method, folder, target_language='简体中文'):
-    if os.path.exists(os.path.join(folder, 'translation.json')):
+
+def _batch_translate(lines, start, batch_size, fixed_message, memory, target_language, method, model, skip=()):
+    """
+    从 start 开始为最多 batch_size 句翻译记忆中没有、也不在 skip 中的句子批量生成译文
+    返回 {下标: 译文}，没有通过 valid_translation 的句子对应 None
+    """
+    indices = []
+    for i in range(start, len(lines)):
+        if len(indices) >= batch_size:
+            break
+        if i in skip:
+            continue
+        if memory is None or not memory.contains(lines[i]['text'], target_language, method, model):
+            indices.append(i)
+    if not indices:
+        return {start: None}
+    messages_list = [fixed_message + [{'role': 'user', 'content': f'Translate:"{lines[i]["text"]}"'}]
+                     for i in indices]
+    t_start = time.time()
+    try:
+        responses = llm_batch_response(messages_list)
+    except Exception as e:
+        logger.error(e)
+        logger.warning('批量翻译失败，逐句翻译')
+        return {i: None for i in indices}
+    logger.info(f'批量翻译 {len(indices)} 句，用时 {time.time() - t_start:.2f} 秒')
+    results = {}
+    for i, response in zip(indices, responses):
+        text = lines[i]['text']
+        success, translation = valid_translation(text, response.replace('\n', ''))
+        logger.info(f'原文：{text}')
+        logger.info(f'译文：{translation if success else response}')
+        results[i] = translation if success else None
+    # start 对应的句子命中翻译记忆时不会被批量生成，标记为已处理，避免重复调用
+    results.setdefault(start, None)
+    return results
+
+
+def load_translation_checkpoint(folder, transcript):
+    """
+    读取已翻译的逐句译文（每行一个 {"text": 原文, "translation": 译文}），最后一行不完整时忽略
+    只保留与 transcript 开头逐句对应的部分：transcript.json 重新生成后，从第一句原文不一致的地方开始重新翻译
+    """
+    checkpoint_path = os.path.join(folder, TRANSLATION_CHECKPOINT)
+    translations = []
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            for row in f:
+                try:
+                    row = json.loads(row)
+                except json.JSONDecodeError:
+                    break
+                i = len(translations)
+                if not isinstance(row, dict) or i >= len(transcript) or row.get('text') != transcript[i]['text']:
+                    logger.warning(f'翻译断点与 transcript.json 不一致，从第 {i + 1} 句开始重新翻译')
+                    break
+                translations.append(row['translation'])
+    return translations
+
+def translate_stream(method, folder, target_language='简体中文'):
+    """
+    逐句产出已经过 valid_translation 和 split_sentences 处理的字幕行（与 translation.json 中的条目相同），
+    下游的语音合成可以边翻译边合成
+    每翻译完一句追加写入 translation.partial.jsonl，中断后重新调用会先产出已翻译的部分，再从断点继续
+    全部完成后写入 translation.json 并删除断点文件
+    """
+    translation_path = os.path.join(folder, 'translation.json')
+    if os.path.exists(translation_path):
         logger.info(f'Translation already exists in {folder}')
-        return True
-    
+        with open(translation_path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+        return
+
     info_path = os.path.join(folder, 'download.info.json')
     # 不一定要download.info.json
     if os.path.exists(info_path):
@@ -342,17 +479,51 @@ def translate(method, folder, target_language='简体中文'):
         summary = summarize(info, transcript, target_language, method)
         if summary is None:
             logger.error(f'Failed to summarize {folder}')
-            return False
+            return
         with open(summary_path, 'w', encoding='utf-8') as f:
             json.dump(summary, f, indent=2, ensure_ascii=False)
 
-    translation_path = os.path.join(folder, 'translation.json')
-    translation = _translate(summary, transcript, target_language, method)
-    for i, line in enumerate(transcript):
-        line['translation'] = translation[i]
-    transcript = split_sentences(transcript)
+    memory = get_translation_memory()
+    memory_before = memory.stats() if memory is not None else None
+    done = load_translation_checkpoint(folder, transcript)
+    if done:
+        logger.info(f'从断点继续翻译: 已完成 {len(done)}/{len(transcript)} 句')
+    output = []
+    checkpoint_path = os.path.join(folder, TRANSLATION_CHECKPOINT)
+    with open(checkpoint_path, 'w', encoding='utf-8') as checkpoint:
+        for line, translation in zip(transcript, done):
+            checkpoint.write(json.dumps({'text': line['text'], 'translation': translation}, ensure_ascii=False) + '\n')
+        checkpoint.flush()
+        translations = itertools.chain(done, _iter_translate(summary, transcript, target_language, method, done))
+        for i, (line, translation) in enumerate(zip(transcript, translations)):
+            if i >= len(done):
+                checkpoint.write(json.dumps({'text': line['text'], 'translation': translation}, ensure_ascii=False)
+                                 + '\n')
+                checkpoint.flush()
+            line['translation'] = translation
+            for sentence in split_sentences([line]):
+                output.append(sentence)
+                yield sentence
     with open(translation_path, 'w', encoding='utf-8') as f:
-        json.dump(transcript, f, indent=2, ensure_ascii=False)
+        json.dump(output, f, indent=2, ensure_ascii=False)
+    os.remove(checkpoint_path)
+    memory = get_translation_memory()
+    if memory is not None:
+        stats = memory.stats()
+        lookups, hits = stats['lookups'] - memory_before['lookups'], stats['hits'] - memory_before['hits']
+        logger.info(f'翻译记忆命中 {hits}/{lookups} 句' + (f' ({hits / lookups:.1%})' if lookups else '')
+                    + f'，累计命中率 {stats["hit_rate"]:.1%}')
+
+
+def translate(method, folder, target_language='简体中文'):
+    if os.path.exists(os.path.join(folder, 'translation.json')):
+        logger.info(f'Translation already exists in {folder}')
+        return True
+    transcript = list(translate_stream(method, folder, target_language))
+    summary_path = os.path.join(folder, 'summary.json')
+    if not os.path.exists(summary_path):
+        return False
+    summary = json.load(open(summary_path, 'r', encoding='utf-8'))
     return summary, transcript
 
 def translate_all_transcript_under_folder(folder, method, target_language):
@@ -55,6 +55,109 @@ def llm_response(messages, device='auto'):
         return response
     return ''
 
+# 开引号 -> 闭引号，批量翻译时生成到与第一个开引号配对的闭引号就停止
+QUOTES = {'“': '”', '"': '"', '「': '」'}
+# 保留最近几个视频的公共前缀 KV cache
+MAX_PREFIX_CACHE = 4
+_prefix_cache = {}
+
+
+def closed_quote(text):
+    """text 中第一个开引号是否已经闭合（弯引号支持嵌套）"""
+    start = min((i for i in (text.find(q) for q in QUOTES) if i >= 0), default=-1)
+    if start < 0:
+        return False
+    open_quote = text[start]
+    close_quote = QUOTES[open_quote]
+    if open_quote == close_quote:
+        return text.find(close_quote, start + 1) >= 0
+    depth = 0
+    for char in text[start:]:
+        if char == open_quote:
+            depth += 1
+        elif char == close_quote:
+            depth -= 1
+            if depth == 0:
+                return True
+    return False
+
+
+def _quote_stopping_criteria(prompt_length):
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class QuoteStoppingCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            texts = tokenizer.batch_decode(input_ids[:, prompt_length:], skip_special_tokens=True)
+            return torch.tensor([closed_quote(text) for text in texts], dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([QuoteStoppingCriteria()])
+
+
+def _prefix_past(prefix_text, device):
+    """公共前缀（系统提示和示例对话）的 token 和 KV cache，同一前缀只计算一次"""
+    if prefix_text not in _prefix_cache:
+        from transformers.cache_utils import Cache
+        prefix_ids = tokenizer([prefix_text], return_tensors="pt").input_ids.to(device)
+        with torch.no_grad():
+            past = model(prefix_ids, use_cache=True).past_key_values
+        if isinstance(past, Cache):
+            past = past.to_legacy_cache()
+        if len(_prefix_cache) >= MAX_PREFIX_CACHE:
+            _prefix_cache.pop(next(iter(_prefix_cache)))
+        _prefix_cache[prefix_text] = (prefix_ids, past)
+    return _prefix_cache[prefix_text]
+
+
+def llm_batch_response(messages_list, device='auto', max_new_tokens=512):
+    """
+    一次生成多个相互独立的对话，输入左填充后一起送入 model.generate
+    所有对话除最后一条消息外都相同时（系统提示和示例），公共前缀的 KV cache 只计算一次，并在之后的调用中复用
+    每个对话生成到闭引号时单独停止
+    """
+    if model is None:
+        init_llm_model(model_name)
+    if 'Qwen' not in model_name or not messages_list:
+        return [''] * len(messages_list)
+    if device == 'auto':
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    from transformers import DynamicCache
+    tokenizer.padding_side = 'left'
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    texts = [tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+             for messages in messages_list]
+    shared = messages_list[0][:-1]
+    prefix_text = tokenizer.apply_chat_template(shared, tokenize=False) if shared else ''
+    batch = len(texts)
+    if prefix_text and all(messages[:-1] == shared for messages in messages_list) \
+            and all(text.startswith(prefix_text) for text in texts):
+        prefix_ids, past = _prefix_past(prefix_text, device)
+        # 填充在前缀和各自的后缀之间，位置编码按 attention_mask 计算，不受影响
+        suffix = tokenizer([text[len(prefix_text):] for text in texts], return_tensors="pt", padding=True,
+                           add_special_tokens=False).to(device)
+        input_ids = torch.cat([prefix_ids.expand(batch, -1), suffix.input_ids], dim=1)
+        attention_mask = torch.cat([torch.ones((batch, prefix_ids.shape[1]), dtype=suffix.attention_mask.dtype,
+                                               device=device), suffix.attention_mask], dim=1)
+        past_key_values = DynamicCache.from_legacy_cache(tuple(
+            (key.expand(batch, -1, -1, -1), value.expand(batch, -1, -1, -1)) for key, value in past))
+    else:
+        model_inputs = tokenizer(texts, return_tensors="pt", padding=True).to(device)
+        input_ids, attention_mask, past_key_values = model_inputs.input_ids, model_inputs.attention_mask, None
+
+    prompt_length = input_ids.shape[1]
+    with torch.no_grad():
+        generated_ids = model.generate(
+            input_ids,
+            attention_mask=attention_mask,
+            past_key_values=past_key_values,
+            max_new_tokens=max_new_tokens,
+            stopping_criteria=_quote_stopping_criteria(prompt_length),
+            pad_token_id=tokenizer.pad_token_id
+        )
+    return tokenizer.batch_decode(generated_ids[:, prompt_length:], skip_special_tokens=True)
+
+
 if __name__ == '__main__':
     test_message = [{"role": "user", "content": "你好，介绍一下你自己"}]
     response = llm_response(test_message)
@@ -1,14 +1,18 @@
 import json
 import os
+import queue
 import re
+import threading
 import librosa
 
 from loguru import logger
 import numpy as np
 
 from .utils import save_wav, save_wav_norm
+from .step005_audio_ingest import load_audio, TTS_FORMAT
+from .step030_translation import translate_stream
 # from .step041_tts_bytedance import tts as bytedance_tts
-from .step042_tts_xtts import tts as xtts_tts
+from .step042_tts_xtts import tts as xtts_tts, prepare_texts as xtts_prepare_texts
 from .step043_tts_cosyvoice import tts as cosyvoice_tts
 from .step044_tts_edge_tts import tts as edge_tts
 from .cn_tx import TextNorm
@@ -53,6 +57,26 @@ tts_support_languages = {
     'cosyvoice': ['中文', '粤语', 'English', 'Japanese', 'Korean', 'French'], 
 }
 
+def synthesize_line(method, folder, i, line, target_language='中文', voice='zh-CN-XiaoxiaoNeural'):
+    """合成第 i 句字幕到 wavs/{i:04d}.wav，已存在时直接跳过"""
+    speaker = line['speaker']
+    text = preprocess_text(line['translation'])
+    output_path = os.path.join(folder, 'wavs', f'{str(i).zfill(4)}.wav')
+    speaker_wav = os.path.join(folder, 'SPEAKER', f'{speaker}.wav')
+    # if num_speakers == 1:
+        # bytedance_tts(text, output_path, speaker_wav, voice_type='BV701_streaming')
+
+    if method == 'bytedance':
+        bytedance_tts(text, output_path, speaker_wav, target_language = target_language)
+    elif method == 'xtts':
+        xtts_tts(text, output_path, speaker_wav, target_language = target_language)
+    elif method == 'cosyvoice':
+        cosyvoice_tts(text, output_path, speaker_wav, target_language = target_language)
+    elif method == 'EdgeTTS':
+        edge_tts(text, output_path, target_language = target_language, voice = voice)
+    return output_path
+
+
 def generate_wavs(method, folder, target_language='中文', voice = 'zh-CN-XiaoxiaoNeural'):
     assert method in ['xtts', 'bytedance', 'cosyvoice', 'EdgeTTS']
     transcript_path = os.path.join(folder, 'translation.json')
@@ -71,24 +95,14 @@ def generate_wavs(method, folder, target_language='中文', voice = 'zh-CN-Xiaox
     if target_language not in tts_support_languages[method]:
         logger.error(f'{method} does not support {target_language}')
         return f'{method} does not support {target_language}'
+
+    if method == 'xtts':
+        # 整个视频的文本一次分句
+        xtts_prepare_texts([preprocess_text(line['translation']) for line in transcript], target_language)
         
     full_wav = np.zeros((0, ))
     for i, line in enumerate(transcript):
-        speaker = line['speaker']
-        text = preprocess_text(line['translation'])
-        output_path = os.path.join(output_folder, f'{str(i).zfill(4)}.wav')
-        speaker_wav = os.path.join(folder, 'SPEAKER', f'{speaker}.wav')
-        # if num_speakers == 1:
-            # bytedance_tts(text, output_path, speaker_wav, voice_type='BV701_streaming')
-        
-        if method == 'bytedance':
-            bytedance_tts(text, output_path, speaker_wav, target_language = target_language)
-        elif method == 'xtts':
-            xtts_tts(text, output_path, speaker_wav, target_language = target_language)
-        elif method == 'cosyvoice':
-            cosyvoice_tts(text, output_path, speaker_wav, target_language = target_language)
-        elif method == 'EdgeTTS':
-            edge_tts(text, output_path, target_language = target_language, voice = voice)
+        output_path = synthesize_line(method, folder, i, line, target_language, voice)
         start = line['start']
         end = line['end']
         length = end-start
@@ -106,13 +120,13 @@ def generate_wavs(method, folder, target_language='中文', voice = 'zh-CN-Xiaox
         full_wav = np.concatenate((full_wav, wav))
         line['end'] = start + length
         
-    vocal_wav, sr = librosa.load(os.path.join(folder, 'audio_vocals.wav'), sr=24000)
+    vocal_wav = load_audio(folder, 'audio_vocals.wav', *TTS_FORMAT)
     full_wav = full_wav / np.max(np.abs(full_wav)) * np.max(np.abs(vocal_wav))
     save_wav(full_wav, os.path.join(folder, 'audio_tts.wav'))
     with open(transcript_path, 'w', encoding='utf-8') as f:
         json.dump(transcript, f, indent=2, ensure_ascii=False)
     
-    instruments_wav, sr = librosa.load(os.path.join(folder, 'audio_instruments.wav'), sr=24000)
+    instruments_wav = load_audio(folder, 'audio_instruments.wav', *TTS_FORMAT)
     len_full_wav = len(full_wav)
     len_instruments_wav = len(instruments_wav)
     
@@ -140,6 +154,64 @@ def generate_all_wavs_under_folder(root_folder, method, target_language='中文'
             logger.info(f'Wavs already generated in {root}')
     return f'Generated all wavs under {root_folder}', wav_combined, wav_ori
 
+def translate_and_synthesize(translation_method, tts_method, folder, translation_target_language='简体中文',
+                             tts_target_language='中文', voice='zh-CN-XiaoxiaoNeural'):
+    """
+    翻译与语音合成流水线: 翻译线程逐句产出字幕行放入队列，当前线程取出后立即合成 wavs/*.wav，
+    两个阶段的总耗时接近较慢的一个而不是两者之和
+    翻译的断点是 translation.partial.jsonl，合成的断点是已生成的 wavs/*.wav，中断后重新调用从断点继续
+    之后的 generate_wavs 直接复用已合成的句子，只做时间轴对齐和混音
+    """
+    if tts_target_language not in tts_support_languages[tts_method]:
+        # 不支持的语言只翻译，由 generate_wavs 报告错误
+        return list(translate_stream(translation_method, folder, translation_target_language))
+    os.makedirs(os.path.join(folder, 'wavs'), exist_ok=True)
+    lines = queue.Queue()
+    stop = threading.Event()
+    end = object()
+
+    def produce():
+        try:
+            for line in translate_stream(translation_method, folder, translation_target_language):
+                if stop.is_set():
+                    return
+                lines.put(line)
+            lines.put(end)
+        except Exception as e:
+            lines.put(e)
+
+    producer = threading.Thread(target=produce, name='translation', daemon=True)
+    producer.start()
+    translation = []
+    try:
+        while True:
+            line = lines.get()
+            if line is end:
+                break
+            if isinstance(line, Exception):
+                raise line
+            synthesize_line(tts_method, folder, len(translation), line, tts_target_language, voice)
+            translation.append(line)
+    finally:
+        stop.set()
+    producer.join()
+    logger.info(f'Translated and synthesized {len(translation)} lines in {folder}')
+    return translation
+
+
+def translate_and_synthesize_all_under_folder(root_folder, translation_method, translation_target_language,
+                                              tts_method, tts_target_language='中文', voice='zh-CN-XiaoxiaoNeural'):
+    summary_json, translate_json = None, None
+    for root, dirs, files in os.walk(root_folder):
+        if 'transcript.json' in files and 'audio_combined.wav' not in files:
+            translate_json = translate_and_synthesize(translation_method, tts_method, root,
+                                                      translation_target_language, tts_target_language, voice)
+            summary_path = os.path.join(root, 'summary.json')
+            if os.path.exists(summary_path):
+                summary_json = json.load(open(summary_path, 'r', encoding='utf-8'))
+    return f'Translated and synthesized all videos under {root_folder}', summary_json, translate_json
+
+
 if __name__ == '__main__':
     folder = r'videos/村长台钓加拿大/20240805 英文无字幕 阿里这小子在水城威尼斯发来问候'
     generate_wavs('xtts', folder)
@@ -7,6 +7,7 @@ pip install requests
 import base64
 import json
 import os
+import threading
 import time
 import uuid
 import librosa
@@ -14,8 +15,7 @@ import numpy as np
 import requests
 from loguru import logger
 from dotenv import load_dotenv
-from pyannote.audio import Model, Inference
-from scipy.spatial.distance import cosine
+from .voice_library import VoiceIndex, embed_wav
 
 load_dotenv()
 # 填写平台申请的appid, access_token以及cluster
@@ -54,14 +54,28 @@ request_json = {
     }
 }
 
-embedding_model = Model.from_pretrained(
-    "pyannote/embedding", use_auth_token=os.getenv('HF_TOKEN'))
-embedding_inference = Inference(
-    embedding_model, window="whole")
+# 火山引擎各音色的嵌入矩阵，第一次匹配时从 voice_type/*.npy 读取一次
+voice_type_index = None
+_voice_type_lock = threading.Lock()
+
 
 def generate_embedding(wav_path):
-    embedding = embedding_inference(wav_path)
-    return embedding
+    # 嵌入模型在第一次调用时才加载，并按音频内容缓存
+    return embed_wav(wav_path)
+
+
+def load_voice_type_index():
+    global voice_type_index
+    with _voice_type_lock:
+        if voice_type_index is None:
+            if not os.path.exists('voice_type'):
+                get_available_speakers()
+            files = sorted(file for file in os.listdir('voice_type') if file.endswith('.npy'))
+            voice_types = [file.replace('.npy', '') for file in files]
+            embeddings = [np.load(os.path.join('voice_type', file)) for file in files]
+            voice_type_index = VoiceIndex(voice_types, np.stack(embeddings) if embeddings else None)
+        return voice_type_index
+
 
 def generate_speaker_to_voice_type(folder):
     speaker_to_voice_type_path = os.path.join(folder, 'speaker_to_voice_type.json')
@@ -69,33 +83,29 @@ def generate_speaker_to_voice_type(folder):
         with open(speaker_to_voice_type_path, 'r', encoding='utf-8') as f:
             speaker_to_voice_type = json.load(f)
         return speaker_to_voice_type
-    
-    speaker_to_voice_type = {}
+
     speaker_folder = os.path.join(folder, 'SPEAKER')
-    voice_types = {}
-    if not os.path.exists('voice_type'):
-        get_available_speakers()
-    for file in os.listdir('voice_type'):
-        voice_type = file.replace('.wav', '')
-        voice_types[voice_type] = np.load(f'voice_type/{file.replace(".wav", ".npy")}')
-        
-    for file in os.listdir(speaker_folder):
+    index = load_voice_type_index()
+    speakers, embeddings = [], []
+    for file in sorted(os.listdir(speaker_folder)):
         if not file.endswith('.wav'):
             continue
-        speaker = file.replace('.wav', '')
         wav_path = os.path.join(speaker_folder, file)
         embedding = generate_embedding(wav_path)
-        # find the 
         np.save(wav_path.replace('.wav', '.npy'), embedding)
-        speaker_to_voice_type[speaker] = sorted(voice_types.keys(), key=lambda x: 1 - cosine(voice_types[x], embedding))[0]
-    for k, v in speaker_to_voice_type.items():
-        new_v = v.replace('.npy', '')
-        speaker_to_voice_type[k] = new_v
-        logger.info(f'{k}: {new_v}')
+        speakers.append(file.replace('.wav', ''))
+        embeddings.append(embedding)
+
+    # 所有说话人与所有音色的余弦相似度一次算出，每个说话人取最相似的音色
+    speaker_to_voice_type = {}
+    if speakers:
+        for speaker, (voice_type, score) in zip(speakers, index.best(np.stack(embeddings))):
+            speaker_to_voice_type[speaker] = voice_type
+            logger.info(f'{speaker}: {voice_type} ({score:.3f})')
     with open(speaker_to_voice_type_path, 'w', encoding='utf-8') as f:
         json.dump(speaker_to_voice_type, f, indent=2, ensure_ascii=False)
     return speaker_to_voice_type
-    
+
 
 def tts(text, output_path, speaker_wav, voice_type=None):
     if os.path.exists(output_path):
@@ -141,7 +151,7 @@ def get_available_speakers():
         while retry > 0:
             try:
                 tts('YouDub 是一个创新的开源工具，专注于将 YouTube 等平台的优质视频翻译和配音为中文版本。此工具融合了先进的 AI 技术，包括语音识别、大型语言模型翻译以及 AI 声音克隆技术，为中文用户提供具有原始 YouTuber 音色的中文配音视频。', output_path, None, voice_type=voice_type)
-                embedding = embedding_inference(output_path)
+                embedding = generate_embedding(output_path)
                 np.save(output_path.replace('.wav', '.npy'), embedding)
                 break
             except Exception as e:
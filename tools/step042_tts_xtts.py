@@ -1,11 +1,25 @@
+import contextlib
 import os
 from TTS.api import TTS
+from TTS.tts.layers.xtts.tokenizer import split_sentence, split_sentences
 from loguru import logger
 import numpy as np
 import torch
 import time
-from .utils import save_wav
+from .utils import save_wav, env_flag, env_int
+from .voice_library import get_voice_library
 model = None
+# CPU 上是否使用 bf16 自动混合精度推理
+use_bf16 = False
+# 每个说话人参考音频的条件向量缓存，避免每句都重新提取
+# 只保留最近使用的几个说话人，批量处理时不会为所有视频的说话人一直占着显存
+MAX_CONDITIONING_CACHE = 8
+conditioning_latents = {}
+# model.tts 在句子之间插入的静音采样数
+SENTENCE_SILENCE = 10000
+# prepare_texts 登记的一个视频的所有待合成文本（按语言），第一次合成时用一次 nlp.pipe 一起分句
+_pending_texts = {}
+_text_splits = {}
 
 '''
 Supported languages: Arabic: ar, Brazilian Portuguese: pt , Mandarin Chinese: zh-cn, Czech: cs, Dutch: nl, English: en, French: fr, German: de, Italian: it, Polish: pl, Russian: ru, Spanish: es, Turkish: tr, Japanese: ja, Korean: ko, Hungarian: hu, Hindi: hi
@@ -13,13 +27,74 @@ Supported languages: Arabic: ar, Brazilian Portuguese: pt , Mandarin Chinese: zh
 def init_TTS():
     load_model()
     
-def load_model(model_path="models/TTS/XTTS-v2", device='auto'):
-    global model
+def configure_cpu_threads(num_threads=None, num_interop_threads=None):
+    """
+    设置每个 worker 的 intra-op / inter-op 线程数，多个 worker 共用一台机器时避免线程超额订阅
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError as e:
+            # inter-op 线程数只能在第一次并行计算之前设置
+            logger.warning(f'设置 inter-op 线程数失败: {e}')
+    logger.info(f'CPU 线程: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()}')
+
+
+def bf16_supported():
+    try:
+        return torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def _conv1d_to_linear(module):
+    """transformers 的 GPT2 使用 Conv1D（权重转置的线性层），替换为 nn.Linear 后才能被动态量化"""
+    for name, child in module.named_children():
+        if type(child).__name__ == 'Conv1D':
+            linear = torch.nn.Linear(child.weight.shape[0], child.weight.shape[1])
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
+
+def quantize_gpt(xtts):
+    """
+    对 XTTS 的 GPT2 推理模型做 int8 动态量化（仅 CPU），原地修改
+    """
+    gpt_inference = xtts.gpt.gpt_inference
+    _conv1d_to_linear(gpt_inference)
+    torch.quantization.quantize_dynamic(gpt_inference, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return xtts
+
+
+def inference_context():
+    if use_bf16:
+        return torch.autocast('cpu', dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def load_model(model_path="models/TTS/XTTS-v2", device='auto', quantize=None, bf16=None,
+               num_threads=None, num_interop_threads=None):
+    """
+    CPU 部署参数默认从环境变量读取:
+        XTTS_CPU_QUANTIZE: GPT 线性层 int8 动态量化
+        XTTS_CPU_BF16: bf16 自动混合精度（CPU 支持时生效，与量化同时开启时以量化为准）
+        XTTS_NUM_THREADS / XTTS_NUM_INTEROP_THREADS: 每个 worker 的 intra-op / inter-op 线程数
+    """
+    global model, use_bf16
     if model is not None:
         return
 
     if device=='auto':
         device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    on_cpu = torch.device(device).type == 'cpu'
+    if on_cpu:
+        configure_cpu_threads(num_threads or env_int('XTTS_NUM_THREADS'),
+                              num_interop_threads or env_int('XTTS_NUM_INTEROP_THREADS'))
           
     logger.info(f'Loading TTS model from {model_path}')
     t_start = time.time()
@@ -31,6 +106,17 @@ def load_model(model_path="models/TTS/XTTS-v2", device='auto'):
         ).to(device)
     else:
         model = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(device)
+
+    if on_cpu:
+        quantize = env_flag('XTTS_CPU_QUANTIZE') if quantize is None else quantize
+        bf16 = env_flag('XTTS_CPU_BF16') if bf16 is None else bf16
+        if quantize:
+            quantize_gpt(model.synthesizer.tts_model)
+            logger.info('XTTS GPT 已进行 int8 动态量化')
+        elif bf16:
+            use_bf16 = bf16_supported()
+            if not use_bf16:
+                logger.warning('当前 CPU 不支持 bf16，使用 fp32 推理')
     t_end = time.time()
     logger.info(f'TTS model loaded in {t_end - t_start:.2f}s')
 
@@ -68,8 +154,9 @@ def tts(text, output_path, speaker_wav, model_name="models/TTS/XTTS-v2", device=
     
     for retry in range(3):
         try:
-            wav = model.tts(text, speaker_wav=speaker_wav, language=language)
-            wav = np.array(wav)
+            gpt_cond_latent, speaker_embedding = get_conditioning_latents(speaker_wav)
+            with inference_context():
+                wav = synthesize(text, language, gpt_cond_latent, speaker_embedding)
             save_wav(wav, output_path)
             logger.info(f'TTS {text}')
             break
@@ -78,6 +165,120 @@ def tts(text, output_path, speaker_wav, model_name="models/TTS/XTTS-v2", device=
             logger.warning(e)
 
 
+def generation_settings(xtts):
+    return {
+        'temperature': xtts.config.temperature,
+        'length_penalty': xtts.config.length_penalty,
+        'repetition_penalty': xtts.config.repetition_penalty,
+        'top_k': xtts.config.top_k,
+        'top_p': xtts.config.top_p,
+    }
+
+
+def prepare_texts(texts, target_language='中文'):
+    """
+    登记一个视频所有待合成的文本，第一次合成时一起分句，不必逐句运行 spaCy
+    """
+    language = language_map[target_language]
+    _text_splits.clear()
+    _pending_texts.clear()
+    _pending_texts[language] = list(dict.fromkeys(texts))
+
+
+def split_text(text, language):
+    """
+    与 XTTS 的 enable_text_splitting 相同：按句子切分并合并到该语言的字符上限以内
+    """
+    splits = _text_splits.get((text, language))
+    if splits is not None:
+        return splits
+    char_limit = model.synthesizer.tts_model.tokenizer.char_limits.get(language, 250)
+    texts = _pending_texts.pop(language, [])
+    if text not in texts:
+        # 没有登记过的文本（例如边翻译边合成）逐句切分，不缓存
+        _pending_texts[language] = texts
+        return split_sentence(text, language, char_limit)
+    for pending, pending_splits in zip(texts, split_sentences(texts, language, char_limit)):
+        _text_splits[(pending, language)] = pending_splits
+    return _text_splits[(text, language)]
+
+
+def synthesize(text, language, gpt_cond_latent, speaker_embedding):
+    """
+    与 model.tts 相同在句子之间插入静音，但按 XTTS 的字符上限分句（split_text），并使用预先提取的条件向量
+    """
+    xtts = model.synthesizer.tts_model
+    wavs = []
+    for sentence in split_text(text, language):
+        if not sentence.strip():
+            continue
+        out = xtts.inference(sentence, language, gpt_cond_latent, speaker_embedding, **generation_settings(xtts))
+        wavs.append(out['wav'])
+        wavs.append(np.zeros(SENTENCE_SILENCE, dtype=np.float32))
+    return np.concatenate(wavs) if wavs else np.zeros(0, dtype=np.float32)
+
+
+def compute_conditioning_latents(speaker_wav):
+    xtts = model.synthesizer.tts_model
+    return xtts.get_conditioning_latents(
+        audio_path=speaker_wav,
+        gpt_cond_len=xtts.config.gpt_cond_len,
+        gpt_cond_chunk_len=xtts.config.gpt_cond_chunk_len,
+        max_ref_length=xtts.config.max_ref_len,
+        sound_norm_refs=xtts.config.sound_norm_refs,
+    )
+
+
+def get_conditioning_latents(speaker_wav):
+    """
+    开启声音库（VOICE_LIBRARY=1）时先按说话人嵌入检索，已知声音直接复用保存的条件向量
+    """
+    if speaker_wav in conditioning_latents:
+        # 移到末尾，最久未使用的说话人最先被淘汰
+        conditioning_latents[speaker_wav] = conditioning_latents.pop(speaker_wav)
+        return conditioning_latents[speaker_wav]
+    library = get_voice_library()
+    latents = None
+    if library is not None:
+        voice_id, known = library.identify_wav(speaker_wav)
+        if known:
+            latents = library.load_latents(voice_id, 'xtts')
+    if latents is None:
+        latents = compute_conditioning_latents(speaker_wav)
+        if library is not None:
+            library.save_latents(voice_id, 'xtts', latents)
+    if len(conditioning_latents) >= MAX_CONDITIONING_CACHE:
+        conditioning_latents.pop(next(iter(conditioning_latents)))
+    conditioning_latents[speaker_wav] = latents
+    return latents
+
+
+def tts_stream(text, speaker_wav, model_name="models/TTS/XTTS-v2", device='auto', target_language='中文',
+               stream_chunk_size=20):
+    """
+    流式合成，边生成边返回 24kHz 的音频片段（numpy float 数组）
+    """
+    language = language_map[target_language]
+    if model is None:
+        load_model(model_name, device)
+
+    xtts = model.synthesizer.tts_model
+    gpt_cond_latent, speaker_embedding = get_conditioning_latents(speaker_wav)
+    chunks = xtts.inference_stream(
+        text, language, gpt_cond_latent, speaker_embedding,
+        stream_chunk_size=stream_chunk_size,
+        enable_text_splitting=True,
+        **generation_settings(xtts))
+    while True:
+        # 自动混合精度只包住每一步生成，不影响调用方
+        with inference_context():
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        yield chunk.float().cpu().numpy()
+    logger.info(f'TTS {text}')
+
+
 if __name__ == '__main__':
     speaker_wav = r'videos/村长台钓加拿大/20240805 英文无字幕 阿里这小子在水城威尼斯发来问候/audio_vocals.wav'
     os.makedirs('playground', exist_ok=True)
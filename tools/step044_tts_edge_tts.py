@@ -21,18 +21,26 @@ language_map = {
 }
 
 def tts(text, output_path, target_language='中文', voice = 'zh-CN-XiaoxiaoNeural'):
-    if os.path.exists(output_path):
+    # edge-tts 输出的是 mp3
+    mp3_path = output_path.replace('.wav', '.mp3')
+    if os.path.exists(output_path) or (os.path.exists(mp3_path) and os.path.getsize(mp3_path) > 0):
         logger.info(f'TTS {text} 已存在')
         return
+    # 先写入临时文件，成功后再改名，中断时不会留下被当作已完成的残缺 mp3
+    tmp_path = mp3_path + '.tmp'
     for retry in range(3):
         try:
-            os.system(f'edge-tts --text "{text}" --write-media "{output_path.replace(".wav", ".mp3")}" --voice {voice}')
+            status = os.system(f'edge-tts --text "{text}" --write-media "{tmp_path}" --voice {voice}')
+            if status != 0 or not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+                raise RuntimeError(f'edge-tts 退出状态 {status}')
+            os.replace(tmp_path, mp3_path)
             logger.info(f'TTS {text}')
             break
         except Exception as e:
             logger.warning(f'TTS {text} 失败')
             logger.warning(e)
-
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
 
 if __name__ == '__main__':
     speaker_wav = r'videos/村长台钓加拿大/20240805 英文无字幕 阿里这小子在水城威尼斯发来问候/audio_vocals.wav'
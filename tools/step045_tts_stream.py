@@ -0,0 +1,228 @@
+import json
+import os
+import subprocess
+import time
+
+import librosa
+import numpy as np
+from loguru import logger
+
+from .utils import save_wav, save_wav_norm
+from .step005_audio_ingest import load_audio, TTS_FORMAT
+from .step040_tts import preprocess_text, tts_support_languages
+from .step042_tts_xtts import tts_stream as xtts_tts_stream
+from .step043_tts_cosyvoice import tts as cosyvoice_tts
+from .step044_tts_edge_tts import tts as edge_tts
+
+SAMPLE_RATE = TTS_FORMAT[0]
+PREVIEW_FOLDER = 'preview'
+PREVIEW_PLAYLIST = 'index.m3u8'
+
+
+class DubbingAborted(Exception):
+    """流式配音过程中被用户中止"""
+
+
+class HLSPreviewWriter:
+    """
+    把配音音频实时写入 ffmpeg，与原视频画面一起输出为滚动的 HLS (fMP4 分片) 预览
+    预览失败（例如 ffmpeg 退出）只记录警告，不影响配音本身
+    """
+
+    def __init__(self, folder, sample_rate=SAMPLE_RATE, hls_time=4):
+        self.sample_rate = sample_rate
+        self.preview_folder = os.path.join(folder, PREVIEW_FOLDER)
+        self.playlist_path = os.path.join(self.preview_folder, PREVIEW_PLAYLIST)
+        os.makedirs(self.preview_folder, exist_ok=True)
+        for file_name in os.listdir(self.preview_folder):
+            os.remove(os.path.join(self.preview_folder, file_name))
+
+        command = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+            '-i', os.path.join(folder, 'download.mp4'),
+            '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+            '-map', '0:v:0', '-map', '1:a:0',
+            '-c:v', 'copy', '-c:a', 'aac', '-shortest', '-max_interleave_delta', '0',
+            '-f', 'hls', '-hls_time', str(hls_time), '-hls_list_size', '0',
+            '-hls_playlist_type', 'event', '-hls_segment_type', 'fmp4',
+            '-hls_segment_filename', os.path.join(self.preview_folder, 'segment_%05d.m4s'),
+            self.playlist_path,
+        ]
+        self._log = open(os.path.join(self.preview_folder, 'ffmpeg.log'), 'wb')
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                         stderr=self._log)
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    def write(self, wav):
+        if not self.alive:
+            return
+        pcm = (np.clip(wav, -1, 1) * 32767).astype(np.int16)
+        try:
+            self._process.stdin.write(pcm.tobytes())
+        except (BrokenPipeError, OSError) as e:
+            logger.warning(f'预览写入失败，停止预览: {e}')
+            self._process.kill()
+
+    def close(self):
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            self._process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        if self._process.returncode != 0:
+            logger.warning(f'预览生成失败 (exit code {self._process.returncode})，详见 '
+                           f'{os.path.join(self.preview_folder, "ffmpeg.log")}')
+        self._log.close()
+        self._process = None
+
+
+class StreamingTimeline:
+    """
+    按 translation.json 的时间轴依次放置配音片段，同时把已确定的混音（配音+伴奏）推送到预览
+    """
+
+    def __init__(self, instruments_wav, preview=None, sample_rate=SAMPLE_RATE):
+        self.instruments_wav = instruments_wav
+        self.preview = preview
+        self.sample_rate = sample_rate
+        self.chunks = []
+        self.length = 0
+
+    @property
+    def position(self):
+        return self.length / self.sample_rate
+
+    def seek(self, start):
+        """当前位置早于 start 时补静音"""
+        if start > self.position:
+            self.append(np.zeros((int((start - self.position) * self.sample_rate), ), dtype=np.float32))
+
+    def append(self, wav):
+        wav = np.asarray(wav, dtype=np.float32)
+        if self.preview is not None:
+            instruments = self.instruments_wav[self.length:self.length + len(wav)]
+            mixed = wav.copy()
+            mixed[:len(instruments)] += instruments
+            self.preview.write(mixed)
+        self.chunks.append(wav)
+        self.length += len(wav)
+
+    def to_numpy(self):
+        return np.concatenate(self.chunks) if self.chunks else np.zeros((0, ), dtype=np.float32)
+
+
+def _load_line_wav(output_path):
+    # EdgeTTS 可能输出 mp3
+    if not os.path.exists(output_path) and output_path.endswith('.wav'):
+        output_path = output_path.replace('.wav', '.mp3')
+    wav, _ = librosa.load(output_path, sr=SAMPLE_RATE)
+    return wav
+
+
+def _line_chunks(method, text, output_path, speaker_wav, target_language, voice):
+    """逐块产生一句话的配音；xtts 真正流式，其它方法整句合成后作为一个块返回"""
+    if os.path.exists(output_path):
+        yield _load_line_wav(output_path)
+        return
+    if method == 'xtts':
+        chunks = []
+        for chunk in xtts_tts_stream(text, speaker_wav, target_language=target_language):
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            save_wav(np.concatenate(chunks), output_path)
+        return
+    if method == 'cosyvoice':
+        cosyvoice_tts(text, output_path, speaker_wav, target_language=target_language)
+    elif method == 'EdgeTTS':
+        edge_tts(text, output_path, target_language=target_language, voice=voice)
+    yield _load_line_wav(output_path)
+
+
+def generate_wavs_streaming(method, folder, target_language='中文', voice='zh-CN-XiaoxiaoNeural',
+                            preview=True, abort_event=None, first_audio_callback=None):
+    """
+    流式配音: 每产生一个音频块就放到时间轴上并推送到 HLS 预览
+    与 generate_wavs 不同，这里不做变速对齐，句子超出时长时顺延到下一句之后
+
+    Args:
+        abort_event: threading.Event，被设置后在下一个音频块处中止并抛出 DubbingAborted
+        first_audio_callback: 第一个音频块产生时调用 first_audio_callback(首段音频耗时秒数, 预览播放列表路径)
+    """
+    assert method in ['xtts', 'cosyvoice', 'EdgeTTS']
+    transcript_path = os.path.join(folder, 'translation.json')
+    output_folder = os.path.join(folder, 'wavs')
+    os.makedirs(output_folder, exist_ok=True)
+    with open(transcript_path, 'r', encoding='utf-8') as f:
+        transcript = json.load(f)
+
+    if target_language not in tts_support_languages[method]:
+        logger.error(f'{method} does not support {target_language}')
+        raise ValueError(f'{method} does not support {target_language}')
+
+    instruments_wav = load_audio(folder, 'audio_instruments.wav', *TTS_FORMAT)
+    writer = HLSPreviewWriter(folder) if preview else None
+    timeline = StreamingTimeline(instruments_wav, writer)
+    t_start = time.time()
+    time_to_first_audio = None
+    try:
+        for i, line in enumerate(transcript):
+            text = preprocess_text(line['translation'])
+            output_path = os.path.join(output_folder, f'{str(i).zfill(4)}.wav')
+            speaker_wav = os.path.join(folder, 'SPEAKER', f'{line["speaker"]}.wav')
+
+            timeline.seek(line['start'])
+            line['start'] = timeline.position
+            for chunk in _line_chunks(method, text, output_path, speaker_wav, target_language, voice):
+                if abort_event is not None and abort_event.is_set():
+                    raise DubbingAborted(f'用户中止配音: {folder}')
+                timeline.append(chunk)
+                if time_to_first_audio is None:
+                    time_to_first_audio = time.time() - t_start
+                    logger.info(f'首段配音音频耗时 {time_to_first_audio:.2f} 秒')
+                    if first_audio_callback:
+                        first_audio_callback(time_to_first_audio, writer.playlist_path if writer else None)
+            line['end'] = timeline.position
+    finally:
+        if writer is not None:
+            writer.close()
+
+    full_wav = timeline.to_numpy()
+    vocal_wav = load_audio(folder, 'audio_vocals.wav', *TTS_FORMAT)
+    full_wav = full_wav / max(0.01, np.max(np.abs(full_wav))) * np.max(np.abs(vocal_wav))
+    save_wav(full_wav, os.path.join(folder, 'audio_tts.wav'))
+    with open(transcript_path, 'w', encoding='utf-8') as f:
+        json.dump(transcript, f, indent=2, ensure_ascii=False)
+
+    length = max(len(full_wav), len(instruments_wav))
+    combined_wav = np.pad(full_wav, (0, length - len(full_wav))) + np.pad(instruments_wav, (0, length - len(instruments_wav)))
+    save_wav_norm(combined_wav, os.path.join(folder, 'audio_combined.wav'))
+    logger.info(f'Generated {os.path.join(folder, "audio_combined.wav")}')
+    return os.path.join(folder, 'audio_combined.wav'), os.path.join(folder, 'audio.wav')
+
+
+def generate_all_wavs_under_folder_streaming(root_folder, method, target_language='中文', voice='zh-CN-XiaoxiaoNeural',
+                                             preview=True, abort_event=None, first_audio_callback=None):
+    wav_combined, wav_ori = None, None
+    for root, dirs, files in os.walk(root_folder):
+        if 'translation.json' in files and 'audio_combined.wav' not in files:
+            wav_combined, wav_ori = generate_wavs_streaming(method, root, target_language, voice, preview=preview,
+                                                            abort_event=abort_event,
+                                                            first_audio_callback=first_audio_callback)
+        elif 'audio_combined.wav' in files:
+            wav_combined, wav_ori = os.path.join(root, 'audio_combined.wav'), os.path.join(root, 'audio.wav')
+            logger.info(f'Wavs already generated in {root}')
+    return f'Generated all wavs under {root_folder}', wav_combined, wav_ori
+
+
+if __name__ == '__main__':
+    folder = r'videos/村长台钓加拿大/20240805 英文无字幕 阿里这小子在水城威尼斯发来问候'
+    generate_wavs_streaming('xtts', folder)
@@ -0,0 +1,263 @@
+"""
+翻译记忆：把逐句译文和视频总结保存到 SQLite，重新翻译（崩溃重试、同一频道的片头片尾和口播广告）时直接复用。
+
+键为 (规范化原文, 目标语言, 翻译方式, 模型)。可选的近似匹配在长度相近的已有原文中按相似度查找。
+
+    python -m tools.translation_memory report
+"""
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+
+from loguru import logger
+
+from .utils import env_flag
+
+TRANSLATION_MEMORY_DB = 'translation_memory.db'
+# 近似匹配时每次最多比较的候选数量
+MAX_FUZZY_CANDIDATES = 500
+
+
+def normalize_text(text):
+    """全角转半角、统一大小写、合并空白，去掉首尾的空白和引号"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip(' "\'“”‘’')
+
+
+def content_key(*parts):
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """
+    fuzzy_threshold 为 None 时只做精确匹配，否则相似度（difflib ratio）不低于该值的近似原文也视为命中
+    """
+
+    def __init__(self, db_path=TRANSLATION_MEMORY_DB, fuzzy_threshold=None):
+        self.db_path = db_path
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lookups = 0
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.init_db()
+
+    def init_db(self):
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS translations (
+                source_norm TEXT NOT NULL,
+                target_language TEXT NOT NULL,
+                method TEXT NOT NULL,
+                model TEXT NOT NULL,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (source_norm, target_language, method, model)
+            )
+            ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS translations_length
+            ON translations (target_language, method, model, length)
+            ''')
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT NOT NULL,
+                target_language TEXT NOT NULL,
+                method TEXT NOT NULL,
+                model TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (key, target_language, method, model)
+            )
+            ''')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _find_exact(self, cursor, source_norm, target_language, method, model):
+        cursor.execute('''
+        SELECT translation FROM translations
+        WHERE source_norm = ? AND target_language = ? AND method = ? AND model = ?
+        ''', (source_norm, target_language, method, model))
+        row = cursor.fetchone()
+        # 空译文视为未命中（旧版本可能写入过翻译失败时的空字符串）
+        return (source_norm, row[0]) if row and row[0] else None
+
+    def _find_fuzzy(self, cursor, source_norm, target_language, method, model):
+        # 相似度 ratio >= t 要求两个长度之比不低于 t / (2 - t)
+        slack = 1 - self.fuzzy_threshold / (2 - self.fuzzy_threshold)
+        length = len(source_norm)
+        cursor.execute('''
+        SELECT source_norm, translation FROM translations
+        WHERE target_language = ? AND method = ? AND model = ? AND length BETWEEN ? AND ? AND translation != ''
+        ORDER BY used_at DESC LIMIT ?
+        ''', (target_language, method, model, int(length * (1 - slack)), int(length / (1 - slack)) + 1,
+              MAX_FUZZY_CANDIDATES))
+        best, best_ratio = None, self.fuzzy_threshold
+        matcher = difflib.SequenceMatcher(autojunk=False)
+        matcher.set_seq2(source_norm)
+        for candidate, translation in cursor.fetchall():
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = (candidate, translation), ratio
+        return best
+
+    def lookup(self, text, target_language, method, model=''):
+        """返回缓存的译文，没有命中时返回 None"""
+        source_norm = normalize_text(text)
+        with self._lock:
+            self.lookups += 1
+            cursor = self._conn.cursor()
+            match = self._find_exact(cursor, source_norm, target_language, method, model)
+            if match is None and self.fuzzy_threshold is not None:
+                match = self._find_fuzzy(cursor, source_norm, target_language, method, model)
+                if match is not None:
+                    self.fuzzy_hits += 1
+            if match is None:
+                return None
+            self.hits += 1
+            cursor.execute('''
+            UPDATE translations SET hits = hits + 1, used_at = ?
+            WHERE source_norm = ? AND target_language = ? AND method = ? AND model = ?
+            ''', (time.time(), match[0], target_language, method, model))
+            self._conn.commit()
+            return match[1]
+
+    def contains(self, text, target_language, method, model=''):
+        """是否有精确匹配的译文，不计入命中率"""
+        with self._lock:
+            return self._find_exact(self._conn.cursor(), normalize_text(text), target_language, method, model) \
+                is not None
+
+    def store(self, text, translation, target_language, method, model=''):
+        if not translation:
+            return
+        source_norm = normalize_text(text)
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''
+            INSERT OR REPLACE INTO translations (source_norm, target_language, method, model, source, translation,
+                                                 length, hits, created_at, used_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+            ''', (source_norm, target_language, method, model, text, translation, len(source_norm), now, now))
+            self._conn.commit()
+
+    def lookup_summary(self, key, target_language, method, model=''):
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('''
+            SELECT summary FROM summaries WHERE key = ? AND target_language = ? AND method = ? AND model = ?
+            ''', (key, target_language, method, model))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute('''
+            UPDATE summaries SET hits = hits + 1
+            WHERE key = ? AND target_language = ? AND method = ? AND model = ?
+            ''', (key, target_language, method, model))
+            self._conn.commit()
+            return json.loads(row[0])
+
+    def store_summary(self, key, summary, target_language, method, model=''):
+        with self._lock:
+            self._conn.execute('''
+            INSERT OR REPLACE INTO summaries (key, target_language, method, model, summary, hits, created_at)
+            VALUES (?, ?, ?, ?, ?, 0, ?)
+            ''', (key, target_language, method, model, json.dumps(summary, ensure_ascii=False), time.time()))
+            self._conn.commit()
+
+    def stats(self):
+        """本进程内的查询次数和命中率"""
+        return {
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'fuzzy_hits': self.fuzzy_hits,
+            'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+        }
+
+    def summarize(self):
+        """按 (目标语言, 翻译方式, 模型) 汇总: 条目数、累计命中次数"""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute('''
+            SELECT target_language, method, model, COUNT(*), SUM(hits), SUM(hits > 0)
+            FROM translations GROUP BY target_language, method, model ORDER BY COUNT(*) DESC
+            ''')
+            keys = ['target_language', 'method', 'model', 'entries', 'hits', 'reused_entries']
+            return [dict(zip(keys, row)) for row in cursor.fetchall()]
+
+
+_default_memory = None
+_default_lock = threading.Lock()
+
+
+def get_translation_memory():
+    """
+    全局翻译记忆，TRANSLATION_MEMORY=0 时关闭（返回 None）
+    TRANSLATION_MEMORY_FUZZY 设置近似匹配的相似度阈值（例如 0.95），留空只做精确匹配
+    """
+    global _default_memory
+    if not env_flag('TRANSLATION_MEMORY', True):
+        return None
+    with _default_lock:
+        if _default_memory is None:
+            fuzzy = os.getenv('TRANSLATION_MEMORY_FUZZY')
+            try:
+                _default_memory = TranslationMemory(os.getenv('TRANSLATION_MEMORY_DB') or TRANSLATION_MEMORY_DB,
+                                                    float(fuzzy) if fuzzy and fuzzy.strip() else None)
+            except Exception as e:
+                logger.warning(f'初始化翻译记忆失败: {e}')
+                return None
+        return _default_memory
+
+
+def format_report(rows):
+    header = f'{"language":<12}{"method":<18}{"model":<28}{"entries":>9}{"hits":>9}{"reused":>9}'
+    lines = [header, '-' * len(header)]
+    for row in rows:
+        lines.append(f'{row["target_language"]:<12}{row["method"]:<18}{row["model"] or "-":<28}'
+                     f'{row["entries"]:>9}{row["hits"] or 0:>9}{row["reused_entries"] or 0:>9}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Linly-Dubbing 翻译记忆')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    report = subparsers.add_parser('report', help='按目标语言、翻译方式和模型汇总条目数与命中次数')
+    report.add_argument('--db', default=TRANSLATION_MEMORY_DB, help='翻译记忆数据库路径')
+    report.add_argument('--json', action='store_true', help='以JSON格式输出')
+    args = parser.parse_args(argv)
+
+    if args.command == 'report':
+        if not os.path.exists(args.db):
+            print(f'翻译记忆数据库不存在: {args.db}')
+            return 1
+        rows = TranslationMemory(args.db).summarize()
+        print(json.dumps(rows, indent=2, ensure_ascii=False) if args.json else format_report(rows))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
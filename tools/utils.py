@@ -1,3 +1,5 @@
+import hashlib
+import os
 import re
 import string
 import numpy as np
@@ -30,6 +32,35 @@ def normalize_wav(wav_path: str) -> None:
     wav_norm = wav * (32767 / max(0.01, np.max(np.abs(wav))))
     wavfile.write(wav_path, sample_rate, wav_norm.astype(np.int16))
 
+def file_hash(path, chunk_size=1 << 20):
+    """文件内容的 sha1，用于按内容缓存（同名文件重新生成后缓存自动失效）"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def env_flag(name, default=False):
+    value = os.getenv(name)
+    if value is None or value.strip() == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name):
+    value = os.getenv(name)
+    return int(value) if value and value.strip() else None
+
+
+def env_int_list(name):
+    """逗号分隔的整数列表，例如 CUDA 设备编号 "0,1"，留空返回 None"""
+    value = os.getenv(name)
+    if not value or not value.strip():
+        return None
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
 SUPPORT_VOICE = ['zu-ZA-ThembaNeural', 'zu-ZA-ThandoNeural',  'zh-TW-YunJheNeural', 'zh-TW-HsiaoYuNeural', 'zh-TW-HsiaoChenNeural', 'zh-HK-WanLungNeural', 
     'zh-HK-HiuMaanNeural', 'zh-HK-HiuGaaiNeural', 'zh-CN-shaanxi-XiaoniNeural', 'zh-CN-liaoning-XiaobeiNeural', 
     'zh-CN-YunyangNeural', 'zh-CN-YunxiaNeural', 'zh-CN-YunxiNeural', 'zh-CN-YunjianNeural', 
@@ -0,0 +1,228 @@
+"""
+跨视频的说话人声音库：保存说话人嵌入和各 TTS 后端预先计算的条件向量。
+
+同一个频道的主持人会出现在大量视频里，新视频的说话人参考音频先在声音库中做余弦相似度检索，
+匹配到已知声音时直接复用缓存的条件向量，不再重新编码参考音频。
+
+目录结构:
+    voices.json         每个声音的元数据（出现次数、来源、时间）
+    embeddings.npy      说话人嵌入矩阵，行顺序与 voices.json 一致
+    latents/<id>.<backend>.pt   各后端的条件向量
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import torch
+from loguru import logger
+
+from .utils import env_flag, file_hash
+
+VOICES_FILE = 'voices.json'
+EMBEDDINGS_FILE = 'embeddings.npy'
+LATENTS_FOLDER = 'latents'
+# 每个声音最多记录的来源数量
+MAX_SOURCES = 20
+
+_embedding_inference = None
+_embedding_lock = threading.Lock()
+# 按音频内容哈希缓存的说话人嵌入
+_embedding_cache = {}
+
+
+def get_embedding_inference():
+    """
+    延迟加载 pyannote/embedding，第一次需要说话人嵌入时才下载和加载模型
+    """
+    global _embedding_inference
+    with _embedding_lock:
+        if _embedding_inference is None:
+            from pyannote.audio import Model, Inference
+            t_start = time.time()
+            embedding_model = Model.from_pretrained('pyannote/embedding', use_auth_token=os.getenv('HF_TOKEN'))
+            _embedding_inference = Inference(embedding_model, window='whole')
+            if torch.cuda.is_available():
+                _embedding_inference.to(torch.device('cuda'))
+            logger.info(f'Loaded speaker embedding model in {time.time() - t_start:.2f}s')
+        return _embedding_inference
+
+
+def embed_wav(wav_path):
+    """计算一个音频文件的说话人嵌入，内容相同的音频只计算一次"""
+    key = file_hash(wav_path)
+    if key not in _embedding_cache:
+        _embedding_cache[key] = np.asarray(get_embedding_inference()(wav_path), dtype=np.float32)
+    return _embedding_cache[key]
+
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-8)
+
+
+class VoiceIndex:
+    """
+    归一化嵌入矩阵上的最近邻检索，一次矩阵乘法得到查询与所有声音的余弦相似度
+    """
+
+    def __init__(self, ids=None, embeddings=None):
+        self.ids = list(ids or [])
+        if embeddings is None or len(self.ids) == 0:
+            self.matrix = None
+        else:
+            self.matrix = normalize(embeddings)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, voice_id, embedding):
+        row = normalize(embedding)[None, :]
+        self.matrix = row if self.matrix is None else np.concatenate([self.matrix, row])
+        self.ids.append(voice_id)
+
+    def update(self, voice_id, embedding):
+        self.matrix[self.ids.index(voice_id)] = normalize(embedding)
+
+    def similarities(self, queries):
+        """queries: (D,) 或 (N, D)，返回 (N, 声音数) 的余弦相似度"""
+        queries = normalize(np.atleast_2d(queries))
+        if self.matrix is None:
+            return np.zeros((len(queries), 0), dtype=np.float32)
+        return queries @ self.matrix.T
+
+    def search(self, query, k=1):
+        """返回相似度最高的 k 个 (id, 相似度)"""
+        scores = self.similarities(query)[0]
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+    def best(self, queries):
+        """每个查询最相似的声音，返回 [(id, 相似度), ...]"""
+        scores = self.similarities(queries)
+        if scores.shape[1] == 0:
+            return [(None, 0.0)] * len(scores)
+        best = scores.argmax(axis=1)
+        return [(self.ids[j], float(scores[i, j])) for i, j in enumerate(best)]
+
+
+class VoiceLibrary:
+    """
+    持久化的声音库，identify 时相似度不低于 threshold 的说话人视为同一个声音
+    """
+
+    def __init__(self, root='voice_library', threshold=0.7):
+        self.root = root
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, LATENTS_FOLDER), exist_ok=True)
+        self.voices = []
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._load()
+
+    def _load(self):
+        voices_path = os.path.join(self.root, VOICES_FILE)
+        embeddings_path = os.path.join(self.root, EMBEDDINGS_FILE)
+        if os.path.exists(voices_path) and os.path.exists(embeddings_path):
+            with open(voices_path, 'r', encoding='utf-8') as f:
+                self.voices = json.load(f)['voices']
+            self.embeddings = np.load(embeddings_path)
+            if len(self.embeddings) != len(self.voices):
+                logger.warning(f'声音库 {self.root} 的嵌入数量与元数据不一致，已重置')
+                self.voices, self.embeddings = [], np.zeros((0, 0), dtype=np.float32)
+        self.index = VoiceIndex([v['id'] for v in self.voices], self.embeddings if self.voices else None)
+        logger.info(f'声音库 {self.root} 共 {len(self.voices)} 个声音')
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        voices_path = os.path.join(self.root, VOICES_FILE)
+        embeddings_path = os.path.join(self.root, EMBEDDINGS_FILE)
+        with open(voices_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'voices': self.voices}, f, indent=2, ensure_ascii=False)
+        with open(embeddings_path + '.tmp', 'wb') as f:
+            np.save(f, self.embeddings)
+        os.replace(voices_path + '.tmp', voices_path)
+        os.replace(embeddings_path + '.tmp', embeddings_path)
+
+    def __len__(self):
+        return len(self.voices)
+
+    def identify(self, embedding, source=None):
+        """
+        在声音库中查找说话人，匹配到时用新的嵌入更新该声音的平均嵌入，否则新建一个声音
+        返回 (声音 id, 是否为已知声音)
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            matches = self.index.search(embedding, k=1)
+            now = time.strftime('%Y-%m-%d %H:%M:%S')
+            if matches and matches[0][1] >= self.threshold:
+                voice_id, score = matches[0]
+                i = self.index.ids.index(voice_id)
+                voice = self.voices[i]
+                # 平均嵌入随出现次数更新，保持对同一个人不同录音条件的鲁棒性
+                self.embeddings[i] = (self.embeddings[i] * voice['count'] + embedding) / (voice['count'] + 1)
+                self.index.update(voice_id, self.embeddings[i])
+                voice['count'] += 1
+                voice['updated_at'] = now
+                if source and source not in voice['sources']:
+                    voice['sources'] = (voice['sources'] + [source])[-MAX_SOURCES:]
+                logger.info(f'声音库匹配 {source}: {voice_id} (相似度 {score:.3f})')
+                known = True
+            else:
+                voice_id = f'voice_{len(self.voices) + 1:05d}'
+                self.voices.append({'id': voice_id, 'count': 1, 'sources': [source] if source else [],
+                                    'created_at': now, 'updated_at': now})
+                row = embedding[None, :]
+                self.embeddings = row if len(self.embeddings) == 0 else np.concatenate([self.embeddings, row])
+                self.index.add(voice_id, embedding)
+                logger.info(f'声音库新增 {voice_id}: {source}')
+                known = False
+            self._save()
+        return voice_id, known
+
+    def identify_wav(self, wav_path):
+        return self.identify(embed_wav(wav_path), source=os.path.abspath(wav_path))
+
+    def latents_path(self, voice_id, backend):
+        return os.path.join(self.root, LATENTS_FOLDER, f'{voice_id}.{backend}.pt')
+
+    def load_latents(self, voice_id, backend, map_location='cpu'):
+        path = self.latents_path(voice_id, backend)
+        if not os.path.exists(path):
+            return None
+        return torch.load(path, map_location=map_location)
+
+    def save_latents(self, voice_id, backend, latents):
+        path = self.latents_path(voice_id, backend)
+        if isinstance(latents, (tuple, list)):
+            latents = type(latents)(t.detach().cpu() if torch.is_tensor(t) else t for t in latents)
+        torch.save(latents, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_voice_library():
+    """
+    全局声音库，VOICE_LIBRARY 开启时使用 VOICE_LIBRARY_DIR（默认 voice_library），未开启时返回 None
+    """
+    global _library
+    if not env_flag('VOICE_LIBRARY'):
+        return None
+    with _library_lock:
+        if _library is None:
+            threshold = float(os.getenv('VOICE_LIBRARY_THRESHOLD') or 0.7)
+            _library = VoiceLibrary(os.getenv('VOICE_LIBRARY_DIR') or 'voice_library', threshold)
+        return _library
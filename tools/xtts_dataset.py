@@ -0,0 +1,293 @@
+"""
+把处理过的视频文件夹导出为 XTTS 微调数据集。
+
+每个文件夹的 audio_vocals.wav 读取一次 22.05kHz 单声道派生音频，transcript.json 中所有句子按时长、文本长度和说话人
+过滤后一次性切出，写入分片的 int16 音频库（可用 np.memmap 直接读取），同时生成 coqui 格式的清单，
+可以直接用于 TTS/tts/datasets/formatters.py 中的 coqui 格式化函数:
+
+    python -m tools.xtts_dataset videos/频道名 --output datasets/频道名 --language zh-cn
+    python -m tools.xtts_dataset videos --output datasets/all --speakers voice_00001 --voice_library
+
+    BaseDatasetConfig(formatter='coqui', path='datasets/频道名', meta_file_train='metadata_train.csv',
+                      meta_file_val='metadata_eval.csv', language='zh-cn')
+
+输出目录:
+    store/shard_00000.pcm ...   int16 小端 PCM，片段首尾相接
+    store/index.npz             每个片段所在的分片、偏移和长度（采样点），与清单行号一致
+    store/info.json             采样率、分片列表和统计信息
+    wavs/000000.wav ...         每个片段的 wav（--no_wavs 时不生成）
+    metadata.csv / metadata_train.csv / metadata_eval.csv   audio_file|text|speaker_name
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from loguru import logger
+from scipy.io import wavfile
+
+from .step005_audio_ingest import load_audio
+
+XTTS_SAMPLE_RATE = 22050
+# 每个分片最多 2^28 个采样点（512MB）
+MAX_SHARD_SAMPLES = 1 << 28
+STORE_FOLDER = 'store'
+SHARD_NAME = 'shard_{:05d}.pcm'
+METADATA_COLUMNS = ['audio_file', 'text', 'speaker_name']
+
+
+def find_folders(roots):
+    folders = []
+    for root_folder in roots:
+        for root, dirs, files in os.walk(root_folder):
+            if 'transcript.json' in files and 'audio_vocals.wav' in files:
+                folders.append(root)
+    return sorted(folders)
+
+
+def speaker_names(folder, speakers, voice_library=None):
+    """
+    说话人在数据集中的名字，默认是 "<视频文件夹名>/<SPEAKER_xx>"
+    指定声音库时用 SPEAKER/*.wav 识别跨视频的声音 id，同一个人在不同视频中使用同一个名字
+    """
+    names = {}
+    for speaker in speakers:
+        speaker_wav = os.path.join(folder, 'SPEAKER', f'{speaker}.wav')
+        if voice_library is not None and os.path.exists(speaker_wav):
+            names[speaker], _ = voice_library.identify_wav(speaker_wav)
+        else:
+            names[speaker] = f'{os.path.basename(folder)}/{speaker}'
+    return names
+
+
+def select_segments(transcript, names, sample_rate, length, min_duration=1.0, max_duration=11.0,
+                    max_text_length=200, speakers=None, pad=0.05):
+    """
+    返回通过过滤的片段: (起点数组, 终点数组, 文本列表, 说话人列表)，起止点单位为采样点
+    """
+    if not transcript:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), [], []
+    texts = np.array([line['text'].strip() for line in transcript], dtype=object)
+    line_speakers = np.array([names[line['speaker']] for line in transcript], dtype=object)
+    starts = np.array([line['start'] for line in transcript], dtype=np.float64) - pad
+    ends = np.array([line['end'] for line in transcript], dtype=np.float64) + pad
+    starts = np.clip(np.round(starts * sample_rate).astype(np.int64), 0, length)
+    ends = np.clip(np.round(ends * sample_rate).astype(np.int64), 0, length)
+
+    durations = (ends - starts) / sample_rate
+    text_lengths = np.array([len(text) for text in texts])
+    mask = (durations >= min_duration) & (durations <= max_duration) & (text_lengths > 0) \
+        & (text_lengths <= max_text_length)
+    if speakers:
+        mask &= np.isin(line_speakers, list(speakers))
+    return starts[mask], ends[mask], list(texts[mask]), list(line_speakers[mask])
+
+
+def gather_segments(wav, starts, ends):
+    """一次索引切出所有片段，首尾相接，返回 (采样点, 各片段在结果中的偏移, 各片段长度)"""
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    index = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+    return wav[index], offsets, lengths
+
+
+def to_pcm16(wav):
+    return (np.clip(wav, -1.0, 32767 / 32768) * 32768).astype('<i2')
+
+
+class ShardWriter:
+    """把片段追加写入分片，片段不跨分片"""
+
+    def __init__(self, store_folder, max_shard_samples=MAX_SHARD_SAMPLES):
+        self.store_folder = store_folder
+        self.max_shard_samples = max_shard_samples
+        self.shard_lengths = []
+        self._file = None
+
+    def _open_next(self):
+        if self._file is not None:
+            self._file.close()
+        self.shard_lengths.append(0)
+        self._file = open(os.path.join(self.store_folder, SHARD_NAME.format(len(self.shard_lengths) - 1)), 'wb')
+
+    def write(self, pcm, offsets, lengths):
+        """写入 gather_segments 的结果，返回每个片段的 (分片, 分片内偏移)"""
+        shards = np.zeros(len(lengths), dtype=np.int32)
+        shard_offsets = np.zeros(len(lengths), dtype=np.int64)
+        ends = offsets + lengths
+        first = 0
+        while first < len(lengths):
+            if self._file is None:
+                self._open_next()
+            room = self.max_shard_samples - self.shard_lengths[-1]
+            # 当前分片能放下的片段数，至少放一个，避免超长片段导致死循环
+            last = np.searchsorted(ends, offsets[first] + room, side='right')
+            if last == first:
+                if self.shard_lengths[-1] > 0:
+                    self._open_next()
+                    continue
+                last = first + 1
+            shards[first:last] = len(self.shard_lengths) - 1
+            shard_offsets[first:last] = self.shard_lengths[-1] + offsets[first:last] - offsets[first]
+            self._file.write(pcm[offsets[first]:ends[last - 1]].tobytes())
+            self.shard_lengths[-1] += int(ends[last - 1] - offsets[first])
+            first = last
+        return shards, shard_offsets
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ClipStore:
+    """以内存映射方式读取导出的音频库，store[i] 返回第 i 个片段（float32，采样率见 sample_rate）"""
+
+    def __init__(self, root):
+        store_folder = os.path.join(root, STORE_FOLDER)
+        with open(os.path.join(store_folder, 'info.json'), 'r', encoding='utf-8') as f:
+            self.info = json.load(f)
+        self.sample_rate = self.info['sample_rate']
+        index = np.load(os.path.join(store_folder, 'index.npz'))
+        self.shards, self.offsets, self.lengths = index['shard'], index['offset'], index['length']
+        self._shards = [np.memmap(os.path.join(store_folder, SHARD_NAME.format(i)), dtype='<i2', mode='r')
+                        if length else np.zeros(0, dtype='<i2')
+                        for i, length in enumerate(self.info['shard_lengths'])]
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def pcm(self, i):
+        offset = self.offsets[i]
+        return self._shards[self.shards[i]][offset:offset + self.lengths[i]]
+
+    def __getitem__(self, i):
+        return self.pcm(i).astype(np.float32) / 32768.0
+
+
+def write_metadata(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter='|')
+        writer.writerow(METADATA_COLUMNS)
+        writer.writerows(rows)
+
+
+def export_dataset(roots, output, language=None, min_duration=1.0, max_duration=11.0, max_text_length=200,
+                   speakers=None, eval_fraction=0.01, write_wavs=True, voice_library=None, seed=0,
+                   max_shard_samples=MAX_SHARD_SAMPLES):
+    """
+    导出 roots 下所有已转写的文件夹，返回数据集统计信息
+    """
+    store_folder = os.path.join(output, STORE_FOLDER)
+    if os.path.exists(os.path.join(store_folder, 'index.npz')):
+        raise FileExistsError(f'{output} 中已有导出的数据集')
+    os.makedirs(store_folder, exist_ok=True)
+
+    t_start = time.time()
+    writer = ShardWriter(store_folder, max_shard_samples)
+    shards, shard_offsets, lengths, texts, names, sources = [], [], [], [], [], []
+    folders = find_folders(roots)
+    try:
+        for folder in folders:
+            with open(os.path.join(folder, 'transcript.json'), 'r', encoding='utf-8') as f:
+                transcript = json.load(f)
+            if not transcript:
+                continue
+            wav = load_audio(folder, 'audio_vocals.wav', XTTS_SAMPLE_RATE)
+            folder_names = speaker_names(folder, sorted({line['speaker'] for line in transcript}), voice_library)
+            starts, ends, folder_texts, folder_speakers = select_segments(
+                transcript, folder_names, XTTS_SAMPLE_RATE, len(wav), min_duration, max_duration,
+                max_text_length, speakers)
+            logger.info(f'{folder}: 保留 {len(starts)}/{len(transcript)} 句')
+            if not len(starts):
+                continue
+            clips, offsets, clip_lengths = gather_segments(wav, starts, ends)
+            clip_shards, clip_offsets = writer.write(to_pcm16(clips), offsets, clip_lengths)
+            shards.append(clip_shards)
+            shard_offsets.append(clip_offsets)
+            lengths.append(clip_lengths)
+            texts += folder_texts
+            names += folder_speakers
+            sources += [folder] * len(starts)
+    finally:
+        writer.close()
+
+    shards = np.concatenate(shards) if shards else np.zeros(0, dtype=np.int32)
+    shard_offsets = np.concatenate(shard_offsets) if shard_offsets else np.zeros(0, dtype=np.int64)
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+    np.savez(os.path.join(store_folder, 'index.npz'), shard=shards, offset=shard_offsets, length=lengths)
+    speaker_counts = {}
+    for name in names:
+        speaker_counts[name] = speaker_counts.get(name, 0) + 1
+    info = {
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'sample_rate': XTTS_SAMPLE_RATE,
+        'dtype': 'int16',
+        'language': language,
+        'shard_lengths': writer.shard_lengths,
+        'num_clips': int(len(lengths)),
+        'total_seconds': float(lengths.sum() / XTTS_SAMPLE_RATE),
+        'folders': folders,
+        'speakers': speaker_counts,
+        'filters': {'min_duration': min_duration, 'max_duration': max_duration,
+                    'max_text_length': max_text_length, 'speakers': speakers},
+    }
+    with open(os.path.join(store_folder, 'info.json'), 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2, ensure_ascii=False)
+
+    clip_names = [f'{i:06d}' for i in range(len(lengths))]
+    if write_wavs:
+        wavs_folder = os.path.join(output, 'wavs')
+        os.makedirs(wavs_folder, exist_ok=True)
+        store = ClipStore(output)
+        for i, clip_name in enumerate(clip_names):
+            wavfile.write(os.path.join(wavs_folder, f'{clip_name}.wav'), XTTS_SAMPLE_RATE, np.asarray(store.pcm(i)))
+
+    rows = [[f'wavs/{clip_name}.wav', text.replace('|', ' '), name]
+            for clip_name, text, name in zip(clip_names, texts, names)]
+    write_metadata(os.path.join(output, 'metadata.csv'), rows)
+    order = np.random.default_rng(seed).permutation(len(rows))
+    num_eval = min(max(1, int(len(rows) * eval_fraction)), len(rows) - 1) if len(rows) > 1 else 0
+    write_metadata(os.path.join(output, 'metadata_eval.csv'), [rows[i] for i in sorted(order[:num_eval])])
+    write_metadata(os.path.join(output, 'metadata_train.csv'), [rows[i] for i in sorted(order[num_eval:])])
+    with open(os.path.join(output, 'sources.json'), 'w', encoding='utf-8') as f:
+        json.dump(dict(zip(clip_names, sources)), f, indent=2, ensure_ascii=False)
+
+    logger.info(f'导出 {info["num_clips"]} 个片段（{info["total_seconds"] / 3600:.2f} 小时，{len(speaker_counts)} 个说话人，'
+                f'{len(writer.shard_lengths)} 个分片）到 {output}，用时 {time.time() - t_start:.2f} 秒')
+    return info
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='导出 XTTS 微调数据集')
+    parser.add_argument('roots', nargs='+', help='包含已处理视频文件夹的目录')
+    parser.add_argument('--output', required=True, help='数据集输出目录')
+    parser.add_argument('--language', default=None, help='转写文本的语言（XTTS 语言代码，例如 en、zh-cn）')
+    parser.add_argument('--min_duration', type=float, default=1.0, help='最短片段时长（秒）')
+    parser.add_argument('--max_duration', type=float, default=11.0,
+                        help='最长片段时长（秒），XTTS 默认 max_wav_length 约 11.6 秒')
+    parser.add_argument('--max_text_length', type=int, default=200, help='最长文本字符数')
+    parser.add_argument('--speakers', nargs='+', default=None, help='只导出这些说话人')
+    parser.add_argument('--eval_fraction', type=float, default=0.01, help='验证集比例')
+    parser.add_argument('--no_wavs', action='store_true', help='只写分片音频库，不生成每个片段的 wav')
+    parser.add_argument('--voice_library', action='store_true', help='用声音库识别跨视频的说话人')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    voice_library = None
+    if args.voice_library:
+        from .voice_library import VoiceLibrary
+        voice_library = VoiceLibrary(os.getenv('VOICE_LIBRARY_DIR') or 'voice_library',
+                                     float(os.getenv('VOICE_LIBRARY_THRESHOLD') or 0.7))
+    info = export_dataset(args.roots, args.output, args.language, args.min_duration, args.max_duration,
+                          args.max_text_length, args.speakers, args.eval_fraction, not args.no_wavs, voice_library,
+                          args.seed)
+    print(json.dumps({k: info[k] for k in ('num_clips', 'total_seconds', 'speakers')}, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())